@@ -0,0 +1,5 @@
+import os
+import sys
+
+# match_sensor_data.py is run as a script from the repository root, so put ML/ on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
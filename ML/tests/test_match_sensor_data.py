@@ -0,0 +1,83 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pandas as pd
+import pytest
+
+import match_sensor_data
+
+COLUMNS = ["temperature", "humidity", "soundLevel", "event"]
+START = datetime(2025, 8, 6, tzinfo=timezone(timedelta(hours=3)))
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = mongomock.MongoClient()["sensor_data_db"]["sensor_readings"]
+    monkeypatch.setattr(match_sensor_data, "get_collection", lambda mongo_uri=None: collection)
+    return collection
+
+
+def add_readings(collection, first_minute, last_minute, locations=(("A", 1), ("B", 2), ("C", 3))):
+    rng = random.Random(first_minute)
+    docs = []
+    for building, floor in locations:
+        for minute in range(first_minute, last_minute):
+            for sensor_type, field, offset in (("Temperature", "temperature", 0), ("Humidity", "humidity", 20),
+                                               ("Acoustic", "soundLevel", 40)):
+                docs.append({
+                    "building": building, "floor": floor, "type": sensor_type,
+                    field: round(rng.uniform(0, 100), 3),
+                    "event": rng.choice(["fire", "normal", "normal"]),
+                    "timestamp": (START + timedelta(minutes=minute, seconds=offset)).isoformat(),
+                })
+    collection.insert_many(docs)
+
+
+def normalized(df):
+    return df[COLUMNS].round(3).sort_values(COLUMNS).reset_index(drop=True)
+
+
+def test_parallel_shards_match_serial_build(collection, monkeypatch, tmp_path):
+    add_readings(collection, 0, 60)
+    # Threads instead of processes, so the workers share the in-memory collection
+    monkeypatch.setattr(match_sensor_data, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+    serial = match_sensor_data.build_serial(collection)
+    parallel = match_sensor_data.build_parallel("mongodb://unused", 2, str(tmp_path))
+
+    assert len(serial) == 180
+    pd.testing.assert_frame_equal(normalized(parallel), normalized(serial))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["A_1.csv", "B_2.csv", "C_3.csv"]
+
+
+def test_incremental_rerun_after_crash_matches_full_build(collection, monkeypatch, tmp_path):
+    dataset_dir = str(tmp_path)
+    add_readings(collection, 0, 30)
+    match_sensor_data.build_incremental("mongodb://unused", dataset_dir)
+
+    # The next run dies after writing the first location's part, before saving its watermark
+    add_readings(collection, 30, 60)
+    save_watermarks = match_sensor_data.save_watermarks
+
+    def crash(*args):
+        monkeypatch.setattr(match_sensor_data, "save_watermarks", save_watermarks)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(match_sensor_data, "save_watermarks", crash)
+    with pytest.raises(OSError):
+        match_sensor_data.build_incremental("mongodb://unused", dataset_dir)
+
+    # The rerun starts from the same watermark, with more readings by then, and replaces that part
+    add_readings(collection, 60, 90)
+    match_sensor_data.build_incremental("mongodb://unused", dataset_dir)
+    assert match_sensor_data.build_incremental("mongodb://unused", dataset_dir) == 0
+
+    dataset = match_sensor_data.load_dataset(dataset_dir)
+    assert not dataset.duplicated().any()
+    # Temperature readings within 3 minutes of the last one wait for later neighbours; the rest match the full build
+    pending = (START + timedelta(minutes=89) - match_sensor_data.MATCH_TOLERANCE).isoformat()
+    collection.delete_many({"type": "Temperature", "timestamp": {"$gt": pending}})
+    assert len(dataset) == 3 * 87
+    pd.testing.assert_frame_equal(normalized(dataset), normalized(match_sensor_data.build_serial(collection)))
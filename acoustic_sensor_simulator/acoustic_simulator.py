@@ -1,12 +1,16 @@
 import random
-import uuid
 import requests
 import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
+import logging
+from simulator_common import API_URL, INGEST_TRANSPORT, IngestChannel, send_reading, setup_logging
 
 athens_tz = ZoneInfo("Europe/Athens") #Athens timezone
 
+setup_logging()
+logger = logging.getLogger("acoustic_simulator")
+
 sensor_config = {
     "Acoustic": {
         "min": 30.0,       # Quiet floor (e.g., whisper)
@@ -23,7 +27,7 @@ def check_fire_mode(building, floor):
         if response.status_code == 200:
             return response.json().get("fire") == True
     except Exception as e:
-        print(f"Error checking fire mode: {e}")
+        logger.warning("Error checking fire mode: %s", e)
     return False  # Default to normal
 
 def generate_sensor_data(building: str, floor: int):
@@ -42,7 +46,7 @@ def generate_sensor_data(building: str, floor: int):
     if fire_mode:
         soundLevel = round(random.uniform(70, 95), 1)
         #event = "fire"
-        print("Fire mode active! Sending low humidity readings.")
+        logger.info("Fire mode active! Sending high sound levels.", extra={"sampled": True, "building": building, "floor": floor})
     else:
         #event = "normal"
         config = sensor_config["Acoustic"]
@@ -55,7 +59,6 @@ def generate_sensor_data(building: str, floor: int):
 
     # Return structured sensor reading
     return {
-        "sensorId": str(uuid.uuid4()),
         "type": "Acoustic",
         #"event": event,
         "vendorName": vendorName,
@@ -69,31 +72,50 @@ def generate_sensor_data(building: str, floor: int):
         "timestamp": datetime.now(tz=athens_tz).isoformat()
     }
 
-def wait_for_api(max_retries=30, delay=2):
+def wait_for_api(max_retries=120, delay=0.5):
+    # /readyz answers 503 until MongoDB, a model and the alert snapshot are loaded
     for _ in range(max_retries):
         try:
-            response = requests.get("http://sensor-api:8000/docs")
+            response = requests.get("http://sensor-api:8000/readyz", timeout=2)
             if response.status_code == 200:
-                print("FastAPI is up! Starting data simulation.")
+                logger.info("FastAPI is up! Starting data simulation.")
                 return
         except Exception as e:
-            print("Waiting for sensor-api to be ready...")
+            logger.info("Waiting for sensor-api to be ready...")
         time.sleep(delay)
     raise Exception("sensor-api service did not become available in time.")
 
+channel = IngestChannel(API_URL.replace("http", "ws", 1) + "/ws/ingest") if INGEST_TRANSPORT == "ws" else None
+
 def simulate_posting():
     wait_for_api()
     while True:
-        # Scenario: 3 buildings (A–C), 4 floors each
-        for building in ['A', 'B', 'C']:    # Buildings A, B, C
-            for floor in range(1, 5):  # Floors 1 to 4
-                acoustic_data = generate_sensor_data(building, floor)
-                try:
-                    response = requests.post("http://sensor-api:8000/sensor-data/", json=acoustic_data)
-                    print(f"Sent data: {acoustic_data}")
-                    print(f"Response: {response.status_code}, {response.json()}")
-                except Exception as e:
-                    print(f"Error posting data: {e}")
+        sent, failed = 0, 0
+        if channel:
+            # All readings of the cycle over the one WebSocket
+            readings = [generate_sensor_data(building, floor) for building in ['A', 'B', 'C'] for floor in range(1, 5)]
+            try:
+                sent, failed = channel.send_all(readings)
+            except Exception as e:
+                logger.warning("Error streaming data: %s", e)
+                failed = len(readings)
+        else:
+            # Scenario: 3 buildings (A–C), 4 floors each
+            for building in ['A', 'B', 'C']:    # Buildings A, B, C
+                for floor in range(1, 5):  # Floors 1 to 4
+                    acoustic_data = generate_sensor_data(building, floor)
+                    try:
+                        response = send_reading(acoustic_data)
+                        if response.status_code // 100 == 2:
+                            logger.info("Sent data", extra={"sampled": True, "data": acoustic_data, "status": response.status_code})
+                            sent += 1
+                        else:
+                            logger.warning("Reading rejected", extra={"data": acoustic_data, "status": response.status_code, "detail": response.text})
+                            failed += 1
+                    except Exception as e:
+                        logger.warning("Error posting data: %s", e)
+                        failed += 1
+        logger.info("Posting cycle finished", extra={"sent": sent, "failed": failed})
         time.sleep(300)  # Post every 5 minutes
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+import pymongo
+from starlette.concurrency import run_in_threadpool
+
+from metrics import ADMISSION_REJECTED, STAGE_IN_FLIGHT, CIRCUIT_BREAKER_OPEN
+
+# Monotonic time by which the current request must be answered (None = no deadline)
+request_deadline = ContextVar("request_deadline", default=None)
+
+
+class Overloaded(Exception):
+    """Rejects a request: 429 when a stage queue is full, 503 when its deadline runs out."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@contextmanager
+def deadline(seconds: float):
+    token = request_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None without one."""
+    end = request_deadline.get()
+    if end is None:
+        return None
+    return max(0.0, end - time.monotonic())
+
+
+class StageLimiter:
+    """Bounds how many requests run a stage at once and how many may wait for it.
+
+    Waiting is bounded twice: by ``max_waiting`` (a full queue is rejected at once with
+    429) and by the request deadline (a request that cannot start in time gets 503).
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_waiting: int, retry_after: float = 1.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.retry_after = retry_after
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.in_flight = 0
+        STAGE_IN_FLIGHT.labels(stage=name).set_function(lambda: self.in_flight)
+
+    def reject(self, status_code: int, reason: str):
+        ADMISSION_REJECTED.labels(stage=self.name, reason=reason).inc()
+        return Overloaded(status_code, f"Service overloaded ({self.name}: {reason})", self.retry_after)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.semaphore.locked() and self.waiting >= self.max_waiting:
+            raise self.reject(429, "queue_full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), remaining())
+        except asyncio.TimeoutError:
+            raise self.reject(503, "deadline")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking call in the threadpool inside a slot, bounded by the request deadline.
+
+        A 503 on the deadline does not stop the thread, so a write can still complete after it.
+        """
+        async with self.slot():
+            timeout = remaining()
+            if timeout is not None and timeout <= 0:
+                raise self.reject(503, "deadline")
+
+            def call():
+                # pymongo applies this timeout to every operation inside fn (server selection, socket, ...)
+                with pymongo.timeout(timeout):
+                    return fn(*args, **kwargs)
+
+            try:
+                return await asyncio.wait_for(run_in_threadpool(call), timeout)
+            except (asyncio.TimeoutError, pymongo.errors.PyMongoError) as e:
+                if isinstance(e, asyncio.TimeoutError) or e.timeout:
+                    raise self.reject(503, "deadline")
+                raise
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for ``reset_seconds`` after ``failure_threshold`` failures in a row.
+
+    After that one trial call is let through (half open); success closes the breaker again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+        CIRCUIT_BREAKER_OPEN.labels(dependency=self.name).set(0)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+        if self.opened_at is not None:
+            CIRCUIT_BREAKER_OPEN.labels(dependency=self.name).set(1)
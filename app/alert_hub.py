@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+logger = logging.getLogger("sensor_api.alerts")
+
+# Messages a client may need to resume; older clients get a fresh snapshot
+HISTORY_SIZE = 1000
+# Messages queued for one client before it is disconnected and has to resume
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+def location_key(building, floor) -> str:
+    return f"{building}:{floor}"
+
+
+class AlertHub:
+    """Active fire alerts and a per-location fire map, kept in memory.
+
+    Every change gets the next sequence number and is kept in a bounded history, so a
+    client needs one snapshot when it connects and only the deltas after that; a client
+    that reconnects with ``since=<seq>`` gets just what it missed. ``epoch`` changes on
+    every start, so sequence numbers from a previous process are never resumed.
+    """
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.alerts = {}            # location key -> active alert
+        self.fire = {}              # location key -> True while an alert is active
+        self.history = deque(maxlen=history_size)
+        self.subscribers = set()
+        self.loaded = False
+        self.delivery_waiters = {}  # seq -> future resolved when a client is first sent that delta
+
+    def load(self, alerts: list):
+        # Initial state, from MongoDB, before any client is served
+        for alert in alerts:
+            key = location_key(alert["building"], alert["floor"])
+            self.alerts[key] = alert
+            self.fire[key] = True
+        self.loaded = True
+
+    def snapshot(self) -> dict:
+        return {
+            "kind": "snapshot",
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "alerts": list(self.alerts.values()),
+            "fire": dict(self.fire),
+        }
+
+    def since(self, seq: int, epoch: str = None):
+        """Messages after ``seq``, or None when they are no longer (or were never) in the history."""
+        if epoch != self.epoch or seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        if not self.history or self.history[0]["seq"] > seq + 1:
+            return None
+        return [message for message in self.history if message["seq"] > seq]
+
+    def _publish(self, message: dict) -> dict:
+        self.seq += 1
+        message = {**message, "epoch": self.epoch, "seq": self.seq}
+        self.history.append(message)
+        for subscriber in list(self.subscribers):
+            subscriber.push(message)
+        return message
+
+    def alert_opened(self, alert: dict) -> dict:
+        key = location_key(alert["building"], alert["floor"])
+        self.alerts[key] = alert
+        self.fire[key] = True
+        return self._publish({"kind": "alert_opened", "alert": alert})
+
+    def wait_delivery(self, seq: int) -> asyncio.Future:
+        """Future resolved with time.perf_counter() when delta ``seq`` is first sent to a client."""
+        future = asyncio.get_running_loop().create_future()
+        self.delivery_waiters[seq] = future
+        return future
+
+    def delivered(self, message: dict):
+        future = self.delivery_waiters.pop(message["seq"], None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    def alert_closed(self, building, floor, ended_at: str):
+        key = location_key(building, floor)
+        alert = self.alerts.pop(key, None)
+        self.fire[key] = False
+        self._publish({
+            "kind": "alert_closed",
+            "building": building,
+            "floor": floor,
+            "ended_at": ended_at,
+            "_id": alert["_id"] if alert else None,
+        })
+
+    def apply(self, message: dict, owned):
+        """Mirror another hub's stream (the dispatcher follows every worker this way).
+
+        ``owned(building, floor)`` tells which locations the other hub is authoritative for.
+        """
+        if message["kind"] == "snapshot":
+            incoming = {location_key(a["building"], a["floor"]): a for a in message["alerts"]}
+            for key, alert in list(self.alerts.items()):
+                if owned(alert["building"], alert["floor"]) and key not in incoming:
+                    self.alert_closed(alert["building"], alert["floor"], None)
+            for key, alert in incoming.items():
+                if self.alerts.get(key, {}).get("_id") != alert["_id"]:
+                    self.alert_opened(alert)
+        elif message["kind"] == "alert_opened":
+            self.alert_opened(message["alert"])
+        elif message["kind"] == "alert_closed":
+            self.alert_closed(message["building"], message["floor"], message["ended_at"])
+
+    def subscribe(self) -> "Subscriber":
+        subscriber = Subscriber()
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: "Subscriber"):
+        self.subscribers.discard(subscriber)
+
+
+class Subscriber:
+    # Per-client queue, so publishing never waits for a slow client
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, message: dict):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too far behind: drop what is queued and tell the sender to disconnect the client
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+async def serve_alerts(websocket: WebSocket, hub: AlertHub, since: int = None, epoch: str = None):
+    """Send the snapshot (or the deltas after ``since``) and then every new delta to one client."""
+    await websocket.accept()
+    subscriber = hub.subscribe()
+    try:
+        missed = hub.since(since, epoch) if since is not None else None
+        initial = [hub.snapshot()] if missed is None else missed
+        last_seq = hub.seq
+        for message in initial:
+            await websocket.send_json(message)
+
+        async def send_updates():
+            while True:
+                message = await subscriber.queue.get()
+                if message is None:
+                    await websocket.close(code=1013)        # try again later, resuming from last seq
+                    return
+                # Deltas published while the snapshot was taken are already included in it
+                if message["seq"] > last_seq:
+                    await websocket.send_json(message)
+                    if hub.delivery_waiters:
+                        hub.delivered(message)
+
+        async def wait_for_disconnect():
+            while True:
+                await websocket.receive_text()
+
+        tasks = [asyncio.create_task(send_updates()), asyncio.create_task(wait_for_disconnect())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if not isinstance(task.exception(), (WebSocketDisconnect, type(None))):
+                logger.warning("WebSocket error: %s", task.exception())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(subscriber)
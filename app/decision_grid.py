@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+from metrics import DECISION_GRID_LOOKUPS
+from model_backends import ModelBackend
+
+logger = logging.getLogger("sensor_api.grid")
+
+# Default grid bounds (temperature, humidity, soundLevel); they cover the normal and fire
+# ranges of the simulators, humidity goes down to 10 because fire mode sends 10-30
+GRID_LOWS = (16.0, 10.0, 30.0)
+GRID_HIGHS = (80.0, 95.0, 95.0)
+
+NORMAL, FIRE, UNCERTAIN = 0, 1, 2
+
+
+class DecisionGrid:
+    """Model predictions precomputed over a regular (temperature, humidity, soundLevel) grid.
+
+    Every cell holds 0 (normal), 1 (fire) or 2 (uncertain). A cell is uncertain when a cell
+    within ``margin`` steps of it, diagonals included, has a different prediction, i.e. the
+    decision boundary passes close by; lookups there, and outside the grid, are answered by
+    the real model instead. A decision region thinner than one step can fall between grid
+    points and is then missed entirely, so the step must be fine enough for the model (see
+    the README for the error rates measured on the shipped Random Forest).
+    """
+
+    def __init__(self, cells: np.ndarray, lows, step: float, meta: dict = None):
+        self.cells = cells
+        self.lows = np.asarray(lows, dtype=np.float64)
+        self.step = float(step)
+        self.shape = np.asarray(cells.shape)
+        self.meta = meta or {}
+
+    @classmethod
+    def build(cls, backend: ModelBackend, lows=GRID_LOWS, highs=GRID_HIGHS, step: float = 0.25, margin: int = 1,
+              meta: dict = None):
+        axes = [np.round(np.arange(low, high + step / 2, step), 6) for low, high in zip(lows, highs)]
+        shape = tuple(len(axis) for axis in axes)
+        cells = np.empty(shape, dtype=np.uint8)
+
+        # One temperature slab per backend call keeps batches large but memory bounded
+        humidity, sound = np.meshgrid(axes[1], axes[2], indexing="ij")
+        slab = np.column_stack([np.zeros(humidity.size), humidity.ravel(), sound.ravel()])
+        for i, temperature in enumerate(axes[0]):
+            slab[:, 0] = temperature
+            cells[i] = backend.predict(slab).reshape(shape[1:])
+
+        cls._mark_boundaries(cells, margin)
+        logger.info("Decision grid built", extra={"shape": shape, "step": step, "margin": margin, "backend": backend.name})
+        meta = {**(meta or {}), "lows": list(lows), "highs": list(highs), "step": step, "margin": margin}
+        return cls(cells, lows, step, meta)
+
+    @staticmethod
+    def _spread(values, axis: int, combine):
+        # Combine every cell with its two neighbours along one axis
+        lower = [slice(None)] * values.ndim
+        upper = [slice(None)] * values.ndim
+        lower[axis] = slice(None, -1)
+        upper[axis] = slice(1, None)
+        spread = values.copy()
+        spread[tuple(lower)] = combine(spread[tuple(lower)], values[tuple(upper)])
+        spread[tuple(upper)] = combine(spread[tuple(upper)], values[tuple(lower)])
+        return spread
+
+    @classmethod
+    def _mark_boundaries(cls, cells, margin: int):
+        # Min and max over the (2 * margin + 1)^3 cube around each cell, one axis at a time
+        lowest, highest = cells.copy(), cells.copy()
+        for axis in range(cells.ndim):
+            for _ in range(margin):
+                lowest = cls._spread(lowest, axis, np.minimum)
+                highest = cls._spread(highest, axis, np.maximum)
+        cells[lowest != highest] = UNCERTAIN
+
+    def save(self, path: str):
+        # Written to temporary files and renamed: workers sharing the path may have the old grid
+        # memory-mapped (truncating it in place would fault them) or be reading the sidecar
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, self.cells)
+        os.replace(tmp, path)
+        with open(tmp, "w") as f:
+            json.dump({**self.meta, "lows": self.lows.tolist(), "step": self.step, "shape": list(self.cells.shape)}, f)
+        os.replace(tmp, path + ".json")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        cells = np.load(path, mmap_mode="r" if mmap else None)
+        return cls(cells, meta["lows"], meta["step"], meta)
+
+    @classmethod
+    def load_or_build(cls, path: str, backend: ModelBackend, step: float, fingerprint: str, mmap: bool = True,
+                      margin: int = 1):
+        # Reuse the grid on disk when it was built for the same model, bounds, step and margin
+        expected = {"backend": backend.name, "fingerprint": fingerprint,
+                    "lows": list(GRID_LOWS), "highs": list(GRID_HIGHS), "step": step, "margin": margin}
+        if os.path.exists(path) and os.path.exists(path + ".json"):
+            grid = cls.load(path, mmap)
+            # Cells and sidecar are renamed one after the other; between the two a reader can see
+            # new cells with the old sidecar, which the shape check turns away
+            current = all(grid.meta.get(key) == value for key, value in expected.items())
+            if current and grid.meta.get("shape") == list(grid.cells.shape):
+                return grid
+        grid = cls.build(backend, GRID_LOWS, GRID_HIGHS, step, margin, meta={"backend": backend.name, "fingerprint": fingerprint})
+        try:
+            grid.save(path)
+            if mmap:
+                return cls.load(path, mmap)
+        except OSError as e:
+            logger.warning("Could not save decision grid to %s: %s", path, e)
+        return grid
+
+    def lookup(self, features) -> np.ndarray:
+        """Grid prediction per row; UNCERTAIN for rows outside the grid or near the boundary."""
+        features = np.asarray(features, dtype=np.float64)
+        index = np.rint((features - self.lows) / self.step).astype(np.int64)
+        inside = np.all((index >= 0) & (index < self.shape), axis=1)
+        result = np.full(len(features), UNCERTAIN, dtype=np.uint8)
+        if inside.any():
+            i = index[inside]
+            result[inside] = self.cells[i[:, 0], i[:, 1], i[:, 2]]
+        return result
+
+
+class DecisionGridBackend(ModelBackend):
+    # Answers from the grid and only calls the wrapped backend for uncertain rows
+    name = "decision_grid"
+
+    def __init__(self, grid: DecisionGrid, fallback: ModelBackend):
+        self.grid = grid
+        self.fallback = fallback
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        predictions = self.grid.lookup(features).astype(np.int32)
+        uncertain = predictions == UNCERTAIN
+        n_uncertain = int(uncertain.sum())
+        if n_uncertain:
+            predictions[uncertain] = self.fallback.predict(features[uncertain])
+            DECISION_GRID_LOOKUPS.labels(result="fallback").inc(n_uncertain)
+        DECISION_GRID_LOOKUPS.labels(result="hit").inc(len(features) - n_uncertain)
+        return predictions
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING
+from starlette.concurrency import run_in_threadpool
+
+from metrics import DETECTION_STAGE_SECONDS, TIME_TO_DETECTION_SECONDS
+
+logger = logging.getLogger("sensor_api.detection")
+
+# time.perf_counter() when the reading being ingested arrived
+reading_received = ContextVar("reading_received", default=None)
+
+# How long a new alert may wait for its first WebSocket send before the trace is recorded without it
+DELIVERY_TIMEOUT_SECONDS = 5.0
+
+
+def mark_received():
+    reading_received.set(time.perf_counter())
+
+
+def seconds_between(start: datetime, end: datetime):
+    return round((end - start).total_seconds(), 6)
+
+
+class DetectionTracer:
+    """Links each new fire alert back to the event that caused it and times every step.
+
+    Only alerts are traced, so the hot path pays for two perf_counter() calls per
+    prediction. When an alert opens, the in-process checkpoints are handed over here; the
+    rest (waiting for the WebSocket send, finding the event and the readings taken since
+    it started, storing the trace) runs in a background task. Stages:
+
+        sensor_delay     event start -> first reading at the location after it
+        detection_delay  that reading -> the reading that completed the fire prediction (both
+                         by their stored timestamps, i.e. the sensor clock)
+        ingest           reading received -> prediction started (insert, recent window)
+        prediction       model inference, including waiting for a model slot
+        alert_write      prediction -> alert stored (lookup and insert)
+        fanout           alert stored -> first WebSocket send of the alert
+    """
+
+    def __init__(self, events, readings, traces, hub, tz):
+        self.events = events
+        self.readings = readings
+        self.traces = traces
+        self.hub = hub
+        self.tz = tz
+        self.tasks = set()
+
+    def ensure_indexes(self):
+        self.traces.create_index([("event_id", ASCENDING)])
+
+    def alert_opened(self, alert: dict, message: dict, checkpoints: dict):
+        """Called on the event loop right after ``message`` (the alert delta) was published."""
+        waiter = self.hub.wait_delivery(message["seq"])
+        task = asyncio.create_task(self._finish(alert, message["seq"], waiter, checkpoints))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _finish(self, alert: dict, seq: int, waiter, checkpoints: dict):
+        try:
+            checkpoints["sent"] = await asyncio.wait_for(waiter, DELIVERY_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.hub.delivery_waiters.pop(seq, None)        # no client connected
+        try:
+            trace = await run_in_threadpool(self._record, alert, checkpoints)
+        except Exception as e:
+            logger.warning("Failed to record detection trace: %s", e)
+            return
+        logger.info("Detection traced", extra={
+            "building": alert["building"], "floor": alert["floor"], "event_id": trace["event_id"],
+            "time_to_detection": trace["time_to_detection"]
+        })
+
+    def _wall(self, checkpoint: float) -> datetime:
+        return datetime.fromtimestamp(checkpoint + time.time() - time.perf_counter(), self.tz)
+
+    def _record(self, alert: dict, checkpoints: dict) -> dict:
+        building, floor = alert["building"], alert["floor"]
+        # Server time the reading that completed the fire prediction was received. Stored reading
+        # timestamps come from the sensor clock, so they are compared with that reading's own
+        # timestamp (``reading_at``), never with detected_at
+        detected_at = datetime.fromisoformat(alert["detected_at"])
+        reading_at = checkpoints.get("reading_at")
+        stages = {
+            "ingest": checkpoints["prediction_started"] - checkpoints["received"],
+            "prediction": checkpoints["predicted"] - checkpoints["prediction_started"],
+            "alert_write": checkpoints["alert_inserted"] - checkpoints["predicted"],
+        }
+        delivered = "sent" in checkpoints
+        if delivered:
+            stages["fanout"] = checkpoints["sent"] - checkpoints["alert_inserted"]
+        reached_client_at = self._wall(checkpoints["sent" if delivered else "alert_inserted"])
+
+        trace = {
+            "alert_id": alert["_id"],
+            "event_id": None,
+            "building": building,
+            "floor": floor,
+            "event_start": None,
+            "first_reading_at": None,
+            "readings_since_event": None,
+            "detected_at": alert["detected_at"],
+            "alert_inserted_at": self._wall(checkpoints["alert_inserted"]).isoformat(),
+            "sent_at": reached_client_at.isoformat() if delivered else None,
+            "time_to_detection": None,
+        }
+
+        # The fire event at this location that was running when the fire was detected
+        event = self.events.find_one(
+            {"type": "fire", "building": building, "floor": floor, "start_time": {"$lte": alert["detected_at"]}},
+            sort=[("start_time", DESCENDING)]
+        )
+        if event:
+            event_start = datetime.fromisoformat(event["start_time"])
+            if detected_at > event_start + timedelta(seconds=event["duration"]):
+                event = None
+        if event:
+            window = {"building": building, "floor": floor,
+                      "timestamp": {"$gte": event["start_time"], "$lte": reading_at or alert["detected_at"]}}
+            first = self.readings.find_one(window, sort=[("timestamp", ASCENDING)])
+            trace.update({
+                "event_id": str(event["_id"]),
+                "event_start": event["start_time"],
+                "readings_since_event": self.readings.count_documents(window),
+                "time_to_detection": seconds_between(event_start, reached_client_at),
+            })
+            if first:
+                first_reading_at = datetime.fromisoformat(first["timestamp"])
+                trace["first_reading_at"] = first["timestamp"]
+                stages["sensor_delay"] = seconds_between(event_start, first_reading_at)
+                if reading_at:
+                    stages["detection_delay"] = seconds_between(first_reading_at, datetime.fromisoformat(reading_at))
+            TIME_TO_DETECTION_SECONDS.labels(delivered=str(delivered).lower()).observe(trace["time_to_detection"])
+
+        trace["stages"] = {stage: round(seconds, 6) for stage, seconds in stages.items()}
+        for stage, seconds in stages.items():
+            DETECTION_STAGE_SECONDS.labels(stage=stage).observe(max(seconds, 0.0))
+        self.traces.insert_one(dict(trace))
+        return trace
@@ -0,0 +1,400 @@
+"""Front-of-house dispatcher for the sharded, multi-process API.
+
+    python dispatcher.py --workers 4
+
+Starts ``--workers`` copies of ``uvicorn main:app`` on loopback ports and serves the public
+port itself. Every location (building, floor) is owned by exactly one worker, chosen by
+``shard_for``; readings and location-scoped requests are forwarded to the owner, which
+keeps that location's detection state in memory (LOCATION_STATE=memory) instead of
+querying MongoDB for it. Requests without a location go to worker 0. The dispatcher
+follows the alert stream of every worker and serves /ws/alerts and /alerts/active from
+the merged snapshot itself.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from urllib.parse import parse_qs, quote
+
+import httpx
+import numpy as np
+import uvicorn
+import websockets
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from admission import Overloaded
+from alert_hub import AlertHub, serve_alerts
+from ingest_channel import serve_ingest
+from series_hub import parse_series
+from location_state import shard_for
+from sensor_registry import MAX_UNKNOWN, UNKNOWN_TTL_SECONDS
+from wire_format import BATCH_MEDIA_TYPE, JSON_MEDIA_TYPE, decode_body, decode_batch, validate_batch, location_of, media_type
+from log_config import setup_logging
+
+logger = logging.getLogger("sensor_api.dispatcher")
+
+# Headers that describe a single connection and must not be forwarded
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "host", "content-length"}
+
+
+def route_shard(method: str, path: str, query: str, body: bytes, shard_count: int, content_type: str = None) -> int:
+    """Index of the worker that should handle a request."""
+    location = None
+    if method == "POST" and path == "/sensor-data/":
+        try:
+            reading = decode_body(body, content_type)
+            location = (reading["building"], reading["floor"])
+        except (ValueError, KeyError, TypeError):
+            pass        # let worker 0 return the validation error
+    elif path.startswith("/fire-status/"):
+        parts = path.split("/")
+        if len(parts) == 4:
+            location = (parts[2], parts[3])
+    else:
+        params = parse_qs(query)
+        if "building" in params and "floor" in params:
+            location = (params["building"][0], params["floor"][0])
+
+    if location is None:
+        return 0
+    try:
+        return shard_for(location[0], int(location[1]), shard_count)
+    except (ValueError, TypeError):
+        return 0
+
+
+def split_batch(body: bytes, shard_count: int, positions: bool = False) -> dict:
+    """Binary batch split into one sub-batch per owning worker: {shard: bytes}.
+
+    Empty for batches that are empty or invalid; worker 0 answers those whole, so
+    error positions refer to the batch the client sent. With ``positions`` the values
+    are (bytes, positions of the sub-batch's records in the batch).
+    """
+    try:
+        records = decode_batch(body)
+    except ValueError:
+        return {}
+    if validate_batch(records):
+        return {}
+    locations, inverse = np.unique(records["location"], return_inverse=True)
+    owners = np.array([shard_for(*location_of(location), shard_count) for location in locations], dtype=np.int64)
+    record_shards = owners[inverse]
+    if positions:
+        return {
+            int(shard): (records[record_shards == shard].tobytes(), np.flatnonzero(record_shards == shard))
+            for shard in np.unique(owners)
+        }
+    return {int(shard): records[record_shards == shard].tobytes() for shard in np.unique(owners)}
+
+
+async def follow_worker(hub: AlertHub, ws_url: str, shard: int, shard_count: int):
+    # Mirror one worker's alerts into the dispatcher hub, resuming after reconnects
+    def owned(building, floor):
+        return shard_for(building, int(floor), shard_count) == shard
+
+    since = epoch = None
+    while True:
+        url = ws_url if epoch is None else f"{ws_url}?since={since}&epoch={epoch}"
+        try:
+            async with websockets.connect(url) as upstream:
+                async for raw in upstream:
+                    message = json.loads(raw)
+                    hub.apply(message, owned)
+                    since, epoch = message["seq"], message["epoch"]
+        except (OSError, websockets.WebSocketException) as e:
+            logger.warning("Alert stream of worker %d interrupted: %s", shard, e)
+        await asyncio.sleep(1)
+
+
+def create_dispatcher(worker_clients: list, worker_ws_urls: list = None, ingest_window: int = 32) -> FastAPI:
+    """Dispatcher app forwarding to ``worker_clients`` (httpx.AsyncClient per worker, in shard order).
+
+    ``worker_ws_urls`` are the workers' WebSocket base URLs (``ws://host:port``), in the same order.
+    """
+    shard_count = len(worker_clients)
+    alert_hub = AlertHub()
+    sensor_locations = {}       # sensorId -> (building, floor), for compact readings
+    unknown_sensors = {}        # sensorId -> time.monotonic() until which worker 0 is not asked again
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        followers = [
+            asyncio.create_task(follow_worker(alert_hub, ws_url + "/ws/alerts", shard, shard_count))
+            for shard, ws_url in enumerate(worker_ws_urls or [])
+        ]
+        try:
+            yield
+        finally:
+            for task in followers:
+                task.cancel()
+
+    app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None, lifespan=lifespan)
+
+    async def forward(request: Request, shard: int, path: str):
+        body = await request.body()
+        headers = [(k, v) for k, v in request.headers.items() if k.lower() not in HOP_HEADERS]
+        client = worker_clients[shard]
+        upstream = client.build_request(request.method, path, params=request.url.query, headers=headers, content=body)
+        response = await client.send(upstream, stream=True)
+        # Stream the worker's response back so exports are not buffered here
+        return StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers={k: v for k, v in response.headers.items() if k.lower() not in HOP_HEADERS},
+            background=BackgroundTask(response.aclose),
+        )
+
+    async def forward_batch(request: Request, body: bytes):
+        # A batch can hold readings of locations owned by different workers: send each worker
+        # its share and merge the answers. Shares are saved independently, not atomically.
+        parts = split_batch(body, shard_count, positions=True)
+        if len(parts) <= 1:
+            return await forward(request, next(iter(parts), 0), request.url.path)
+        headers = [(k, v) for k, v in request.headers.items() if k.lower() not in HOP_HEADERS]
+        responses = await asyncio.gather(*(
+            worker_clients[shard].post(request.url.path, content=part, headers=headers)
+            for shard, (part, _) in parts.items()
+        ))
+        failed = [response for response in responses if response.status_code != 200]
+        if failed:
+            return Response(failed[0].content, status_code=failed[0].status_code,
+                            headers={k: v for k, v in failed[0].headers.items() if k.lower() not in HOP_HEADERS})
+        answers = [response.json() for response in responses]
+        # A worker's unsaved readings are reported at their positions in the whole batch
+        not_saved = sorted(
+            int(positions[index])
+            for (_, positions), answer in zip(parts.values(), answers) for index in answer.get("failed", [])
+        )
+        count = sum(answer["count"] for answer in answers)
+        if not_saved:
+            return JSONResponse({"message": "Partially saved", "count": count, "failed": not_saved})
+        return JSONResponse({"message": "Data saved", "count": count})
+
+    async def compact_shard(body: bytes, content_type: str) -> int:
+        # Compact readings only carry the sensor ID; its location comes from the registry (once per sensor)
+        try:
+            sensor_id = decode_body(body, content_type)["sensorId"]
+        except (ValueError, KeyError, TypeError):
+            return 0
+        location = sensor_locations.get(sensor_id)
+        if location is None:
+            if unknown_sensors.get(sensor_id, 0) > time.monotonic():
+                return 0
+            response = await worker_clients[0].get(f"/sensors/{sensor_id}")
+            if response.status_code != 200:
+                # Worker 0 answers the unknown sensor; its ID is not looked up again for a while
+                if len(unknown_sensors) >= MAX_UNKNOWN:
+                    unknown_sensors.clear()
+                unknown_sensors[sensor_id] = time.monotonic() + UNKNOWN_TTL_SECONDS
+                return 0
+            sensor = response.json()
+            location = sensor_locations[sensor_id] = (sensor["building"], sensor["floor"])
+        return shard_for(location[0], location[1], shard_count)
+
+    async def post_to_worker(shard: int, path: str, content: bytes, content_type: str):
+        response = await worker_clients[shard].post(path, content=content, headers={"content-type": content_type})
+        if response.status_code == 200:
+            return
+        try:
+            detail = response.json().get("detail")
+        except ValueError:
+            detail = response.text
+        if "retry-after" in response.headers:
+            raise Overloaded(response.status_code, detail, float(response.headers["retry-after"]))
+        raise HTTPException(status_code=response.status_code, detail=detail)
+
+    # The gateway's stream ends here; each message is posted to the worker that owns it,
+    # over the dispatcher's pooled keep-alive connections
+    async def channel_message(kind: str, payload):
+        if kind == "batch":
+            parts = split_batch(payload, shard_count) or {0: payload}
+            await asyncio.gather(*(
+                post_to_worker(shard, "/sensor-data/batch", part, BATCH_MEDIA_TYPE) for shard, part in parts.items()
+            ))
+            return
+        body = json.dumps(payload).encode()
+        if kind == "compact":
+            await post_to_worker(await compact_shard(body, JSON_MEDIA_TYPE), "/sensor-data/compact", body, JSON_MEDIA_TYPE)
+        else:
+            shard = route_shard("POST", "/sensor-data/", "", body, shard_count, JSON_MEDIA_TYPE)
+            await post_to_worker(shard, "/sensor-data/", body, JSON_MEDIA_TYPE)
+
+    @app.get("/alerts/active")
+    def get_alert_snapshot():
+        return alert_hub.snapshot()
+
+    @app.get("/healthz")
+    async def get_health():
+        return {"status": "ok"}
+
+    # Ready once every worker is; their reports are included
+    @app.get("/readyz")
+    async def get_readiness():
+        responses = await asyncio.gather(
+            *(client.get("/readyz", timeout=2) for client in worker_clients), return_exceptions=True
+        )
+        workers = []
+        for response in responses:
+            if isinstance(response, Exception):
+                workers.append({"ready": False, "detail": f"unreachable: {type(response).__name__}"})
+                continue
+            try:
+                workers.append(response.json())
+            except ValueError:
+                workers.append({"ready": False, "detail": f"HTTP {response.status_code}"})
+        ready = all(worker.get("ready") for worker in workers)
+        return JSONResponse({"ready": ready, "workers": workers}, status_code=200 if ready else 503)
+
+    # Direct access to one worker, e.g. /shards/2/metrics or POST /shards/2/admin/profile
+    @app.api_route("/shards/{shard}/{path:path}", methods=["GET", "POST"])
+    async def to_shard(shard: int, path: str, request: Request):
+        if not 0 <= shard < shard_count:
+            return Response(status_code=404)
+        return await forward(request, shard, "/" + path)
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def dispatch(path: str, request: Request):
+        body = await request.body()
+        content_type = request.headers.get("content-type")
+        if request.method == "POST" and request.url.path == "/sensor-data/batch" and media_type(content_type) == BATCH_MEDIA_TYPE:
+            return await forward_batch(request, body)
+        if request.method == "POST" and request.url.path == "/sensor-data/compact":
+            shard = await compact_shard(body, content_type)
+        else:
+            shard = route_shard(request.method, request.url.path, request.url.query, body, shard_count, content_type)
+        return await forward(request, shard, request.url.path)
+
+    @app.websocket("/ws/alerts")
+    async def alert_websocket(websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+        await serve_alerts(websocket, alert_hub, since, epoch)
+
+    # Each worker streams the series of the locations it owns; their frames are relayed unchanged
+    @app.websocket("/ws/series")
+    async def series_websocket(websocket: WebSocket, series: str = ""):
+        await websocket.accept()
+        try:
+            keys = parse_series(series)
+        except ValueError as e:
+            await websocket.close(code=1008, reason=str(e))
+            return
+        if not worker_ws_urls:
+            await websocket.close(code=1011, reason="Worker streams are not configured")
+            return
+        by_shard = {}
+        for key in keys:
+            _, building, floor = key.split(":")
+            by_shard.setdefault(shard_for(building, int(floor), shard_count), []).append(key)
+
+        async def relay(upstream):
+            async for message in upstream:
+                await websocket.send_text(message)
+
+        async def wait_for_disconnect():
+            while True:
+                await websocket.receive_text()
+
+        try:
+            async with AsyncExitStack() as stack:
+                upstreams = [
+                    await stack.enter_async_context(websockets.connect(
+                        f"{worker_ws_urls[shard]}/ws/series?series={quote(','.join(shard_keys))}"
+                    ))
+                    for shard, shard_keys in by_shard.items()
+                ]
+                subscribed = [json.loads(await upstream.recv()) for upstream in upstreams]
+                await websocket.send_json({"kind": "subscribed", "series": keys, "frame_ms": subscribed[0]["frame_ms"]})
+                tasks = [asyncio.create_task(relay(upstream)) for upstream in upstreams]
+                tasks.append(asyncio.create_task(wait_for_disconnect()))
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in pending:
+                    task.cancel()
+                if any(isinstance(task.exception(), WebSocketDisconnect) for task in done):
+                    return
+        except (OSError, websockets.WebSocketException) as e:
+            logger.warning("Series stream interrupted: %s", e)
+        # A worker stream ended: the dashboard reconnects and refetches the gap
+        await websocket.close(code=1013)
+
+    @app.websocket("/ws/ingest")
+    async def ingest_websocket(websocket: WebSocket):
+        await serve_ingest(websocket, channel_message, ingest_window)
+
+    return app
+
+
+def start_workers(count: int, base_port: int):
+    processes = []
+    for index in range(count):
+        env = {
+            **os.environ,
+            "SHARD_INDEX": str(index),
+            "SHARD_COUNT": str(count),
+            "LOCATION_STATE": "memory",
+        }
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(base_port + index),
+             "--timeout-graceful-shutdown", "5"],
+            env=env,
+        ))
+    return processes
+
+
+def wait_for_workers(urls: list, timeout: float = 300):
+    # Workers answer at once and report ready when MongoDB, a model and their alerts are loaded
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                if httpx.get(url + "/readyz", timeout=2).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Worker {url} did not become ready within {timeout}s")
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the sensor API as location-sharded worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000, help="Public port served by the dispatcher")
+    parser.add_argument("--base-port", type=int, default=8100, help="Worker i listens on 127.0.0.1:<base-port + i>")
+    args = parser.parse_args()
+
+    setup_logging()
+    # uvicorn re-raises SIGTERM after shutting down; exit normally so the workers are stopped below
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.workers)]
+    processes = start_workers(args.workers, args.base_port)
+    try:
+        wait_for_workers(urls)
+        logger.info("Workers ready", extra={"workers": args.workers})
+        limits = httpx.Limits(max_connections=256, max_keepalive_connections=64)
+        clients = [httpx.AsyncClient(base_url=url, limits=limits, timeout=30) for url in urls]
+        ws_urls = [url.replace("http://", "ws://") for url in urls]
+        ingest_window = int(os.getenv("INGEST_CHANNEL_WINDOW", "32"))
+        uvicorn.run(create_dispatcher(clients, ws_urls, ingest_window), host=args.host, port=args.port)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+
+try:
+    import pyarrow as pa
+except ImportError:     # Arrow export is optional
+    pa = None
+
+ARROW_AVAILABLE = pa is not None
+
+# Number of documents fetched from MongoDB per round trip
+EXPORT_BATCH_SIZE = 5000
+# Rows per CSV chunk / Arrow record batch
+EXPORT_CHUNK_ROWS = 1000
+
+# Column order used by every export format
+EXPORT_FIELDS = [
+    "_id", "sensorId", "type", "vendorName", "vendorEmail", "description",
+    "building", "floor", "temperature", "humidity", "soundLevel", "timestamp"
+]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def open_export_cursor(collection, query: dict):
+    return collection.find(query, batch_size=EXPORT_BATCH_SIZE).sort("timestamp", 1)
+
+
+def _row(doc: dict) -> dict:
+    row = {field: doc.get(field) for field in EXPORT_FIELDS}
+    row["_id"] = str(doc["_id"])
+    return row
+
+
+def _chunks(cursor, size: int):
+    chunk = []
+    for doc in cursor:
+        chunk.append(_row(doc))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# One JSON document per line
+def stream_ndjson(cursor):
+    for chunk in _chunks(cursor, EXPORT_CHUNK_ROWS):
+        yield "".join(json.dumps(row, default=str) + "\n" for row in chunk).encode()
+
+
+def stream_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for chunk in _chunks(cursor, EXPORT_CHUNK_ROWS):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def arrow_schema():
+    return pa.schema([
+        ("_id", pa.string()),
+        ("sensorId", pa.string()),
+        ("type", pa.string()),
+        ("vendorName", pa.string()),
+        ("vendorEmail", pa.string()),
+        ("description", pa.string()),
+        ("building", pa.string()),
+        ("floor", pa.int64()),
+        ("temperature", pa.float64()),
+        ("humidity", pa.float64()),
+        ("soundLevel", pa.float64()),
+        ("timestamp", pa.string()),
+    ])
+
+
+class _ChunkSink:
+    # Minimal writable file object that hands written bytes back to the generator
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+# Arrow IPC stream: schema message followed by one record batch per chunk
+def stream_arrow(cursor):
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    yield sink.take()
+
+    for chunk in _chunks(cursor, EXPORT_CHUNK_ROWS):
+        columns = {name: [row[name] for row in chunk] for name in schema.names}
+        writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+        yield sink.take()
+
+    writer.close()
+    yield sink.take()
+
+
+EXPORT_STREAMS = {
+    "ndjson": stream_ndjson,
+    "csv": stream_csv,
+    "arrow": stream_arrow,
+}
+
+
+# Stream a cursor in the given format and always release the cursor afterwards
+def export_stream(cursor, fmt: str):
+    try:
+        yield from EXPORT_STREAMS[fmt](cursor)
+    finally:
+        cursor.close()
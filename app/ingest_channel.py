@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import struct
+from collections import deque
+
+from fastapi import HTTPException, WebSocket
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+
+from admission import Overloaded
+from metrics import INGEST_CHANNELS
+
+logger = logging.getLogger("sensor_api.ingest_channel")
+
+# Acks are sent at most this often; completions in between are covered by one cumulative ack
+ACK_INTERVAL_SECONDS = 0.02
+# Binary frames start with the sequence number, followed by a packed batch (wire_format.py)
+SEQ_HEADER = struct.Struct("<q")
+MESSAGE_KINDS = ("reading", "compact")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def parse_frame(message: dict):
+    """(seq, kind, payload) of one WebSocket frame: a JSON reading or a binary batch."""
+    data = message.get("bytes")
+    if data is not None:
+        if len(data) < SEQ_HEADER.size:
+            raise ProtocolError("Binary frame shorter than its sequence number")
+        return SEQ_HEADER.unpack_from(data)[0], "batch", data[SEQ_HEADER.size:]
+    try:
+        frame = json.loads(message.get("text") or "")
+    except ValueError:
+        raise ProtocolError("Text frames must be JSON")
+    if not isinstance(frame, dict) or not isinstance(frame.get("seq"), int):
+        raise ProtocolError("Every message needs an integer seq")
+    kinds = [kind for kind in MESSAGE_KINDS if kind in frame]
+    if len(kinds) != 1:
+        raise ProtocolError("Every message needs exactly one of: " + ", ".join(MESSAGE_KINDS))
+    return frame["seq"], kinds[0], frame[kinds[0]]
+
+
+def describe_failure(error: Exception):
+    # Same status codes the HTTP endpoints answer with
+    if isinstance(error, Overloaded):
+        return error.status_code, error.detail, error.retry_after
+    if isinstance(error, HTTPException):
+        return error.status_code, error.detail, None
+    if isinstance(error, RequestValidationError):
+        return 422, jsonable_encoder(error.errors()), None
+    logger.warning("Ingest channel message failed: %s", error)
+    return 500, "Internal error", None
+
+
+async def serve_ingest(websocket: WebSocket, handle, window: int):
+    """Feed readings streamed over one WebSocket to ``handle(kind, payload)``.
+
+    The server opens with ``{"kind": "hello", "window": N}``. Each message carries a
+    client-chosen, strictly increasing ``seq``; up to ``window`` messages are processed at
+    once, and no further frame is read while the window is full, so a fast gateway is
+    slowed down by TCP back-pressure instead of queueing without bound here. Completed
+    messages are acknowledged cumulatively (``{"kind": "ack", "seq": n}`` covers every
+    message up to n); failed ones get a ``nack`` with the HTTP status first, and the
+    gateway decides whether to resend them. Delivery is at least once: messages that were
+    not acknowledged before a disconnect should be resent on the next connection.
+    """
+    await websocket.accept()
+    await websocket.send_json({"kind": "hello", "window": window})
+    INGEST_CHANNELS.inc()
+
+    slots = asyncio.Semaphore(window)
+    received = deque()          # [seq, done] in arrival order
+    outbox = []                 # nacks waiting to be sent
+    wake = asyncio.Event()
+    tasks = set()
+
+    async def process(entry, kind, payload):
+        try:
+            await handle(kind, payload)
+        except Exception as e:
+            status, detail, retry_after = describe_failure(e)
+            outbox.append({"kind": "nack", "seq": entry[0], "status": status, "detail": detail, "retry_after": retry_after})
+        finally:
+            entry[1] = True
+            slots.release()
+            wake.set()
+
+    async def send_acks():
+        acked = None
+        while True:
+            await wake.wait()
+            wake.clear()
+            # Nacks go out before the ack that covers them
+            while outbox:
+                await websocket.send_json(outbox.pop(0))
+            while received and received[0][1]:
+                acked = received.popleft()[0]
+            if acked is not None:
+                await websocket.send_json({"kind": "ack", "seq": acked})
+                acked = None
+            await asyncio.sleep(ACK_INTERVAL_SECONDS)
+
+    sender = asyncio.create_task(send_acks())
+    last_seq = None
+    try:
+        while True:
+            await slots.acquire()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                seq, kind, payload = parse_frame(message)
+                if last_seq is not None and seq <= last_seq:
+                    raise ProtocolError("Sequence numbers must increase")
+            except ProtocolError as e:
+                await websocket.close(code=1008, reason=str(e))
+                break
+            last_seq = seq
+            entry = [seq, False]
+            received.append(entry)
+            task = asyncio.create_task(process(entry, kind, payload))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        # Messages already being processed are saved even if the gateway is gone
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        sender.cancel()
+        INGEST_CHANNELS.dec()
@@ -0,0 +1,122 @@
+import threading
+import zlib
+
+# Reading field holding the value for each sensor type
+SENSOR_FIELDS = {"Temperature": "temperature", "Humidity": "humidity", "Acoustic": "soundLevel"}
+
+
+def shard_for(building: str, floor: int, shard_count: int) -> int:
+    # crc32 rather than hash(): it must give the same shard in the dispatcher and every worker
+    return zlib.crc32(f"{building}:{int(floor)}".encode()) % shard_count
+
+
+class MongoLocationStore:
+    """Per-location detection state read from MongoDB on every reading.
+
+    Correct with any number of API processes, at the cost of two queries per reading.
+    """
+
+    def __init__(self, readings_collection, alerts_collection):
+        self.readings = readings_collection
+        self.alerts = alerts_collection
+
+    def record_reading(self, reading: dict):
+        pass
+
+    def recent_features(self, building, floor, window_start: str):
+        # Latest reading of every type inside the window, as [temperature, humidity, soundLevel]
+        recent = self.readings.find({"building": building, "floor": floor, "timestamp": {"$gte": window_start}})
+        latest = {d["type"]: d for d in recent}
+        if not set(SENSOR_FIELDS).issubset(latest):
+            return None
+        return [latest[sensor_type][field] for sensor_type, field in SENSOR_FIELDS.items()]
+
+    def open_alert(self, building, floor):
+        return self.alerts.find_one({"building": building, "floor": floor, "type": "fire", "ended_at": {"$exists": False}})
+
+    def alert_opened(self, alert: dict):
+        pass
+
+    def alert_closed(self, building, floor):
+        pass
+
+
+class LocationState:
+    __slots__ = ("latest", "open_alert")
+
+    def __init__(self):
+        self.latest = {}            # sensor type -> (timestamp, value)
+        self.open_alert = None
+
+
+class MemoryLocationStore(MongoLocationStore):
+    """Per-location detection state kept in this process.
+
+    Only valid when every reading for a location reaches the same process, as in the
+    sharded deployment (see dispatcher.py). A location is loaded from MongoDB the first
+    time it is seen; after that no queries are made for it. ``load`` blocks, so the API
+    calls it in the threadpool (through the Mongo limiter) before the first use of a location.
+    """
+
+    def __init__(self, readings_collection, alerts_collection):
+        super().__init__(readings_collection, alerts_collection)
+        self.locations = {}
+        self.lock = threading.Lock()
+
+    def loaded(self, building, floor) -> bool:
+        return (building, floor) in self.locations
+
+    def load(self, building, floor) -> LocationState:
+        key = (building, floor)
+        state = self.locations.get(key)
+        if state is None:
+            with self.lock:
+                state = self.locations.get(key)
+                if state is None:
+                    state = self._load(building, floor)
+                    self.locations[key] = state
+        return state
+
+    def _get(self, building, floor) -> LocationState:
+        return self.locations.get((building, floor)) or self.load(building, floor)
+
+    def _load(self, building, floor) -> LocationState:
+        state = LocationState()
+        # Newest reading of each type; older ones fall out of the detection window anyway
+        for sensor_type, field in SENSOR_FIELDS.items():
+            reading = self.readings.find_one(
+                {"building": building, "floor": floor, "type": sensor_type},
+                sort=[("timestamp", -1)]
+            )
+            if reading and reading.get(field) is not None:
+                state.latest[sensor_type] = (reading["timestamp"], reading[field])
+        state.open_alert = super().open_alert(building, floor)
+        return state
+
+    def record_reading(self, reading: dict):
+        field = SENSOR_FIELDS.get(reading["type"])
+        state = self.locations.get((reading["building"], reading["floor"]))
+        if state is None:
+            return      # not loaded yet: the first load reads this (already stored) reading from MongoDB
+        if field and reading.get(field) is not None:
+            # A reading that arrives late (e.g. with a sensor timestamp) must not replace a newer one
+            current = state.latest.get(reading["type"])
+            if current is None or reading["timestamp"] >= current[0]:
+                state.latest[reading["type"]] = (reading["timestamp"], reading[field])
+
+    def recent_features(self, building, floor, window_start: str):
+        latest = self._get(building, floor).latest
+        if not set(SENSOR_FIELDS).issubset(latest):
+            return None
+        if any(latest[sensor_type][0] < window_start for sensor_type in SENSOR_FIELDS):
+            return None
+        return [latest[sensor_type][1] for sensor_type in SENSOR_FIELDS]
+
+    def open_alert(self, building, floor):
+        return self._get(building, floor).open_alert
+
+    def alert_opened(self, alert: dict):
+        self._get(alert["building"], alert["floor"]).open_alert = alert
+
+    def alert_closed(self, building, floor):
+        self._get(building, floor).open_alert = None
@@ -0,0 +1,88 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and is logged as a field
+_RECORD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "sampled"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only 1 in `rate` records logged with extra={"sampled": True}.
+
+    Per-reading messages are marked as sampled; warnings and errors are never dropped.
+    """
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = max(1, rate)
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        return next(self._counter) % self.rate == 0
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    # Only render the message and traceback text; formatting happens on the listener thread
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging():
+    """Route all logging through a queue so callers never block on stdout.
+
+    LOG_LEVEL sets the level, LOG_FORMAT=text switches to plain lines and
+    LOG_SAMPLE_RATE keeps 1 in N per-reading (sampled) records.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json") == "text":
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(int(os.getenv("LOG_SAMPLE_RATE", "100"))))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -1,22 +1,71 @@
 from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi import WebSocket, WebSocketDisconnect
+from fastapi import WebSocket
 import asyncio
-from pydantic import BaseModel, EmailStr
+import logging
+import time
+from collections import defaultdict
+from pydantic import BaseModel, EmailStr, ValidationError
 from typing import Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 import math
+import pymongo
+from contextlib import asynccontextmanager
+from db_connect import (
+    client, db, ensure_indexes, sensor_readings_collection, events_collection, alerts_collection,
+    sensor_readings_hourly_collection, sensor_readings_daily_collection, retention_state_collection,
+    sensors_collection, detection_traces_collection
+)
+from starlette.concurrency import run_in_threadpool
+from log_config import setup_logging
+from response_cache import ResponseCache, cached_json
+from metrics import (
+    INGEST_SECONDS, INGEST_READINGS, PREDICTIONS, MODEL_BACKEND_SELECTED, ALERTS_OPENED, ALERTS_CLOSED, WEBSOCKET_CLIENTS,
+    SERIES_SUBSCRIPTIONS, stage_timer, inference_timer, register_cache_metrics, record_backend_selection, render_metrics
+)
+from admission import StageLimiter, CircuitBreaker, Overloaded, deadline
+from alert_hub import AlertHub, serve_alerts
+from series_hub import SeriesHub, serve_series
+from detection_trace import DetectionTracer, mark_received, reading_received
+from ingest_channel import serve_ingest
+from profiling import Profiler, ProfilingMiddleware, MemoryTracer, check_admin
+from readiness import Readiness
+from retention import RetentionManager, TIERS
+from location_state import MongoLocationStore, MemoryLocationStore, shard_for, SENSOR_FIELDS
+from sensor_registry import SensorRegistry
+from wire_format import (
+    MSGPACK_MEDIA_TYPES, MSGPACK_AVAILABLE, BATCH_MEDIA_TYPE, SENSOR_TYPES,
+    media_type, decode_body, decode_batch, validate_batch, location_of
+)
 import numpy as np
-from db_connect import sensor_readings_collection, events_collection, alerts_collection
+from model_backends import (
+    load_forest_backends, load_tensorflow_backends, select_backend, resolve_backend, model_fingerprint,
+    CircuitBreakerBackend, TFServingBackend, BACKEND_NAMES
+)
+from decision_grid import DecisionGrid, DecisionGridBackend
+from export import EXPORT_STREAMS, EXPORT_MEDIA_TYPES, open_export_cursor, export_stream, ARROW_AVAILABLE
 from zoneinfo import ZoneInfo
-import joblib
-from keras.models import load_model
-import requests
+from bson import ObjectId
 
-app = FastAPI()
+setup_logging()
+logger = logging.getLogger("sensor_api")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve right away (/healthz, /readyz); models, MongoDB and the alert snapshot come up in the background
+    startup = asyncio.create_task(start_up())
+    try:
+        yield
+    finally:
+        await shut_down(startup)
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Timezone setup
 local_tz = ZoneInfo("Europe/Athens")
@@ -26,16 +75,119 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))      # Set directory for HTML templates
 app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR,"static")), name="static")     # Serve static assets (CSS, JS)
 
-# ML model paths
-rf_model_path = os.path.join("ML", "models", "rf_model.pkl")
-nn_model_path = os.path.join("ML", "models", "nn_model.keras")
-scaler_path = os.path.join("ML", "models", "scaler.pkl")
-# Load ML models
-rf_model = joblib.load(rf_model_path)
-nn_model = load_model(nn_model_path)
-scaler = joblib.load(scaler_path)
+# TF Serving REST endpoint for the neural network
+TF_SERVING_URL = os.getenv("TF_SERVING_URL", "http://tf-serving:8501/v1/models/fire_nn:predict")
+
+# Model backend used for live detection: "auto" or one of rf_model, rf_compiled, nn_model, saved_model, tf_serving
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "auto")
+# Targets for "auto": accuracy on the simulator probe set and median single-row latency
+MODEL_MIN_ACCURACY = float(os.getenv("MODEL_MIN_ACCURACY", "0.95"))
+MODEL_MAX_LATENCY_MS = float(os.getenv("MODEL_MAX_LATENCY_MS", "20"))
+MODEL_FALLBACK_BACKEND = os.getenv("MODEL_FALLBACK_BACKEND", "rf_model")
+if MODEL_BACKEND not in ("auto", *BACKEND_NAMES):
+    raise ValueError(f"MODEL_BACKEND must be auto or one of {', '.join(BACKEND_NAMES)}, not {MODEL_BACKEND!r}")
+if MODEL_FALLBACK_BACKEND not in ("rf_model", "rf_compiled"):
+    raise ValueError(f"MODEL_FALLBACK_BACKEND must be rf_model or rf_compiled, not {MODEL_FALLBACK_BACKEND!r}")
+# Optional precomputed decision grid in front of the selected backend
+DECISION_GRID = os.getenv("DECISION_GRID", "0") == "1"
+DECISION_GRID_STEP = float(os.getenv("DECISION_GRID_STEP", "0.25"))
+DECISION_GRID_MARGIN = int(os.getenv("DECISION_GRID_MARGIN", "1"))
+DECISION_GRID_PATH = os.getenv("DECISION_GRID_PATH", os.path.join("ML", "models", "decision_grid.npy"))
+
+# ML models, loaded at startup (see load_models); detection is skipped until a backend is active
+model_backends = {}
+active_backend = None
+selected_backend = None
+
+# Active alerts and fire map pushed to dashboards over /ws/alerts
+alert_hub = AlertHub()
+
+# New points of the chart series dashboards subscribed to over /ws/series, flushed once per frame
+series_hub = SeriesHub(frame_seconds=float(os.getenv("SERIES_FRAME_MS", "250")) / 1000)
+
+# Times each new alert from the fire event's start to its first WebSocket send
+detection_tracer = DetectionTracer(events_collection, sensor_readings_collection, detection_traces_collection, alert_hub, local_tz)
+
+# Sharded deployment (see dispatcher.py): this worker's shard and the number of shards
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+
+
+# When sharded, readings for other locations are ingested (and invalidated) by other workers,
+# so only a worker's own location-scoped queries can be cached; the rest go to worker 0 uncached
+def cacheable(building=None, floor=None) -> bool:
+    return SHARD_COUNT == 1 or (building is not None and floor is not None)
+
+
+# Where per-location detection state lives: "mongo" (queried per reading) or "memory"
+# (owned by this process; only valid when all readings for a location reach it)
+LOCATION_STATE = os.getenv("LOCATION_STATE", "mongo")
+location_store = (MemoryLocationStore if LOCATION_STATE == "memory" else MongoLocationStore)(
+    sensor_readings_collection, alerts_collection
+)
 
-active_connections = []
+# Registered sensors; compact readings are joined with their metadata from here
+sensor_registry = SensorRegistry(sensors_collection)
+
+# Cache for the read endpoints polled by dashboards
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "30"))
+)
+EVENTS_CACHE_TTL_SECONDS = float(os.getenv("EVENTS_CACHE_TTL_SECONDS", "5"))
+
+# Sensor-supplied timestamps are trusted within these bounds of the receive time: up to
+# READING_MAX_AGE_SECONDS old (older readings are rejected with 422; keep it within the
+# rollups' ROLLUP_LATE_MINUTES) and READING_MAX_SKEW_SECONDS ahead (later ones are clamped)
+READING_MAX_AGE_SECONDS = float(os.getenv("READING_MAX_AGE_SECONDS", "3600"))
+READING_MAX_SKEW_SECONDS = float(os.getenv("READING_MAX_SKEW_SECONDS", "30"))
+
+# Largest binary batch accepted by POST /sensor-data/batch, in records
+MAX_BATCH_RECORDS = int(os.getenv("MAX_BATCH_RECORDS", "10000"))
+# Messages a /ws/ingest gateway may have unacknowledged (processed concurrently)
+INGEST_CHANNEL_WINDOW = int(os.getenv("INGEST_CHANNEL_WINDOW", "32"))
+
+# Admission control for ingest: every reading must be answered within the deadline, and
+# each stage runs a bounded number of requests at once with a bounded queue in front of it
+INGEST_DEADLINE_SECONDS = float(os.getenv("INGEST_DEADLINE_MS", "2000")) / 1000
+RETRY_AFTER_SECONDS = float(os.getenv("RETRY_AFTER_SECONDS", "1"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+ingest_limiter = StageLimiter("ingest", int(os.getenv("INGEST_MAX_CONCURRENCY", "64")), ADMISSION_MAX_QUEUE, RETRY_AFTER_SECONDS)
+mongo_limiter = StageLimiter("mongo", int(os.getenv("MONGO_MAX_CONCURRENCY", "32")), ADMISSION_MAX_QUEUE, RETRY_AFTER_SECONDS)
+model_limiter = StageLimiter("model", int(os.getenv("MODEL_MAX_CONCURRENCY", "8")), ADMISSION_MAX_QUEUE, RETRY_AFTER_SECONDS)
+# Consecutive failures before the selected backend is bypassed for the fallback, and for how long
+MODEL_BREAKER_FAILURES = int(os.getenv("MODEL_BREAKER_FAILURES", "5"))
+MODEL_BREAKER_RESET_SECONDS = float(os.getenv("MODEL_BREAKER_RESET_SECONDS", "30"))
+
+# Retention: raw readings expire after RAW_RETENTION_DAYS, hourly and daily rollups after
+# their own windows (0 = keep forever), and never before they are rolled up; the rollup job
+# runs every ROLLUP_INTERVAL_SECONDS and rebuilds the last ROLLUP_LATE_MINUTES for late readings
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "1") == "1"
+ROLLUP_INTERVAL_SECONDS = float(os.getenv("ROLLUP_INTERVAL_SECONDS", "300"))
+retention = RetentionManager(
+    sensor_readings_collection, sensor_readings_hourly_collection, sensor_readings_daily_collection,
+    retention_state_collection,
+    raw_days=float(os.getenv("RAW_RETENTION_DAYS", "30")),
+    hourly_days=float(os.getenv("HOURLY_RETENTION_DAYS", "365")),
+    daily_days=float(os.getenv("DAILY_RETENTION_DAYS", "0")),
+    max_buckets=int(os.getenv("ROLLUP_MAX_BUCKETS", "24")),
+    late_window=timedelta(minutes=float(os.getenv("ROLLUP_LATE_MINUTES", "60")))
+)
+retention_task = None
+
+# Admin profiling endpoints (/admin/...), only served when PROFILING_TOKEN is set
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+profiler = Profiler(max_seconds=float(os.getenv("PROFILING_MAX_SECONDS", "300")))
+memory_tracer = MemoryTracer()
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Serializes the alert lookup and write of each location
+alert_locks = defaultdict(asyncio.Lock)
+
+# Prometheus metrics
+register_cache_metrics(response_cache)
+WEBSOCKET_CLIENTS.set_function(lambda: len(alert_hub.subscribers))
+SERIES_SUBSCRIPTIONS.set_function(lambda: sum(len(subscribers) for subscribers in series_hub.subscribers.values()))
 
 # Pydantic models
 class SensorData(BaseModel):
@@ -49,6 +201,23 @@ class SensorData(BaseModel):
     temperature: Optional[float] = None
     humidity: Optional[float] = None
     soundLevel: Optional[float] = None
+    readingId: Optional[str] = None     # makes a retried reading idempotent, see ingest_sensor_data
+
+# Registered once per physical sensor (POST /sensors/)
+class SensorRegistration(BaseModel):
+    type: str
+    vendorName: str
+    vendorEmail: EmailStr
+    description: Optional[str] = None
+    building: str
+    floor: int
+
+# Reading from a registered sensor; the timestamp defaults to the time it is received
+class CompactReading(BaseModel):
+    sensorId: str
+    value: float
+    timestamp: Optional[datetime] = None
+    readingId: Optional[str] = None
 
 class Event(BaseModel):
     type: str
@@ -58,50 +227,329 @@ class Event(BaseModel):
     duration: int       # In seconds
 
 
+# Request body schema for endpoints that validate their body themselves (JSON or MessagePack)
+def json_body_schema(model):
+    schema = {"schema": model.model_json_schema()}
+    return {"requestBody": {"required": True, "content": {"application/json": schema, "application/msgpack": schema}}}
+
+
+async def parse_body(request: Request, model):
+    body = await request.body()
+    kind = media_type(request.headers.get("content-type"))
+    try:
+        if kind in MSGPACK_MEDIA_TYPES:
+            if not MSGPACK_AVAILABLE:
+                raise HTTPException(status_code=415, detail="MessagePack bodies require msgpack to be installed")
+            try:
+                data = decode_body(body, kind)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            INGEST_READINGS.labels(format="msgpack").inc()
+            return validate_data(model, data)
+        # Anything else is JSON, as before content negotiation existed
+        INGEST_READINGS.labels(format="json").inc()
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        raise validation_error(e, body)
+
+
+# Same error shape FastAPI returns for invalid bodies
+def validation_error(e: ValidationError, body):
+    errors = [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+    return RequestValidationError(errors, body=body)
+
+
+# Validate an already decoded body (MessagePack, ingest channel messages)
+def validate_data(model, data):
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        raise validation_error(e, data)
+
+
 # Visualize sensor data
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     return templates.TemplateResponse("visualize.html", {"request": request})
 
 
-@app.post("/sensor-data/")
-async def receive_sensor_data(data: SensorData):
-    sensor_dict = data.model_dump()
+@app.post("/sensor-data/", openapi_extra=json_body_schema(SensorData))
+async def receive_sensor_data(request: Request):
+    with INGEST_SECONDS.time(), deadline(INGEST_DEADLINE_SECONDS):
+        async with ingest_limiter.slot():
+            # Validate the body here instead of in FastAPI so the validation stage can be timed
+            with stage_timer("validation"):
+                data = await parse_body(request, SensorData)
+            return await ingest_sensor_data(data.model_dump())
+
+
+@app.post("/sensors/")
+def register_sensor(sensor: SensorRegistration):
+    if sensor.type not in SENSOR_FIELDS:
+        raise HTTPException(status_code=400, detail="Invalid sensor type. Must be Temperature, Humidity or Acoustic.")
+    try:
+        return sensor_registry.register(sensor.model_dump())
+    except Exception as e:
+        logger.error("Sensor registration error: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to register sensor")
+
+
+@app.get("/sensors/{sensor_id}")
+def get_sensor(sensor_id: str):
+    sensor = sensor_registry.load(sensor_id)
+    if sensor is None:
+        raise HTTPException(status_code=404, detail="Unknown sensor")
+    return {"sensorId": sensor_id, **sensor}
+
+
+# Reading from a registered sensor: only its ID and value are sent, and only those and
+# the sensor's type and location are stored
+@app.post("/sensor-data/compact", openapi_extra=json_body_schema(CompactReading))
+async def receive_compact_reading(request: Request):
+    with INGEST_SECONDS.time(), deadline(INGEST_DEADLINE_SECONDS):
+        async with ingest_limiter.slot():
+            with stage_timer("validation"):
+                data = await parse_body(request, CompactReading)
+            return await ingest_compact(data)
+
+
+async def ingest_compact(data: CompactReading):
+    sensor = sensor_registry.cached(data.sensorId)
+    if sensor is None:
+        if not sensor_registry.known_missing(data.sensorId):
+            sensor = await mongo_limiter.run(sensor_registry.load, data.sensorId)
+        if sensor is None:
+            raise HTTPException(status_code=404, detail="Unknown sensor, register it with POST /sensors/")
+    sensor_dict = {
+        "sensorId": data.sensorId,
+        "type": sensor["type"],
+        "building": sensor["building"],
+        "floor": sensor["floor"],
+        SENSOR_FIELDS[sensor["type"]]: data.value,
+        "readingId": data.readingId,
+    }
+    return await ingest_sensor_data(sensor_dict, data.timestamp)
+
+
+# Binary batch from a gateway (layout in wire_format.py); decoded and validated as arrays
+@app.post("/sensor-data/batch", openapi_extra={"requestBody": {"required": True, "content": {
+    BATCH_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}
+}}})
+async def receive_sensor_batch(request: Request):
+    if media_type(request.headers.get("content-type")) != BATCH_MEDIA_TYPE:
+        raise HTTPException(status_code=415, detail=f"Batches must be sent as {BATCH_MEDIA_TYPE}")
+    with INGEST_SECONDS.time(), deadline(INGEST_DEADLINE_SECONDS):
+        async with ingest_limiter.slot():
+            body = await request.body()
+            with stage_timer("validation"):
+                records = check_batch(body)
+            INGEST_READINGS.labels(format="batch").inc(len(records))
+            return await ingest_batch(records)
+
+
+def check_batch(body: bytes) -> np.ndarray:
+    try:
+        records = decode_batch(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(records) > MAX_BATCH_RECORDS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_RECORDS} records per batch")
+    invalid = validate_batch(records)
+    if invalid:
+        raise HTTPException(status_code=422, detail={"message": "Invalid records", "records": invalid[:100]})
+    return records
+
+
+# One message of a /ws/ingest stream, through the same admission control and pipeline as the HTTP endpoints
+async def ingest_channel_message(kind: str, payload):
+    with INGEST_SECONDS.time(), deadline(INGEST_DEADLINE_SECONDS):
+        async with ingest_limiter.slot():
+            if kind == "batch":
+                with stage_timer("validation"):
+                    records = check_batch(payload)
+                INGEST_READINGS.labels(format="batch").inc(len(records))
+                return await ingest_batch(records)
+            with stage_timer("validation"):
+                data = validate_data(CompactReading if kind == "compact" else SensorData, payload)
+            INGEST_READINGS.labels(format="json").inc()
+            if kind == "compact":
+                return await ingest_compact(data)
+            return await ingest_sensor_data(data.model_dump())
+
+
+# Long-lived ingest stream for gateways: sequenced messages, cumulative acks, windowed flow control
+@app.websocket("/ws/ingest")
+async def ingest_websocket(websocket: WebSocket):
+    await serve_ingest(websocket, ingest_channel_message, INGEST_CHANNEL_WINDOW)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
+    )
+
+
+# Sensor-supplied time, bounded around the receive time (see READING_MAX_AGE_SECONDS)
+def measured_time(measured_at: Optional[datetime], received_at: datetime) -> datetime:
+    if measured_at is None:
+        return received_at
+    # Without an offset it is local time
+    measured = (measured_at if measured_at.tzinfo else measured_at.replace(tzinfo=local_tz)).astimezone(local_tz)
+    if measured < received_at - timedelta(seconds=READING_MAX_AGE_SECONDS):
+        raise HTTPException(status_code=422, detail=f"Reading timestamp is more than {READING_MAX_AGE_SECONDS:g} s old")
+    if measured > received_at + timedelta(seconds=READING_MAX_SKEW_SECONDS):
+        return received_at      # sensor clock ahead
+    return measured
+
+
+async def ingest_sensor_data(sensor_dict: dict, measured_at: Optional[datetime] = None):
+    mark_received()
+    building, floor = sensor_dict["building"], sensor_dict["floor"]
 
     # Save timestamp to local timezone, instead of UTC
-    now = datetime.now(local_tz).isoformat()
-    sensor_dict["timestamp"] = now
+    received_at = datetime.now(local_tz)
+    measured = measured_time(measured_at, received_at)
+    sensor_dict["timestamp"] = measured.isoformat()
+    # Native datetime copy for the rollups and expiry
+    sensor_dict["ts"] = measured.astimezone(timezone.utc)
+    # Detection and alerts run on the server clock, whatever the sensor's
+    now = received_at.isoformat()
+
+    # A 503 does not mean the reading was not written: the insert can still finish after the
+    # deadline. With a client readingId as _id, the retry finds the first copy instead of adding one
+    reading_id = sensor_dict.pop("readingId", None)
+    if reading_id is not None:
+        sensor_dict["_id"] = reading_id
 
     # Save to MongoDB
     try:
-        result = sensor_readings_collection.insert_one(sensor_dict)
+        with stage_timer("mongo_insert"):
+            await mongo_limiter.run(sensor_readings_collection.insert_one, sensor_dict)
+    except Overloaded:
+        raise
+    except pymongo.errors.DuplicateKeyError:
+        # Only a client readingId can collide. Already saved; the rest of the pipeline runs again in case the first attempt stopped before it
+        logger.info("Reading already saved", extra={"readingId": reading_id})
     except Exception as e:
-        print(f"File Write Error: {e}")
+        logger.error("File Write Error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to save data to file")
+
+    location_store.record_reading(sensor_dict)
+    series_hub.publish(sensor_dict, int(measured.timestamp() * 1000))
+
+    # Drop cached reads that could include this reading
+    response_cache.invalidate(type=sensor_dict["type"], building=building, floor=floor)
     
-    # Attempt Fire Detection
-    try:
-        model_name = "nn_model"
-        await live_fire_detection(result, data, now, model_name)
-    except Exception as e:
-        print(f"Prediction Error: {e}")
+    await detect_fire(building, floor, now, sensor_dict["timestamp"])
     
     return {
         "message": "Data saved",
-        "id": str(result.inserted_id)
+        "id": str(sensor_dict["_id"])
     }
-    
 
-@app.get("/sensor-data/")
-async def query_sensor_data(
-    type: Optional[str] = Query(None, description="Temperature, Humidity or Acoustic"),
-    building: Optional[str] = Query(None, description="A, B or C"),
-    floor: Optional[int] = Query(None, description="1 - 4"),
-    start_time: Optional[str] = Query(None, description="Start datetime (e.g., 2025-08-06 or 2025-08-06T14:00:00)"),
-    end_time: Optional[str] = Query(None, description="End datetime (exclusive, e.g., 2025-08-07 or 2025-08-06T18:00:00)"),
-    page: int = 1,
-    page_size: int = 10
-):
+
+async def ingest_batch(records: np.ndarray):
+    mark_received()
+    received_at = datetime.now(local_tz)
+    received_ms = int(received_at.timestamp() * 1000)
+    timestamps = np.where(records["timestamp"] == 0, received_ms, records["timestamp"])
+    # Same bounds as single readings: too old is rejected, too far ahead is clamped
+    too_old = np.flatnonzero(timestamps < received_ms - READING_MAX_AGE_SECONDS * 1000)
+    if len(too_old):
+        raise HTTPException(status_code=422, detail={
+            "message": f"Reading timestamps more than {READING_MAX_AGE_SECONDS:g} s old",
+            "records": too_old[:100].tolist(),
+        })
+    timestamps = np.where(timestamps > received_ms + READING_MAX_SKEW_SECONDS * 1000, received_ms, timestamps)
+    # float32 carries about 7 significant digits; round off the binary noise (22.3, not 22.299999237)
+    values = np.round(records["value"].astype(np.float64), 4)
+    # Oldest first, so the in-memory location state ends on each sensor's latest reading
+    order = np.argsort(timestamps, kind="stable")
+
+    # Documents are the only per-record objects: MongoDB needs one per reading
+    docs = []
+    times = timestamps[order].tolist()
+    for location, code, value, ms in zip(
+        records["location"][order].tolist(), records["type"][order].tolist(), values[order].tolist(), times
+    ):
+        building, floor = location_of(location)
+        sensor_type = SENSOR_TYPES[code]
+        moment = datetime.fromtimestamp(ms / 1000, local_tz)
+        docs.append({
+            "type": sensor_type, "building": building, "floor": floor,
+            SENSOR_FIELDS[sensor_type]: value,
+            "timestamp": moment.isoformat(), "ts": moment.astimezone(timezone.utc),
+        })
+    if not docs:
+        return {"message": "Data saved", "count": 0}
+
+    failed = []
+    try:
+        with stage_timer("mongo_insert"):
+            await mongo_limiter.run(sensor_readings_collection.insert_many, docs, ordered=False)
+    except Overloaded:
+        raise
+    except pymongo.errors.BulkWriteError as e:
+        # Unordered: every document without a write error was inserted and goes through the pipeline
+        errors = e.details.get("writeErrors", [])
+        failed = sorted({error["index"] for error in errors})
+        logger.error("File Write Error: %d of %d readings not saved: %s", len(failed), len(docs),
+                     errors[0].get("errmsg") if errors else e)
+        if len(failed) == len(docs):
+            raise HTTPException(status_code=500, detail="Failed to save data to file")
+        saved = np.ones(len(docs), dtype=bool)
+        saved[failed] = False
+        docs = [doc for doc, ok in zip(docs, saved) if ok]
+        times = [ms for ms, ok in zip(times, saved) if ok]
+    except Exception as e:
+        logger.error("File Write Error: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to save data to file")
+
+    for doc, ms in zip(docs, times):
+        location_store.record_reading(doc)
+        series_hub.publish(doc, ms)
+    for sensor_type, building, floor in {(d["type"], d["building"], d["floor"]) for d in docs}:
+        response_cache.invalidate(type=sensor_type, building=building, floor=floor)
+
+    # One prediction per location in the batch, on its latest readings
+    now = received_at.isoformat()
+    latest = {(d["building"], d["floor"]): d["timestamp"] for d in docs}      # docs are oldest first
+    await asyncio.gather(*(detect_fire(building, floor, now, reading_at) for (building, floor), reading_at in latest.items()))
+
+    if failed:
+        # Positions in the batch as sent, like the 422 answer
+        return {"message": "Partially saved", "count": len(docs), "failed": sorted(order[failed].tolist())}
+    return {"message": "Data saved", "count": len(docs)}
+
+
+# Detection is skipped for every reading while the API starts or is overloaded, so the
+# warning is logged when the reason changes and the count once predictions run again
+skipped_detections = {"reason": None, "count": 0}
+
+
+# Attempt Fire Detection; the reading is saved, so an overloaded detection only skips this prediction
+async def detect_fire(building, floor, now, reading_at=None):
+    try:
+        await live_fire_detection(building, floor, now, reading_at=reading_at)
+    except Overloaded as e:
+        if skipped_detections["reason"] != e.detail:
+            logger.warning("Fire detection skipped: %s", e, extra={"building": building, "floor": floor})
+            skipped_detections["reason"] = e.detail
+        skipped_detections["count"] += 1
+        return
+    except Exception as e:
+        logger.warning("Prediction Error: %s", e, extra={"building": building, "floor": floor})
+        return
+    if skipped_detections["count"]:
+        logger.info("Fire detection resumed", extra={"skipped": skipped_detections["count"]})
+        skipped_detections.update(reason=None, count=0)
+
+
+# Build the MongoDB filter shared by the sensor data query and export endpoints
+def build_sensor_query(type, building, floor, start_time, end_time):
     query = {}
 
     # Add filters
@@ -127,30 +575,122 @@ async def query_sensor_data(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS")
 
+    return query
+
+
+# Sync, so the MongoDB query on a cache miss runs in the threadpool
+@app.get("/sensor-data/")
+def query_sensor_data(
+    request: Request,
+    type: Optional[str] = Query(None, description="Temperature, Humidity or Acoustic"),
+    building: Optional[str] = Query(None, description="A, B or C"),
+    floor: Optional[int] = Query(None, description="1 - 4"),
+    start_time: Optional[str] = Query(None, description="Start datetime (e.g., 2025-08-06 or 2025-08-06T14:00:00)"),
+    end_time: Optional[str] = Query(None, description="End datetime (exclusive, e.g., 2025-08-07 or 2025-08-06T18:00:00)"),
+    page: int = 1,
+    page_size: int = 10,
+    resolution: str = Query("auto", description="auto, raw, hourly or daily")
+):
+    if resolution != "auto" and resolution not in TIERS:
+        raise HTTPException(status_code=400, detail="Invalid resolution. Must be auto, raw, hourly or daily.")
+    params = {
+        "type": type, "building": building, "floor": floor,
+        "start_time": start_time, "end_time": end_time,
+        "page": page, "page_size": page_size, "resolution": resolution
+    }
+    scope = {"type": type, "building": building, "floor": floor}
+    return cached_json(
+        response_cache, request, "/sensor-data/", params, scope,
+        lambda: find_sensor_data(type, building, floor, start_time, end_time, page, page_size, resolution),
+        store=cacheable(building, floor)
+    )
+
+
+# Query bound as a naive UTC datetime; dates without an offset are local time, like the stored timestamps
+def to_utc(value: Optional[str]):
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=local_tz)
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def find_sensor_data(type, building, floor, start_time, end_time, page, page_size, resolution="auto"):
+    query = build_sensor_query(type, building, floor, start_time, end_time)
+    start, end = to_utc(start_time), to_utc(end_time)
+    # Long or old ranges are answered from the hourly or daily rollups, when the rollup job runs
+    if not RETENTION_ENABLED:
+        tier = "raw"
+    else:
+        tier = retention.choose_tier(start, end) if resolution == "auto" else resolution
+
     try:
         skip = (page - 1) * page_size
-        results = list(sensor_readings_collection.find(query).skip(skip).limit(page_size))
-        total_results = sensor_readings_collection.count_documents(query)
-        
-        # Convert ObjectId to string
-        for r in results:
-            r["_id"] = str(r["_id"])
-        
+        if tier == "raw":
+            results = list(sensor_readings_collection.find(query, {"ts": 0}).skip(skip).limit(page_size))
+            total_results = sensor_readings_collection.count_documents(query)
+
+            # Convert ObjectId to string
+            for r in results:
+                r["_id"] = str(r["_id"])
+        else:
+            location_query = build_sensor_query(type, building, floor, None, None)
+            results, total_results = retention.find_buckets(tier, location_query, start, end, skip, page_size)
+
         return {
             "page": page,
             "page_size": page_size,
+            "resolution": tier,
             "total_results": total_results,
             "total_pages": math.ceil(total_results / page_size),
             "results": results
         }
 
     except Exception as e:
-        print(f"Query Error: {e}")
+        logger.error("Query Error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to query sensor data")
     
 
+# Stream all matching readings without paging (NDJSON, CSV or Arrow IPC)
+@app.get("/sensor-data/export")
+def export_sensor_data(
+    type: Optional[str] = Query(None, description="Temperature, Humidity or Acoustic"),
+    building: Optional[str] = Query(None, description="A, B or C"),
+    floor: Optional[int] = Query(None, description="1 - 4"),
+    start_time: Optional[str] = Query(None, description="Start datetime (e.g., 2025-08-06 or 2025-08-06T14:00:00)"),
+    end_time: Optional[str] = Query(None, description="End datetime (exclusive, e.g., 2025-08-07 or 2025-08-06T18:00:00)"),
+    format: str = Query("ndjson", description="ndjson, csv or arrow")
+):
+    if format not in EXPORT_STREAMS:
+        raise HTTPException(status_code=400, detail="Invalid export format. Must be ndjson, csv or arrow.")
+    if format == "arrow" and not ARROW_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Arrow export requires pyarrow to be installed")
+
+    query = build_sensor_query(type, building, floor, start_time, end_time)
+
+    try:
+        cursor = open_export_cursor(sensor_readings_collection, query)
+    except Exception as e:
+        logger.error("Export Error: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to export sensor data")
+
+    return StreamingResponse(
+        export_stream(cursor, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="sensor_readings.{format}"'}
+    )
+
+
 @app.get("/sensor-data/stats/{sensor_type}")
-def get_sensor_stats(sensor_type: str):
+def get_sensor_stats(sensor_type: str, request: Request):
+    return cached_json(
+        response_cache, request, f"/sensor-data/stats/{sensor_type}", {}, {"type": sensor_type},
+        lambda: compute_sensor_stats(sensor_type), store=cacheable()
+    )
+
+
+def compute_sensor_stats(sensor_type: str):
     valid_sensor_types = {
         "Temperature": "temperature",
         "Humidity": "humidity",
@@ -187,23 +727,32 @@ def get_sensor_stats(sensor_type: str):
         "top10_min": sorted(unique_values)[:10]
     }
 
-    return JSONResponse(content=stats)
+    return stats
 
 
 @app.post("/events")
 async def receive_event(event: Event):
     event_dict = event.model_dump()
     try:
-        events_collection.insert_one(event_dict)
-        return {"message": "Event stored successfully"}
+        result = events_collection.insert_one(event_dict)
+        response_cache.invalidate(events=event_dict["type"])
+        return {"message": "Event stored successfully", "id": str(result.inserted_id)}
     except Exception as e:
-        print("Failed to save event!")
+        logger.error("Failed to save event: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Returns currently active events
 @app.get("/events/active")
-def get_active_events(page: int = 1, page_size: int = 10):
+def get_active_events(request: Request, page: int = 1, page_size: int = 10):
+    # Events also expire with time, so these entries get a short TTL
+    return cached_json(
+        response_cache, request, "/events/active", {"page": page, "page_size": page_size}, {"events": None},
+        lambda: find_active_events(page, page_size), ttl_seconds=EVENTS_CACHE_TTL_SECONDS
+    )
+
+
+def find_active_events(page: int, page_size: int):
     now = datetime.now(tz=local_tz)
 
     # Find events whose time range includes `now`
@@ -217,7 +766,7 @@ def get_active_events(page: int = 1, page_size: int = 10):
                 event["_id"] = str(event["_id"])
                 active_events.append(event)
         except Exception as e:
-            print(f"Error parsing event time: {e}")
+            logger.warning("Error parsing event time: %s", e)
 
     if len(active_events) == 0:
         return "There are no active events currently  :)"
@@ -236,6 +785,272 @@ def get_active_events(page: int = 1, page_size: int = 10):
         }
     
 
+# Detection latency of one fire event: the trace of the alert it raised, or how many readings arrived so far
+@app.get("/events/{event_id}/detection")
+def get_event_detection(event_id: str):
+    if not ObjectId.is_valid(event_id):
+        raise HTTPException(status_code=404, detail="Event not found")
+    event = events_collection.find_one({"_id": ObjectId(event_id)})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    event["_id"] = str(event["_id"])
+
+    trace = detection_traces_collection.find_one({"event_id": event_id}, {"_id": 0})
+    if trace:
+        return {"event": event, "detected": True, **trace}
+
+    readings = 0
+    if event["type"] == "fire":
+        readings = sensor_readings_collection.count_documents({
+            "building": event["building"], "floor": event["floor"], "timestamp": {"$gte": event["start_time"]}
+        })
+    return {"event": event, "detected": False, "readings_since_event": readings}
+
+
+# Startup state reported by /readyz; traffic is ready once these three are
+readiness = Readiness(required=("mongo", "models", "alerts"))
+# Bound for the live checks /readyz makes
+READYZ_TIMEOUT_SECONDS = float(os.getenv("READYZ_TIMEOUT_SECONDS", "1"))
+startup_tasks = set()
+
+
+async def start_up():
+    await asyncio.gather(load_models(), connect_mongo())
+
+
+async def shut_down(startup: asyncio.Task):
+    tasks = [startup, *startup_tasks] + ([retention_task] if retention_task else [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def load_models():
+    global active_backend
+    if active_backend is not None:      # already loaded by an earlier lifespan in this process
+        return
+    # The Random Forest first, so detection can start with the fallback while TensorFlow loads
+    try:
+        model_backends.update(await run_in_threadpool(load_forest_backends))
+    except Exception as e:
+        logger.exception("Loading the Random Forest models failed")
+        readiness.set("models", False, f"failed: {e}")
+    if MODEL_FALLBACK_BACKEND in model_backends:
+        active_backend = model_backends[MODEL_FALLBACK_BACKEND]
+        readiness.set("models", True, MODEL_FALLBACK_BACKEND)
+    readiness.set("model_selection", False, "loading TensorFlow models")
+    try:
+        model_backends.update(await run_in_threadpool(load_tensorflow_backends, TF_SERVING_URL))
+    except Exception:
+        # Selection goes on with the backends that did load
+        logger.exception("Loading the TensorFlow models failed")
+    try:
+        await run_in_threadpool(choose_model_backend)
+    except Exception as e:
+        # Reported by /readyz; detection keeps the fallback if it loaded
+        logger.exception("Model backend selection failed")
+        readiness.set("model_selection", False, f"failed: {e}")
+        if active_backend is None:
+            readiness.set("models", False, f"failed: {e}")
+        return
+    readiness.set("models", True, active_backend.name)
+    readiness.set("model_selection", True, selected_backend)
+
+
+async def connect_mongo():
+    # Retry until MongoDB answers, e.g. when the API starts before the database
+    while True:
+        try:
+            await run_in_threadpool(client.admin.command, "ping")
+            break
+        except Exception as e:
+            readiness.set("mongo", False, f"unreachable: {type(e).__name__}")
+            await asyncio.sleep(1)
+    readiness.set("mongo", True, "ok")
+
+    # The alert snapshot is loaded once; WebSocket clients are then served from memory
+    alert_hub.load(await run_in_threadpool(load_active_alerts))
+    logger.info("Alert hub loaded", extra={"active_alerts": len(alert_hub.alerts)})
+    readiness.set("alerts", True, f"{len(alert_hub.alerts)} active")
+
+    # Indexes only speed up queries, so they are built after the API is ready
+    task = asyncio.create_task(create_indexes())
+    startup_tasks.add(task)
+    task.add_done_callback(startup_tasks.discard)
+
+
+async def create_indexes():
+    global retention_task
+    readiness.set("indexes", False, "building")
+    try:
+        created = await run_in_threadpool(ensure_indexes, db)
+        await run_in_threadpool(detection_tracer.ensure_indexes)
+        if RETENTION_ENABLED:
+            await run_in_threadpool(retention.ensure_indexes)
+    except Exception as e:
+        logger.warning("Index creation failed: %s", e)
+        readiness.set("indexes", False, f"failed: {e}")
+        return
+    readiness.set("indexes", True, f"{len(created)} created" if created else "ok")
+    # The rollup job runs on one shard only
+    if RETENTION_ENABLED and SHARD_INDEX == 0:
+        retention_task = asyncio.create_task(run_retention())
+
+
+# Liveness: the process is up and its event loop answers
+@app.get("/healthz")
+async def get_health():
+    return {"status": "ok"}
+
+
+# Readiness: MongoDB reachable, a model backend active and the alert snapshot loaded. Cheap
+# enough to poll every second; MongoDB and TF Serving are checked live with a short timeout.
+@app.get("/readyz")
+async def get_readiness():
+    if readiness.checks["mongo"]["ready"]:
+        try:
+            await run_in_threadpool(ping_mongo)
+        except Exception as e:
+            readiness.set("mongo", False, f"unreachable: {type(e).__name__}")
+            # Keep retrying in the background, as at startup
+            task = asyncio.create_task(reconnect_mongo())
+            startup_tasks.add(task)
+            task.add_done_callback(startup_tasks.discard)
+    report = readiness.report()
+    # TF Serving only matters when it was selected; otherwise the breaker never reaches it
+    tf_serving = model_backends.get("tf_serving")
+    if selected_backend == "tf_serving" and isinstance(tf_serving, TFServingBackend):
+        ready, detail = await run_in_threadpool(tf_serving.status, READYZ_TIMEOUT_SECONDS)
+        report["checks"]["tf_serving"] = {"ready": ready, "detail": detail}
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+def ping_mongo():
+    with pymongo.timeout(READYZ_TIMEOUT_SECONDS):
+        client.admin.command("ping")
+
+
+async def reconnect_mongo():
+    while True:
+        await asyncio.sleep(1)
+        try:
+            await run_in_threadpool(ping_mongo)
+        except Exception:
+            continue
+        readiness.set("mongo", True, "ok")
+        return
+
+
+# Pick the model backend once at startup
+def choose_model_backend():
+    global active_backend, selected_backend
+    if MODEL_BACKEND == "auto":
+        chosen, report = select_backend(model_backends, MODEL_MIN_ACCURACY, MODEL_MAX_LATENCY_MS, MODEL_FALLBACK_BACKEND)
+        record_backend_selection(report)
+        logger.info("Model backend selected", extra={"backend": chosen, "report": report})
+    else:
+        chosen = MODEL_BACKEND
+    primary = backend = resolve_backend(model_backends, chosen, "MODEL_BACKEND")
+    MODEL_BACKEND_SELECTED.labels(backend=chosen).set(1)
+
+    # Fall back to the local model while the selected one (e.g. TF Serving) keeps failing
+    if chosen != MODEL_FALLBACK_BACKEND:
+        breaker = CircuitBreaker(chosen, MODEL_BREAKER_FAILURES, MODEL_BREAKER_RESET_SECONDS)
+        backend = CircuitBreakerBackend(primary, resolve_backend(model_backends, MODEL_FALLBACK_BACKEND, "MODEL_FALLBACK_BACKEND"), breaker)
+
+    if DECISION_GRID:
+        try:
+            # Built from the primary itself: if it fails, the build stops instead of saving
+            # fallback predictions under the primary's fingerprint
+            grid = DecisionGrid.load_or_build(
+                DECISION_GRID_PATH, primary, DECISION_GRID_STEP, model_fingerprint(primary), margin=DECISION_GRID_MARGIN
+            )
+            backend = DecisionGridBackend(grid, backend)
+        except Exception as e:
+            logger.warning("Decision grid unavailable, using %s directly: %s", chosen, e)
+
+    # Swapped in one assignment: detection keeps using the fallback until the choice is complete
+    selected_backend = chosen
+    active_backend = backend
+
+
+async def run_retention():
+    while True:
+        delay = ROLLUP_INTERVAL_SECONDS
+        try:
+            result = await run_in_threadpool(retention.run_once)
+            logger.info("Retention run finished", extra=result)
+            if retention.catching_up(result):
+                # Work through a backlog (e.g. history from before retention existed) without the full pause
+                delay = 1
+        except Exception as e:
+            logger.warning("Retention run failed: %s", e)
+        await asyncio.sleep(delay)
+
+
+@app.get("/metrics")
+def get_metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return response_cache.stats()
+
+
+# Profiling: a sampling or cProfile session for `seconds`, or for the next `requests` requests to
+# `route`; started on the event loop, so cProfile attaches to the thread running the async handlers
+@app.post("/admin/profile", include_in_schema=False)
+async def start_profile(request: Request, mode: str = "sampling", seconds: Optional[float] = None,
+                        route: Optional[str] = None, requests: Optional[int] = None, interval_ms: float = 10):
+    check_admin(request, PROFILING_TOKEN)
+    return profiler.start(mode, seconds, route, requests, interval_ms / 1000)
+
+
+@app.post("/admin/profile/stop", include_in_schema=False)
+async def stop_profile(request: Request):
+    check_admin(request, PROFILING_TOKEN)
+    summary = profiler.stop()
+    if summary is None:
+        raise HTTPException(status_code=409, detail="No profiling session is running")
+    return summary
+
+
+@app.get("/admin/profile", include_in_schema=False)
+def list_profiles(request: Request):
+    check_admin(request, PROFILING_TOKEN)
+    return {"sessions": profiler.sessions()}
+
+
+@app.get("/admin/profile/{session_id}", include_in_schema=False)
+def download_profile(session_id: str, request: Request, format: str = "collapsed"):
+    check_admin(request, PROFILING_TOKEN)
+    content, media = profiler.download(session_id, format)
+    extension = "pstats" if format == "pstats" else "txt"
+    return Response(content=content, media_type=media,
+                    headers={"Content-Disposition": f'attachment; filename="profile-{session_id}.{extension}"'})
+
+
+# Memory growth: each snapshot lists the allocation sites that grew most since the previous one
+@app.post("/admin/tracemalloc/start", include_in_schema=False)
+def start_tracemalloc(request: Request, frames: int = 1):
+    check_admin(request, PROFILING_TOKEN)
+    return memory_tracer.start(frames)
+
+
+@app.post("/admin/tracemalloc/snapshot", include_in_schema=False)
+def take_tracemalloc_snapshot(request: Request, limit: int = 20, key_type: str = "lineno"):
+    check_admin(request, PROFILING_TOKEN)
+    return memory_tracer.snapshot(limit, key_type)
+
+
+@app.post("/admin/tracemalloc/stop", include_in_schema=False)
+def stop_tracemalloc(request: Request):
+    check_admin(request, PROFILING_TOKEN)
+    return memory_tracer.stop()
+
+
 @app.get("/fire-status/{building}/{floor}")
 def get_fire_status(building: str, floor: int):
     try:
@@ -258,142 +1073,145 @@ def get_fire_status(building: str, floor: int):
         return {"fire": False}
 
     except Exception as e:
-        print(f"Error fetching fire status: {e}")
+        logger.error("Error fetching fire status: %s", e)
         raise HTTPException(status_code=500, detail="Error checking fire status")
 
 
-# Returns active alerts
-async def get_active_alerts():
-    now = datetime.now(tz=local_tz)
-    # Find events whose time range includes `now` and don't have the "ended_at" field
-    active_alerts = alerts_collection.find({
-        "detected_at": {"$lte": now.isoformat()},
-        "ended_at": {"$exists": False}
-    })
+# Active alerts of the locations this process owns (all of them unless sharded)
+def load_active_alerts():
     results = []
-    for alert in active_alerts:
+    for alert in alerts_collection.find({"type": "fire", "ended_at": {"$exists": False}}):
+        if SHARD_COUNT > 1 and shard_for(alert["building"], alert["floor"], SHARD_COUNT) != SHARD_INDEX:
+            continue
         alert["_id"] = str(alert["_id"])  # make ObjectId JSON serializable
         results.append(alert)
     return results
 
 
+@app.get("/alerts/active")
+def get_alert_snapshot():
+    return alert_hub.snapshot()
+
+
+# Snapshot on connect, then deltas; reconnecting clients pass the last seq and epoch they saw
 @app.websocket("/ws/alerts")
-async def alert_websocket(websocket: WebSocket):
-    print("WebSocket endpoint hit! :)")
-    await websocket.accept()
-    active_connections.append(websocket)
+async def alert_websocket(websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+    await serve_alerts(websocket, alert_hub, since, epoch)
 
-    try:
-        # On connect, send currently active alerts
-        active_alerts = await get_active_alerts()
-        if active_alerts:
-            for alert in active_alerts:
-                await notify_clients(alert)
-
-        # Keep listening for new alerts pushed elsewhere
-        while True:
-            await asyncio.sleep(10)  # keep connection alive
-    except WebSocketDisconnect:
-        active_connections.remove(websocket)
-        print("WebSocket client disconnected.")
-
-
-async def notify_clients(alert: dict):
-    for conn in active_connections:
-        try:
-            await conn.send_json(alert)
-            print("Alert sent to websocket:", alert)
-        except Exception as e:
-            print(f"WebSocket send error: {e}")
+
+# New points of the given series (?series=Temperature:A:1,Humidity:B:2), coalesced per frame
+@app.websocket("/ws/series")
+async def series_websocket(websocket: WebSocket, series: str = ""):
+    await serve_series(websocket, series_hub, series)
+
+
+# The memory store loads a location from MongoDB the first time it is seen; that happens in
+# the threadpool, inside the Mongo limiter and the request deadline, never on the event loop
+async def ensure_location(building, floor):
+    if isinstance(location_store, MemoryLocationStore) and not location_store.loaded(building, floor):
+        await mongo_limiter.run(location_store.load, building, floor)
+
+
+# Location state lookups: the memory store answers from a dict, Mongo queries go through the threadpool
+async def location_call(fn, building, floor, *args):
+    if isinstance(location_store, MemoryLocationStore):
+        await ensure_location(building, floor)
+        return fn(building, floor, *args)
+    return await mongo_limiter.run(fn, building, floor, *args)
+
+
+def predict_one(backend, features):
+    with inference_timer(backend.name):
+        return int(backend.predict(features)[0])
 
 
 # Predict fire status    
-async def live_fire_detection(result, data: SensorData, now, model_name:str = "nn_model"):
+async def live_fire_detection(building: str, floor: int, now, model_name: str = None, reading_at: str = None):
+        # Readings are saved while the API starts, but detection waits for a model and the alert snapshot
+        if active_backend is None or not alert_hub.loaded:
+            raise Overloaded(503, "Fire detection is not ready yet", RETRY_AFTER_SECONDS)
+
         # Look for 3 recent readings (temperature, humidity, soundLevel)
         window_start = datetime.now(local_tz) - timedelta(minutes=1)
-        query = {
-            "building": data.building,
-            "floor": data.floor,
-            "timestamp": {"$gte": window_start.isoformat()}
-        }
-        recent = list(sensor_readings_collection.find(query))
-
-        # Group by sensor type
-        latest = {d["type"]: d for d in recent}
+        with stage_timer("recent_window_query"):
+            recent = await location_call(location_store.recent_features, building, floor, window_start.isoformat())
 
-        if {"Temperature", "Humidity", "Acoustic"}.issubset(latest):
+        if recent:
             # Extract feature vector
-            temperature = latest["Temperature"]["temperature"]
-            humidity = latest["Humidity"]["humidity"]
-            soundLevel = latest["Acoustic"]["soundLevel"]
+            temperature, humidity, soundLevel = recent
 
             features = [[temperature, humidity, soundLevel]]
 
-            # Make prediction with chosen model
-            if model_name == "nn_model":
-                model_input = {"instances": features}
-
-                # Send request to TF Serving
-                response = requests.post(
-                    "http://tf-serving:8501/v1/models/fire_nn:predict",
-                    json=model_input
-                )
-
-                if response.status_code != 200:
-                    raise RuntimeError(f"TF Serving error: {response.text}")
-
-                # Extract prediction
-                pred_value = np.array(response.json()["predictions"])[0][0]
-                prediction = (pred_value > 0.5).astype("int32")
-            else:
-                prediction = rf_model.predict(features)[0]
+            # Make prediction with chosen model (the selected backend by default)
+            backend = model_backends[model_name] if model_name else active_backend
+            model_name = backend.name
+            prediction_started = time.perf_counter()
+            prediction = await model_limiter.run(predict_one, backend, features)
+            predicted = time.perf_counter()
             
             predicted_label = "fire" if prediction == 1 else "normal"       # 1 = fire, 0 = normal
+            PREDICTIONS.labels(label=predicted_label).inc()
+
+            logger.info("Prediction made", extra={
+                "building": building, "floor": floor, "prediction": predicted_label, "sampled": True
+            })
 
-            print(f"Prediction for {data.building}-{data.floor}: {predicted_label.upper()}")
-
-            # Look for an existing fire alert without an ended_at timestamp
-            existing_alert = alerts_collection.find_one({
-                "building": data.building,
-                "floor": data.floor,
-                "type": "fire",
-                "ended_at": {"$exists": False}
-                })
-            # Save Fire predictions to alerts collection
-            if prediction == 1:
-                if not existing_alert:
-                    alert = {
-                        "building": data.building,
-                        "floor": data.floor,
-                        "detected_at": now,
-                        "type": "fire",
-                        "source": model_name,
-                        "sensor_data": {
-                            "temperature": temperature,
-                            "humidity": humidity,
-                            "soundLevel": soundLevel
+            # One reading at a time per location decides whether an alert opens or closes
+            async with alert_locks[(building, floor)]:
+                # Look for an existing fire alert without an ended_at timestamp
+                with stage_timer("alert_lookup"):
+                    existing_alert = await location_call(location_store.open_alert, building, floor)
+                # Save Fire predictions to alerts collection
+                if prediction == 1:
+                    if not existing_alert:
+                        alert = {
+                            "building": building,
+                            "floor": floor,
+                            "detected_at": now,
+                            "type": "fire",
+                            "source": model_name,
+                            "sensor_data": {
+                                "temperature": temperature,
+                                "humidity": humidity,
+                                "soundLevel": soundLevel
+                            }
                         }
-                    }
-                    alerts_collection.insert_one(alert)
-                    print("New fire alert inserted!")
-                    alert["_id"] = str(result.inserted_id)
-                    await notify_clients(alert)
-                else:
-                    print("Fire already ongoing — no new alert inserted.")
-
-            elif prediction == 0:
-                if existing_alert:
-                    # Fire has ended — update alert with ended_at timestamp
-                    alerts_collection.update_one(
-                        {"_id": existing_alert["_id"]},
-                        {"$set": {"ended_at": now}}
-                    )
-                    print("Fire alert closed with ended_at.")
-                else:
-                    print("No ongoing fire alert to close.")
+                        with stage_timer("alert_write"):
+                            await mongo_limiter.run(alerts_collection.insert_one, alert)
+                        location_store.alert_opened(dict(alert))
+                        ALERTS_OPENED.inc()
+                        logger.warning("New fire alert inserted", extra={"building": building, "floor": floor})
+                        alert["_id"] = str(alert["_id"])
+                        alert_inserted = time.perf_counter()
+                        with stage_timer("websocket_fanout"):
+                            message = alert_hub.alert_opened(alert)
+                        detection_tracer.alert_opened(alert, message, {
+                            "received": reading_received.get() or prediction_started,
+                            "prediction_started": prediction_started,
+                            "predicted": predicted,
+                            "alert_inserted": alert_inserted,
+                            "reading_at": reading_at,
+                        })
+                    else:
+                        logger.debug("Fire already ongoing — no new alert inserted.")
+
+                elif prediction == 0:
+                    if existing_alert:
+                        # Fire has ended — update alert with ended_at timestamp
+                        with stage_timer("alert_write"):
+                            await mongo_limiter.run(
+                                alerts_collection.update_one,
+                                {"_id": existing_alert["_id"]},
+                                {"$set": {"ended_at": now}}
+                            )
+                        location_store.alert_closed(building, floor)
+                        alert_hub.alert_closed(building, floor, now)
+                        ALERTS_CLOSED.inc()
+                        logger.info("Fire alert closed with ended_at", extra={"building": building, "floor": floor})
+                    else:
+                        logger.debug("No ongoing fire alert to close.")
 
             return {
                 "message": "Prediction made",
-                "prediction": predicted_label,
-                "id": str(result.inserted_id)
+                "prediction": predicted_label
             }
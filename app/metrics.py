@@ -0,0 +1,103 @@
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Buckets tuned for sub-millisecond in-process stages up to slow network calls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Ingest pipeline
+INGEST_SECONDS = Histogram(
+    "ingest_request_seconds", "Total time spent handling POST /sensor-data/",
+    buckets=LATENCY_BUCKETS
+)
+INGEST_STAGE_SECONDS = Histogram(
+    "ingest_stage_seconds", "Time spent in each stage of sensor reading ingest",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+INGEST_READINGS = Counter("ingest_readings_total", "Readings received, by wire format (json, msgpack, batch)", ["format"])
+MODEL_INFERENCE_SECONDS = Histogram(
+    "model_inference_seconds", "Fire prediction latency per model backend",
+    ["backend"], buckets=LATENCY_BUCKETS
+)
+
+# Detection outcomes
+PREDICTIONS = Counter("fire_predictions_total", "Fire predictions made, by predicted label", ["label"])
+ALERTS_OPENED = Counter("fire_alerts_opened_total", "Fire alerts inserted into the alerts collection")
+ALERTS_CLOSED = Counter("fire_alerts_closed_total", "Fire alerts closed with an ended_at timestamp")
+TF_SERVING_ERRORS = Counter("tf_serving_errors_total", "Failed prediction requests to TF Serving")
+
+# Time from a fire event starting to its alert reaching a client (see detection_trace.py)
+DETECTION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600)
+DETECTION_STAGE_SECONDS = Histogram(
+    "detection_stage_seconds",
+    "Time spent in each stage from fire event to alert delivery (sensor_delay, detection_delay, ingest, prediction, alert_write, fanout)",
+    ["stage"], buckets=LATENCY_BUCKETS + (15, 30, 60, 120, 300, 600, 900, 1800, 3600)
+)
+TIME_TO_DETECTION_SECONDS = Histogram(
+    "time_to_detection_seconds",
+    "Time from a fire event's start to its alert being sent to a WebSocket client (delivered=false: to the alert insert, no client connected)",
+    ["delivered"], buckets=DETECTION_BUCKETS
+)
+
+# Model backend selection
+MODEL_BACKEND_SELECTED = Gauge("model_backend_selected", "1 for the model backend used for live detection", ["backend"])
+MODEL_BACKEND_PROBE_LATENCY = Gauge(
+    "model_backend_probe_latency_seconds", "Median single-row latency measured at startup", ["backend"]
+)
+MODEL_BACKEND_PROBE_ACCURACY = Gauge("model_backend_probe_accuracy", "Accuracy on the startup probe set", ["backend"])
+DECISION_GRID_LOOKUPS = Counter(
+    "decision_grid_lookups_total", "Decision grid predictions, answered from the grid (hit) or by the model (fallback)",
+    ["result"]
+)
+
+# Admission control
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests rejected by admission control, by stage and reason (queue_full, deadline)",
+    ["stage", "reason"]
+)
+STAGE_IN_FLIGHT = Gauge("stage_in_flight", "Requests currently holding a slot of a limited stage", ["stage"])
+CIRCUIT_BREAKER_OPEN = Gauge("circuit_breaker_open", "1 while the circuit breaker for a dependency is open", ["dependency"])
+MODEL_FALLBACKS = Counter("model_fallback_predictions_total", "Predictions served by the fallback backend", ["backend"])
+
+# WebSocket clients
+WEBSOCKET_CLIENTS = Gauge("websocket_clients", "Currently connected alert WebSocket clients")
+SERIES_SUBSCRIPTIONS = Gauge("series_subscriptions", "Series subscribed over /ws/series, summed over connected dashboards")
+INGEST_CHANNELS = Gauge("ingest_channels", "Currently connected /ws/ingest gateways")
+
+
+def stage_timer(stage: str):
+    return INGEST_STAGE_SECONDS.labels(stage=stage).time()
+
+
+def inference_timer(backend: str):
+    return MODEL_INFERENCE_SECONDS.labels(backend=backend).time()
+
+
+def record_backend_selection(report: dict):
+    for backend, result in report.items():
+        if "error" not in result:
+            MODEL_BACKEND_PROBE_LATENCY.labels(backend=backend).set(result["latency_ms"] / 1000)
+            MODEL_BACKEND_PROBE_ACCURACY.labels(backend=backend).set(result["accuracy"])
+
+
+class ResponseCacheCollector:
+    # Reads the response cache counters at scrape time instead of on every lookup
+    def __init__(self, cache):
+        self.cache = cache
+
+    def collect(self):
+        stats = self.cache.stats()
+        lookups = CounterMetricFamily("response_cache_lookups", "Response cache lookups by result", labels=["result"])
+        lookups.add_metric(["hit"], stats["hits"])
+        lookups.add_metric(["miss"], stats["misses"])
+        yield lookups
+        yield CounterMetricFamily("response_cache_not_modified", "Cached responses answered with 304", value=stats["not_modified"])
+        yield CounterMetricFamily("response_cache_invalidations", "Cache entries dropped by invalidation", value=stats["invalidations"])
+        yield GaugeMetricFamily("response_cache_entries", "Entries currently in the response cache", value=stats["entries"])
+
+
+def register_cache_metrics(cache):
+    REGISTRY.register(ResponseCacheCollector(cache))
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,261 @@
+import logging
+import os
+import random
+import time
+import warnings
+
+import joblib
+import numpy as np
+import requests
+
+from admission import CircuitBreaker, remaining
+from metrics import TF_SERVING_ERRORS, MODEL_FALLBACKS
+from rf_engine import CompiledForest
+
+logger = logging.getLogger("sensor_api.models")
+
+# The RF model and scaler were fitted on a DataFrame; we pass plain arrays on purpose
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+# Model files, relative to the working directory as in the container
+RF_MODEL_PATH = os.path.join("ML", "models", "rf_model.pkl")
+NN_MODEL_PATH = os.path.join("ML", "models", "nn_model.keras")
+SCALER_PATH = os.path.join("ML", "models", "scaler.pkl")
+SAVED_MODEL_PATH = os.path.join("ML", "models", "fire_nn", "1")
+
+# Every backend name MODEL_BACKEND may select
+BACKEND_NAMES = ("rf_model", "rf_compiled", "nn_model", "saved_model", "tf_serving")
+
+
+class ModelBackend:
+    """A way of turning (temperature, humidity, soundLevel) rows into 0 (normal) / 1 (fire)."""
+    name = None
+
+    def predict(self, features) -> np.ndarray:
+        raise NotImplementedError
+
+
+class RandomForestBackend(ModelBackend):
+    name = "rf_model"
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, features):
+        return self.model.predict(np.asarray(features, dtype=np.float64)).astype(np.int32)
+
+
+class CompiledRandomForestBackend(ModelBackend):
+    # rf_model.pkl flattened into NumPy arrays (see rf_engine.py); same predictions as rf_model
+    name = "rf_compiled"
+
+    # Above this many rows sklearn's Cython traversal is faster than the NumPy one
+    SKLEARN_BATCH_ROWS = 1024
+
+    def __init__(self, model):
+        self.model = model
+        self.forest = CompiledForest.from_sklearn(model)
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        if len(features) > self.SKLEARN_BATCH_ROWS:
+            return self.model.predict(features).astype(np.int32)
+        return self.forest.predict(features).astype(np.int32)
+
+
+class KerasBackend(ModelBackend):
+    # In-process nn_model.keras; it was trained on StandardScaler output
+    name = "nn_model"
+
+    def __init__(self, model, scaler):
+        self.model = model
+        self.mean = scaler.mean_.astype(np.float32)
+        self.scale = scaler.scale_.astype(np.float32)
+
+    def predict(self, features):
+        scaled = (np.asarray(features, dtype=np.float32) - self.mean) / self.scale
+        probabilities = np.asarray(self.model(scaled, training=False))
+        return (probabilities[:, 0] > 0.5).astype(np.int32)
+
+
+class SavedModelBackend(ModelBackend):
+    # The exported fire_nn SavedModel (normalization built in), loaded in-process instead of via TF Serving
+    name = "saved_model"
+
+    def __init__(self, path):
+        import tensorflow as tf
+        self.tf = tf
+        self.model = tf.saved_model.load(path)
+        self.serve = self.model.signatures["serving_default"]
+
+    def predict(self, features):
+        inputs = self.tf.constant(np.asarray(features, dtype=np.float32))
+        outputs = self.serve(inputs)
+        probabilities = next(iter(outputs.values())).numpy()
+        return (probabilities[:, 0] > 0.5).astype(np.int32)
+
+
+class TFServingBackend(ModelBackend):
+    name = "tf_serving"
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def predict(self, features):
+        # Never wait longer than the request that needs the prediction
+        timeout = self.timeout
+        left = remaining()
+        if left is not None:
+            timeout = max(0.001, min(timeout, left))
+        try:
+            response = self.session.post(self.url, json={"instances": np.asarray(features).tolist()}, timeout=timeout)
+        except Exception:
+            TF_SERVING_ERRORS.inc()
+            raise
+        if response.status_code != 200:
+            TF_SERVING_ERRORS.inc()
+            raise RuntimeError(f"TF Serving error: {response.text}")
+        probabilities = np.array(response.json()["predictions"])
+        return (probabilities[:, 0] > 0.5).astype(np.int32)
+
+    def status(self, timeout: float = 1.0):
+        """(ready, detail) from TF Serving's model status endpoint (the predict URL without ':predict')."""
+        try:
+            response = self.session.get(self.url.rsplit(":", 1)[0], timeout=timeout)
+            versions = response.json()["model_version_status"]
+        except Exception as e:
+            return False, f"unreachable: {type(e).__name__}"
+        states = [version["state"] for version in versions]
+        return "AVAILABLE" in states, ", ".join(states)
+
+
+class CircuitBreakerBackend(ModelBackend):
+    # Uses the primary backend while it works and the fallback while its breaker is open
+    def __init__(self, primary: ModelBackend, fallback: ModelBackend, breaker: CircuitBreaker):
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = breaker
+        self.name = primary.name
+
+    def predict(self, features):
+        if self.breaker.allow():
+            try:
+                predictions = self.primary.predict(features)
+            except Exception as e:
+                self.breaker.record_failure()
+                logger.warning("Backend %s failed, using %s: %s", self.primary.name, self.fallback.name, e)
+            else:
+                self.breaker.record_success()
+                return predictions
+        MODEL_FALLBACKS.labels(backend=self.fallback.name).inc()
+        return self.fallback.predict(features)
+
+
+def load_backends(tf_serving_url: str) -> dict:
+    """Load every backend whose model files are present."""
+    return {**load_forest_backends(), **load_tensorflow_backends(tf_serving_url)}
+
+
+def load_forest_backends() -> dict:
+    # The Random Forest loads in about a second and is the usual fallback, so it goes first
+    rf_model = joblib.load(RF_MODEL_PATH)
+    return {"rf_model": RandomForestBackend(rf_model), "rf_compiled": CompiledRandomForestBackend(rf_model)}
+
+
+def load_tensorflow_backends(tf_serving_url: str) -> dict:
+    # Importing TensorFlow/Keras takes several seconds
+    backends = {}
+    if os.path.exists(NN_MODEL_PATH):
+        from keras.models import load_model
+        backends["nn_model"] = KerasBackend(load_model(NN_MODEL_PATH), joblib.load(SCALER_PATH))
+
+    if os.path.exists(SAVED_MODEL_PATH):
+        try:
+            backends["saved_model"] = SavedModelBackend(SAVED_MODEL_PATH)
+        except Exception as e:
+            logger.warning("Could not load SavedModel backend: %s", e)
+
+    if tf_serving_url:
+        backends["tf_serving"] = TFServingBackend(tf_serving_url)
+
+    return backends
+
+
+def model_fingerprint(backend: ModelBackend) -> str:
+    """Identifies the model files behind a backend, so derived artefacts can detect a retrained model."""
+    paths = {
+        "rf_model": [RF_MODEL_PATH], "rf_compiled": [RF_MODEL_PATH],
+        "nn_model": [NN_MODEL_PATH, SCALER_PATH], "saved_model": [SAVED_MODEL_PATH],
+    }.get(backend.name, [])
+    parts = [backend.name]
+    for path in paths:
+        stat = os.stat(path)
+        parts.append(f"{path}:{stat.st_size}:{int(stat.st_mtime)}")
+    if isinstance(backend, TFServingBackend):
+        parts.append(backend.url)
+    return "|".join(parts)
+
+
+def make_probe_set(n: int = 2000, seed: int = 0):
+    """Labelled rows drawn from the same distributions the sensor simulators use."""
+    rng = random.Random(seed)
+    rows, labels = [], []
+    for i in range(n):
+        if i % 2:
+            rows.append([rng.uniform(55, 80), rng.uniform(10, 30), rng.uniform(70, 95)])
+            labels.append(1)
+        else:
+            rows.append([
+                min(30.0, max(16.0, rng.gauss(22.5, 2.0))),
+                min(90.0, max(30.0, rng.gauss(60.0, 10.0))),
+                min(90.0, max(30.0, rng.gauss(55.0, 10.0))),
+            ])
+            labels.append(0)
+    return np.round(np.array(rows), 1), np.array(labels)
+
+
+def measure_backend(backend: ModelBackend, probe_rows, probe_labels, latency_samples: int = 50) -> dict:
+    # Accuracy on the probe set (one batched call) and median single-row latency
+    accuracy = float((backend.predict(probe_rows) == probe_labels).mean())
+
+    backend.predict(probe_rows[:1])     # warm up
+    latencies = []
+    for i in range(latency_samples):
+        row = probe_rows[i % len(probe_rows)][None, :]
+        start = time.perf_counter()
+        backend.predict(row)
+        latencies.append(time.perf_counter() - start)
+
+    return {"accuracy": round(accuracy, 4), "latency_ms": round(float(np.median(latencies)) * 1000, 4)}
+
+
+def resolve_backend(backends: dict, name: str, setting: str) -> ModelBackend:
+    # A configured backend whose model files or service were not loaded is a configuration error
+    if name not in backends:
+        raise ValueError(f"{setting}={name} is not loaded; available: {', '.join(sorted(backends)) or 'none'}")
+    return backends[name]
+
+
+def select_backend(backends: dict, min_accuracy: float, max_latency_ms: float, fallback: str):
+    """Pick the fastest backend that meets the accuracy and single-row latency targets."""
+    probe_rows, probe_labels = make_probe_set()
+    report = {}
+    for name, backend in backends.items():
+        try:
+            report[name] = measure_backend(backend, probe_rows, probe_labels)
+        except Exception as e:
+            logger.warning("Backend %s unavailable during selection: %s", name, e)
+            report[name] = {"error": str(e)}
+
+    eligible = [
+        name for name, result in report.items()
+        if "error" not in result and result["accuracy"] >= min_accuracy and result["latency_ms"] <= max_latency_ms
+    ]
+    if eligible:
+        chosen = min(eligible, key=lambda name: report[name]["latency_ms"])
+    else:
+        chosen = fallback
+        logger.warning("No model backend meets the targets, falling back to %s", fallback)
+    return chosen, report
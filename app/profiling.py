@@ -0,0 +1,274 @@
+import asyncio
+import cProfile
+import hmac
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger("sensor_api.profiling")
+
+PROFILE_MODES = ("sampling", "cprofile")
+# Download format -> (media type, mode that produces it)
+PROFILE_FORMATS = {
+    "pstats": ("application/octet-stream", "cprofile"),
+    "collapsed": ("text/plain; charset=utf-8", "sampling"),
+}
+
+
+def check_admin(request: Request, token: str):
+    # Without a configured token the admin endpoints do not exist
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+
+
+def collapse(frame, thread_name: str) -> str:
+    # Root first, one "function (file:line)" per frame, as flamegraph.pl and speedscope expect
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+
+class ProfileSession:
+    """One profiling run.
+
+    ``sampling`` records the stack of every thread each ``interval`` seconds from a
+    background thread, so it sees the event loop and the threadpool (sync endpoints such
+    as the stats query, MongoDB calls, model inference) at a fixed, small cost.
+    ``cprofile`` counts every call, but only on the event loop thread (the async handlers:
+    ingest, detection, alert fanout) and slows that thread down while it runs.
+    """
+
+    def __init__(self, mode: str, seconds: float, route: str = None, max_requests: int = None, interval: float = 0.01):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.seconds = seconds
+        self.route = route
+        self.max_requests = max_requests
+        self.requests = 0
+        self.interval = interval
+        self.started_at = None
+        self.ended_at = None
+        self.samples = Counter()
+        self.sample_count = 0
+        self.stats = None
+        self._profile = None
+        self._stopped = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+            self._sampler.start()
+        self.started_at = time.time()
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.samples[collapse(frame, names.get(ident, str(ident)))] += 1
+            self.sample_count += 1
+
+    def stop(self):
+        if self.ended_at:
+            return
+        self.ended_at = time.time()
+        if self._profile:
+            self._profile.disable()
+            self._profile.create_stats()
+            self.stats = self._profile.stats
+            self._profile = None
+        else:
+            self._stopped.set()
+            self._sampler.join()
+
+    def export(self, fmt: str) -> bytes:
+        if fmt == "pstats":
+            # Same bytes as Profile.dump_stats(): load with pstats.Stats(path) or snakeviz
+            return marshal.dumps(self.stats)
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common()).encode()
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "running": self.ended_at is None,
+            "seconds": self.seconds,
+            "route": self.route,
+            "max_requests": self.max_requests,
+            "requests": self.requests,
+            "samples": self.sample_count if self.mode == "sampling" else None,
+            "started_at": isoformat(self.started_at),
+            "ended_at": isoformat(self.ended_at),
+            "formats": [fmt for fmt, (_, mode) in PROFILE_FORMATS.items() if mode == self.mode],
+        }
+
+
+class Profiler:
+    """At most one profiling session at a time, plus the last few finished ones.
+
+    A session runs for ``seconds``, or until ``requests`` requests to ``route`` (a route
+    template such as ``/sensor-data/stats/{sensor_type}``) have completed, whichever comes
+    first. The route only bounds the window: everything the process does meanwhile is
+    profiled, including other requests running at the same time.
+    """
+
+    def __init__(self, max_seconds: float = 300, keep: int = 5):
+        self.max_seconds = max_seconds
+        self.session = None
+        self.route = None           # checked by ProfilingMiddleware; None = nothing to count
+        self.finished = deque(maxlen=keep)
+        self._timer = None
+
+    def start(self, mode: str, seconds: float = None, route: str = None, requests: int = None, interval: float = 0.01) -> dict:
+        if mode not in PROFILE_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(PROFILE_MODES)}")
+        if seconds is None and not (route and requests):
+            raise HTTPException(status_code=400, detail="Give seconds, or route and requests")
+        if (route is None) != (requests is None) or (requests is not None and requests < 1):
+            raise HTTPException(status_code=400, detail="route and requests go together; requests must be positive")
+        if not 0.001 <= interval <= 1:
+            raise HTTPException(status_code=400, detail="interval must be between 1 ms and 1 s")
+        if self.session:
+            raise HTTPException(status_code=409, detail=f"Profiling session {self.session.id} is already running")
+
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        session = ProfileSession(mode, seconds, route, requests, interval)
+        try:
+            session.start()
+        except ValueError as e:     # another profiler is active on this thread
+            raise HTTPException(status_code=409, detail=str(e))
+        self.session = session
+        self.route = route
+        self._timer = asyncio.get_running_loop().call_later(seconds, self.stop)
+        logger.info("Profiling started", extra={"session": session.id, "mode": mode, "seconds": seconds, "route": route})
+        return session.summary()
+
+    def stop(self):
+        session = self.session
+        if session is None:
+            return None
+        self.session = None
+        self.route = None
+        self._timer.cancel()
+        session.stop()
+        self.finished.append(session)
+        logger.info("Profiling stopped", extra={"session": session.id, "requests": session.requests})
+        return session.summary()
+
+    def request_done(self, scope):
+        # The router stores the matched route in the scope
+        session = self.session
+        if session and getattr(scope.get("route"), "path", None) == self.route:
+            session.requests += 1
+            if session.requests >= session.max_requests:
+                self.stop()
+
+    def sessions(self) -> list:
+        running = [self.session] if self.session else []
+        return [session.summary() for session in running + list(reversed(self.finished))]
+
+    def download(self, session_id: str, fmt: str):
+        """(body, media type) of a finished session in ``fmt``."""
+        if fmt not in PROFILE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(PROFILE_FORMATS)}")
+        if self.session and self.session.id == session_id:
+            raise HTTPException(status_code=409, detail="Session is still running")
+        session = next((s for s in self.finished if s.id == session_id), None)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Profiling session not found")
+        media, mode = PROFILE_FORMATS[fmt]
+        if session.mode != mode:
+            raise HTTPException(status_code=400, detail=f"{session.mode} sessions are downloaded as "
+                                                        f"{', '.join(session.summary()['formats'])}")
+        return session.export(fmt), media
+
+
+class ProfilingMiddleware:
+    """Counts completed requests for a route-bound session; a plain pass-through otherwise."""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if self.profiler.route is None or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.request_done(scope)
+
+
+class MemoryTracer:
+    """tracemalloc snapshots; each one is compared with the previous to show what grew."""
+
+    def __init__(self):
+        self.previous = None        # (taken at, snapshot)
+
+    def start(self, frames: int = 1) -> dict:
+        if tracemalloc.is_tracing():
+            raise HTTPException(status_code=409, detail="tracemalloc is already tracing")
+        tracemalloc.start(frames)
+        self.previous = None
+        return {"tracing": True, "frames": frames}
+
+    def snapshot(self, limit: int = 20, key_type: str = "lineno") -> dict:
+        if key_type not in ("lineno", "filename", "traceback"):
+            raise HTTPException(status_code=400, detail="key_type must be one of: lineno, filename, traceback")
+        if not tracemalloc.is_tracing():
+            raise HTTPException(status_code=409, detail="tracemalloc is not tracing; start it first")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        taken_at = time.time()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.previous:
+            stats = snapshot.compare_to(self.previous[1], key_type)
+        else:
+            stats = snapshot.statistics(key_type)
+        report = {
+            "taken_at": isoformat(taken_at),
+            "compared_to": isoformat(self.previous[0]) if self.previous else None,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [{
+                "location": [str(frame) for frame in stat.traceback] if key_type == "traceback" else str(stat.traceback),
+                "size": stat.size,
+                "size_diff": getattr(stat, "size_diff", None),
+                "count": stat.count,
+                "count_diff": getattr(stat, "count_diff", None),
+            } for stat in stats[:limit]],
+        }
+        self.previous = (taken_at, snapshot)
+        return report
+
+    def stop(self) -> dict:
+        tracemalloc.stop()
+        self.previous = None
+        return {"tracing": False}
@@ -0,0 +1,28 @@
+import time
+
+
+class Readiness:
+    """Startup state of the API's dependencies, reported by /readyz.
+
+    The process serves HTTP as soon as it starts; dependencies come up in the background and
+    record their state here. The API is ready once every ``required`` dependency is; the
+    others (index builds, TF Serving) are reported but do not hold back traffic.
+    """
+
+    def __init__(self, required: tuple):
+        self.required = required
+        self.checks = {name: {"ready": False, "detail": "starting"} for name in required}
+        self.started = time.monotonic()
+        self.ready_after = None
+
+    def set(self, name: str, ready: bool, detail: str = None):
+        self.checks[name] = {"ready": ready, "detail": detail}
+        if self.ready and self.ready_after is None:
+            self.ready_after = round(time.monotonic() - self.started, 3)
+
+    @property
+    def ready(self) -> bool:
+        return all(self.checks[name]["ready"] for name in self.required)
+
+    def report(self) -> dict:
+        return {"ready": self.ready, "ready_after_s": self.ready_after, "checks": self.checks}
@@ -0,0 +1,173 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+
+class CacheEntry:
+    def __init__(self, body: bytes, etag: str, scope: dict, expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.scope = scope
+        self.expires_at = expires_at
+
+
+class PendingCompute:
+    # A cache miss being computed; marked stale when data in its scope changes meanwhile
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.stale = False
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def overlaps(scope: dict, changed: dict) -> bool:
+    relevant = [field for field in changed if field in scope]
+    return bool(relevant) and all(scope[field] in (None, changed[field]) for field in relevant)
+
+
+class ResponseCache:
+    """TTL + LRU cache for rendered JSON responses.
+
+    Every entry carries a scope, e.g. {"type": "Temperature", "building": None, "floor": None}.
+    A scope value of None means "any", so invalidating a reading for Temperature/A/1 drops
+    every entry whose scope could contain that reading and leaves the rest alone.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        # Computes in flight; a result is not stored if its own scope changed while it ran
+        self._pending = set()
+
+    @staticmethod
+    def make_key(route: str, params: dict) -> str:
+        # Normalize: drop unset parameters and sort the rest
+        normalized = sorted((k, str(v)) for k, v in params.items() if v is not None)
+        return route + "?" + "&".join(f"{k}={v}" for k, v in normalized)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def begin(self, scope: dict) -> PendingCompute:
+        pending = PendingCompute(scope)
+        with self._lock:
+            self._pending.add(pending)
+        return pending
+
+    def end(self, pending: PendingCompute):
+        with self._lock:
+            self._pending.discard(pending)
+
+    def put(self, key: str, body: bytes, scope: dict, ttl_seconds: float = None,
+            pending: PendingCompute = None) -> CacheEntry:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        entry = CacheEntry(body, etag_for(body), scope, time.monotonic() + ttl)
+        with self._lock:
+            if pending is not None:
+                self._pending.discard(pending)
+                if pending.stale:
+                    return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    # Drop entries whose scope overlaps the changed data
+    def invalidate(self, **changed):
+        with self._lock:
+            for pending in self._pending:
+                if overlaps(pending.scope, changed):
+                    pending.stale = True
+            stale = [key for key, entry in self._entries.items() if overlaps(entry.scope, changed)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "entries": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+        }
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _response_for(cache: ResponseCache, request: Request, entry: CacheEntry, status: str) -> Response:
+    headers = {"ETag": entry.etag, "X-Cache": status, "Cache-Control": "no-cache"}
+    if _etag_matches(request, entry.etag):
+        cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# Serve a read endpoint from the cache, computing and storing it on a miss.
+# With store=False the cache is bypassed: the result is computed every time, but still gets an ETag
+def cached_json(cache: ResponseCache, request: Request, route: str, params: dict, scope: dict, compute,
+                ttl_seconds: float = None, store: bool = True) -> Response:
+    if not store:
+        content = compute()
+        if isinstance(content, Response):
+            return content
+        body = JSONResponse(content=content).body
+        return _response_for(cache, request, CacheEntry(body, etag_for(body), scope, 0), "BYPASS")
+
+    key = cache.make_key(route, params)
+    entry = cache.get(key)
+    if entry is not None:
+        return _response_for(cache, request, entry, "HIT")
+
+    pending = cache.begin(scope)
+    try:
+        content = compute()
+        if isinstance(content, Response):
+            cache.end(pending)
+            return content
+        body = JSONResponse(content=content).body
+    except BaseException:
+        cache.end(pending)
+        raise
+    entry = cache.put(key, body, scope, ttl_seconds, pending)
+    return _response_for(cache, request, entry, "MISS")
@@ -0,0 +1,298 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger("sensor_api.retention")
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# Tier names, finest first, with the width of one bucket
+TIERS = {"raw": None, "hourly": HOUR, "daily": DAY}
+
+# Longest range served from a tier before switching to the next, coarser one
+TIER_MAX_SPAN = {"raw": timedelta(days=2), "hourly": timedelta(days=90)}
+
+# The reading value, whatever the sensor type
+VALUE_EXPRESSION = {"$ifNull": ["$temperature", {"$ifNull": ["$humidity", "$soundLevel"]}]}
+VALUE_FIELDS = {"Temperature": "temperature", "Humidity": "humidity", "Acoustic": "soundLevel"}
+
+
+def utcnow() -> datetime:
+    # pymongo hands back naive UTC datetimes, so compare against the same
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def floor_time(moment: datetime, width: timedelta) -> datetime:
+    epoch = datetime(1970, 1, 1)
+    return epoch + ((moment - epoch) // width) * width
+
+
+def time_range(start: datetime = None, end: datetime = None) -> dict:
+    bounds = {"$gte": start, "$lt": end}
+    return {op: bound for op, bound in bounds.items() if bound is not None} or {"$exists": True}
+
+
+def bucket_expression(field: str, width: timedelta) -> dict:
+    # Start of the UTC bucket holding ``field``, computed by MongoDB (date minus milliseconds is a date)
+    millis = int(width.total_seconds() * 1000)
+    return {"$subtract": [field, {"$mod": [{"$subtract": [field, datetime(1970, 1, 1)]}, millis]}]}
+
+
+def ensure_ttl_index(collection, field: str, days: float, name: str):
+    """Expire documents ``days`` after ``field``; 0 keeps them forever."""
+    if not days:
+        if name in collection.index_information():
+            collection.drop_index(name)
+        return
+    seconds = int(days * 86400)
+    try:
+        collection.create_index([(field, ASCENDING)], name=name, expireAfterSeconds=seconds)
+    except OperationFailure:
+        # The TTL changed since the index was created
+        collection.database.command("collMod", collection.name, index={"name": name, "expireAfterSeconds": seconds})
+
+
+class RetentionManager:
+    """Keeps hourly and daily rollups of the raw readings and ages out what has been rolled up.
+
+    Rollups are built one complete bucket at a time and replace what is stored for that
+    bucket, so a crash or a second run never counts a reading twice. The next bucket to
+    build is kept as a watermark in ``state``. Each run handles at most ``max_buckets``
+    new buckets per tier, so catching up on a large backlog is spread over many runs.
+
+    Raw readings and hourly rows are deleted by the job, not by a TTL index: only once
+    they are past their retention window *and* ``late_window`` behind the watermark of
+    the tier built from them. Each run also rebuilds the buckets within ``late_window``
+    before the watermark, so readings that arrive late for a finished hour are counted.
+    """
+
+    def __init__(self, raw, hourly, daily, state, raw_days: float, hourly_days: float, daily_days: float,
+                 max_buckets: int = 24, backfill_batch: int = 5000, late_window: timedelta = HOUR):
+        self.raw = raw
+        self.hourly = hourly
+        self.daily = daily
+        self.state = state
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.daily_days = daily_days
+        self.max_buckets = max_buckets
+        self.backfill_batch = backfill_batch
+        self.late_window = late_window
+
+    def ensure_indexes(self):
+        # Raw readings and hourly rows are deleted by expire(), once they are rolled up
+        self.raw.create_index([("ts", ASCENDING)], name="ts_1")
+        self.hourly.create_index([("bucket", ASCENDING)], name="bucket_1")
+        for collection in (self.hourly, self.daily):
+            collection.create_index(
+                [("type", ASCENDING), ("building", ASCENDING), ("floor", ASCENDING), ("bucket", ASCENDING)],
+                name="bucket_key", unique=True
+            )
+        # Nothing is built from daily rows, so they can expire on their own
+        ensure_ttl_index(self.daily, "bucket", self.daily_days, "bucket_ttl")
+
+    def backfill_ts(self) -> int:
+        # Readings stored before the ts field existed only have the ISO timestamp string
+        docs = list(self.raw.find({"ts": {"$exists": False}}, {"timestamp": 1}).limit(self.backfill_batch))
+        updates = []
+        for doc in docs:
+            try:
+                moment = datetime.fromisoformat(doc["timestamp"]).astimezone(timezone.utc).replace(tzinfo=None)
+            except (KeyError, TypeError, ValueError):
+                moment = doc["_id"].generation_time.replace(tzinfo=None)
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"ts": moment}}))
+        # One round-trip for the whole batch
+        if updates:
+            self.raw.bulk_write(updates, ordered=False)
+        return len(docs)
+
+    def _watermark(self, tier: str, source, time_field: str, width: timedelta):
+        state = self.state.find_one({"_id": tier})
+        if state:
+            return state["watermark"]
+        oldest = source.find_one({time_field: {"$exists": True}}, sort=[(time_field, ASCENDING)])
+        return floor_time(oldest[time_field], width) if oldest else None
+
+    def _save(self, target, bucket: datetime, groups: list):
+        # One row per location and type, so a bucket is only a handful of upserts
+        for group in groups:
+            key = {**group["_id"], "bucket": bucket}
+            doc = {**key, "count": group["count"], "sum": group["sum"], "min": group["min"], "max": group["max"]}
+            target.update_one(key, {"$set": doc}, upsert=True)
+
+    def _raw_groups(self, start: datetime, end: datetime, match: dict = None, width: timedelta = None) -> list:
+        # One group per location and type; with ``width``, also per bucket of that width
+        key = {"type": "$type", "building": "$building", "floor": "$floor"}
+        project = {"type": 1, "building": 1, "floor": 1, "value": VALUE_EXPRESSION}
+        if width:
+            key["bucket"] = "$bucket"
+            project["bucket"] = bucket_expression("$ts", width)
+        return list(self.raw.aggregate([
+            {"$match": {**(match or {}), "ts": time_range(start, end)}},
+            {"$project": project},
+            {"$match": {"value": {"$ne": None}}},
+            {"$group": {
+                "_id": key,
+                "count": {"$sum": 1}, "sum": {"$sum": "$value"},
+                "min": {"$min": "$value"}, "max": {"$max": "$value"},
+            }},
+        ]))
+
+    def _hourly_groups(self, start: datetime, end: datetime, match: dict = None, width: timedelta = None) -> list:
+        key = {"type": "$type", "building": "$building", "floor": "$floor"}
+        if width:
+            key["bucket"] = bucket_expression("$bucket", width)
+        return list(self.hourly.aggregate([
+            {"$match": {**(match or {}), "bucket": time_range(start, end)}},
+            {"$group": {
+                "_id": key,
+                "count": {"$sum": "$count"}, "sum": {"$sum": "$sum"},
+                "min": {"$min": "$min"}, "max": {"$max": "$max"},
+            }},
+        ]))
+
+    def _recent_buckets(self, tier: str, query: dict, start: datetime, end: datetime) -> list:
+        # Buckets of [start, end) that the job has not stored yet, computed from the raw readings;
+        # for days, the hours already rolled up are read from the hourly rows instead
+        width = TIERS[tier]
+        split = start
+        groups = []
+        if tier == "daily":
+            hourly_state = self.state.find_one({"_id": "hourly"})
+            if hourly_state:
+                split = hourly_state["watermark"] if start is None else max(start, hourly_state["watermark"])
+                if end is not None:
+                    split = min(split, end)
+                groups += self._hourly_groups(start, split, query, width)
+        groups += self._raw_groups(split, end, query, width)
+
+        buckets = {}
+        for group in groups:
+            key = tuple(group["_id"].items())
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = {**group["_id"], "count": group["count"], "sum": group["sum"],
+                                "min": group["min"], "max": group["max"]}
+                continue
+            bucket["count"] += group["count"]
+            bucket["sum"] += group["sum"]
+            bucket["min"] = min(bucket["min"], group["min"])
+            bucket["max"] = max(bucket["max"], group["max"])
+        return sorted(buckets.values(), key=lambda b: (b["bucket"], b["type"], str(b["building"]), b["floor"]))
+
+    def _roll_up(self, tier: str, width: timedelta, source, time_field: str, groups, complete_before: datetime,
+                 rebuild_from: datetime = None) -> int:
+        target = self.hourly if tier == "hourly" else self.daily
+        watermark = self._watermark(tier, source, time_field, width)
+        if watermark is None:
+            return 0
+        # Buckets already built since rebuild_from are built again to pick up late readings
+        bucket = watermark
+        if rebuild_from is not None and self.state.find_one({"_id": tier}):
+            bucket = min(watermark, floor_time(rebuild_from, width))
+        built = 0
+        while bucket + width <= complete_before and built < self.max_buckets:
+            self._save(target, bucket, groups(bucket, bucket + width))
+            bucket += width
+            if bucket > watermark:
+                self.state.update_one({"_id": tier}, {"$set": {"watermark": bucket}}, upsert=True)
+                built += 1
+        return built
+
+    def expire(self, now: datetime) -> dict:
+        """Delete raw readings and hourly rows past their retention that are already rolled up."""
+        deleted = {}
+        for name, collection, field, days, tier in (
+            ("raw", self.raw, "ts", self.raw_days, "hourly"),
+            ("hourly", self.hourly, "bucket", self.hourly_days, "daily"),
+        ):
+            state = self.state.find_one({"_id": tier})
+            if not days or not state:
+                deleted[name] = 0
+                continue
+            before = min(now - timedelta(days=days), state["watermark"] - self.late_window)
+            deleted[name] = collection.delete_many({field: {"$lt": before}}).deleted_count
+        return deleted
+
+    def run_once(self, now: datetime = None) -> dict:
+        now = now or utcnow()
+        backfilled = self.backfill_ts()
+        if backfilled == self.backfill_batch:
+            # Roll up only once every reading has ts, or older ones would be skipped
+            return {"backfilled": backfilled, "hourly_buckets": 0, "daily_buckets": 0, "expired": {}}
+        # Only finished hours are rolled up, and only days whose hours are all rolled up
+        hourly_state = self.state.find_one({"_id": "hourly"})
+        rebuild_from = hourly_state["watermark"] - self.late_window if hourly_state else None
+        hours = self._roll_up("hourly", HOUR, self.raw, "ts", self._raw_groups, floor_time(now, HOUR), rebuild_from)
+        hourly_state = self.state.find_one({"_id": "hourly"})
+        days = 0
+        if hourly_state:
+            days = self._roll_up("daily", DAY, self.hourly, "bucket", self._hourly_groups,
+                                 floor_time(hourly_state["watermark"], DAY), rebuild_from)
+        return {"backfilled": backfilled, "hourly_buckets": hours, "daily_buckets": days, "expired": self.expire(now)}
+
+    def catching_up(self, result: dict) -> bool:
+        # A run that hit a limit leaves work for the next one
+        return result["backfilled"] == self.backfill_batch or self.max_buckets in (result["hourly_buckets"], result["daily_buckets"])
+
+    def choose_tier(self, start: datetime = None, end: datetime = None, now: datetime = None) -> str:
+        """Finest tier that still holds the whole range and keeps the number of points reasonable."""
+        if start is None:
+            return "raw"
+        now = now or utcnow()
+        span = (end or now) - start
+        age = now - start
+        if (not self.raw_days or age <= timedelta(days=self.raw_days)) and span <= TIER_MAX_SPAN["raw"]:
+            return "raw"
+        if (not self.hourly_days or age <= timedelta(days=self.hourly_days)) and span <= TIER_MAX_SPAN["hourly"]:
+            return "hourly"
+        return "daily"
+
+    def find_buckets(self, tier: str, query: dict, start: datetime, end: datetime, skip: int, limit: int):
+        """Rolled-up buckets shaped like readings (value field = mean), plus the total count.
+
+        Stored buckets end at the tier's watermark; the buckets after it (the current one and
+        any the job has not reached yet) are computed from the newer readings and follow them.
+        """
+        collection = self.hourly if tier == "hourly" else self.daily
+        first = floor_time(start, TIERS[tier]) if start else None
+        state = self.state.find_one({"_id": tier})
+        docs = []
+        stored_total = 0
+        recent_start = first
+        if state:
+            watermark = state["watermark"]
+            stored_query = {**query, "bucket": time_range(first, watermark if end is None else min(watermark, end))}
+            stored_total = collection.count_documents(stored_query)
+            if skip < stored_total:
+                docs = list(collection.find(stored_query).sort("bucket", ASCENDING).skip(skip).limit(limit))
+            recent_start = watermark if first is None else max(first, watermark)
+
+        recent = []
+        if end is None or recent_start is None or recent_start < end:
+            recent = self._recent_buckets(tier, query, recent_start, end)
+        recent_skip = max(0, skip - stored_total)
+        docs += recent[recent_skip:recent_skip + limit - len(docs)]
+        return [as_reading(doc, tier) for doc in docs], stored_total + len(recent)
+
+
+def as_reading(doc: dict, tier: str) -> dict:
+    result = {
+        "_id": str(doc["_id"]) if "_id" in doc else None,
+        "type": doc["type"],
+        "building": doc["building"],
+        "floor": doc["floor"],
+        "timestamp": doc["bucket"].replace(tzinfo=timezone.utc).isoformat(),
+        "resolution": tier,
+        "count": doc["count"],
+        "min": doc["min"],
+        "max": doc["max"],
+        "mean": round(doc["sum"] / doc["count"], 2),
+    }
+    field = VALUE_FIELDS.get(doc["type"])
+    if field:
+        result[field] = result["mean"]
+    return result
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+class CompiledForest:
+    """A fitted sklearn RandomForestClassifier flattened into NumPy node arrays.
+
+    All trees are stored back to back in one set of arrays (feature, threshold, left,
+    right, value). Prediction walks every (row, tree) pair one level per step with
+    vectorized gathers, so a single row costs a few dozen small array operations instead
+    of sklearn's per-call validation and thread pool dispatch.
+
+    Results are bit-identical to ``model.predict_proba`` / ``model.predict``: inputs are
+    rounded to float32 like sklearn does, tree probabilities are accumulated in the same
+    order and divided by the number of trees.
+    """
+
+    # Rows per traversal chunk; keeps the (rows x trees) working arrays cache sized
+    CHUNK_ROWS = 2048
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # children[2 * node] is the left child and children[2 * node + 1] the right one
+        self.children = np.column_stack([left, right]).ravel()
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes = classes
+        self.n_trees = len(roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        n_classes = len(model.classes_)
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes)
+
+            # Leaves point at themselves, so extra traversal steps leave them in place
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            values.append(tree.value[:, 0, :n_classes])
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=model.classes_,
+        )
+
+    def leaves(self, X) -> np.ndarray:
+        """Leaf node index reached in every tree, shape (n_rows, n_trees)."""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees))
+        for _ in range(self.max_depth):
+            values = flat_X.take(row_offsets + self.feature.take(nodes))
+            go_right = ~(values <= self.threshold.take(nodes))
+            nodes = self.children.take(2 * nodes + go_right)
+        return nodes
+
+    def _predict_proba_chunk(self, X):
+        tree_proba = self.value.take(self.leaves(X), axis=0)      # (n_rows, n_trees, n_classes)
+        # cumsum adds the trees one after another, in the same order as sklearn
+        proba = np.cumsum(tree_proba, axis=1)[:, -1, :]
+        proba /= self.n_trees
+        return proba
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[None, :]
+        if len(X) <= self.CHUNK_ROWS:
+            return self._predict_proba_chunk(X)
+        return np.concatenate([
+            self._predict_proba_chunk(X[start:start + self.CHUNK_ROWS])
+            for start in range(0, len(X), self.CHUNK_ROWS)
+        ])
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
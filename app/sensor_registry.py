@@ -0,0 +1,71 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Namespace for sensor IDs: the same sensor always registers under the same ID
+SENSOR_NAMESPACE = uuid.UUID("6f1c2a7e-3b8d-4c55-9a0e-2d4f7b9e1c30")
+
+# Metadata kept per sensor and joined into every compact reading
+METADATA_FIELDS = ("type", "building", "floor", "vendorName", "vendorEmail", "description")
+
+# How long an unknown sensor ID is answered from memory, and how many such IDs are kept
+UNKNOWN_TTL_SECONDS = 5.0
+MAX_UNKNOWN = 10000
+
+
+def sensor_id_for(sensor_type: str, building: str, floor: int, vendor_email: str) -> str:
+    return str(uuid.uuid5(SENSOR_NAMESPACE, f"{sensor_type}:{building}:{int(floor)}:{vendor_email.lower()}"))
+
+
+class SensorRegistry:
+    """Sensor metadata stored once in MongoDB and cached in this process.
+
+    Sensors never move or change type, so cached entries are never invalidated; a
+    re-registration only updates the vendor details, which readings do not use. Unknown
+    IDs are remembered for ``unknown_ttl`` seconds, so a device sending a bad ID does not
+    cost a query per reading.
+    """
+
+    def __init__(self, collection, unknown_ttl: float = UNKNOWN_TTL_SECONDS):
+        self.collection = collection
+        self.cache = {}             # sensorId -> metadata
+        self.unknown = {}           # sensorId -> time.monotonic() until which it is known to be missing
+        self.unknown_ttl = unknown_ttl
+        self.lock = threading.Lock()
+
+    def register(self, metadata: dict) -> dict:
+        sensor_id = sensor_id_for(metadata["type"], metadata["building"], metadata["floor"], metadata["vendorEmail"])
+        sensor = {field: metadata.get(field) for field in METADATA_FIELDS}
+        self.collection.update_one(
+            {"_id": sensor_id},
+            {"$set": sensor, "$setOnInsert": {"registered_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        with self.lock:
+            self.cache[sensor_id] = sensor
+            self.unknown.pop(sensor_id, None)
+        return {"sensorId": sensor_id, **sensor}
+
+    def cached(self, sensor_id: str):
+        return self.cache.get(sensor_id)
+
+    def known_missing(self, sensor_id: str) -> bool:
+        return self.unknown.get(sensor_id, 0) > time.monotonic()
+
+    def load(self, sensor_id: str):
+        """Metadata of a sensor, from the cache or MongoDB; None if it was never registered."""
+        sensor = self.cache.get(sensor_id)
+        if sensor is not None or self.known_missing(sensor_id):
+            return sensor
+        doc = self.collection.find_one({"_id": sensor_id})
+        if doc is None:
+            with self.lock:
+                if len(self.unknown) >= MAX_UNKNOWN:
+                    self.unknown.clear()
+                self.unknown[sensor_id] = time.monotonic() + self.unknown_ttl
+            return None
+        sensor = {field: doc.get(field) for field in METADATA_FIELDS}
+        with self.lock:
+            self.cache[sensor_id] = sensor
+        return sensor
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from location_state import SENSOR_FIELDS
+
+logger = logging.getLogger("sensor_api.series")
+
+# Frames queued for one client before it is disconnected (it refetches the gap over HTTP)
+SERIES_QUEUE_SIZE = 64
+# Series one connection may subscribe to
+MAX_SERIES = 64
+
+
+def series_key(sensor_type: str, building: str, floor) -> str:
+    return f"{sensor_type}:{building}:{floor}"
+
+
+def parse_series(value: str) -> list:
+    """Series keys from ``Temperature:A:1,Humidity:A:1``; ValueError for anything else."""
+    keys = []
+    for item in filter(None, value.split(",")):
+        sensor_type, building, floor = item.split(":")
+        if sensor_type not in SENSOR_FIELDS or not building:
+            raise ValueError(f"Unknown series {item!r}")
+        keys.append(series_key(sensor_type, building, int(floor)))
+    if not keys or len(keys) > MAX_SERIES:
+        raise ValueError(f"Subscribe to between 1 and {MAX_SERIES} series")
+    return list(dict.fromkeys(keys))
+
+
+class SeriesHub:
+    """Pushes new readings of the subscribed (type, building, floor) series to dashboards.
+
+    Ingest calls ``publish`` for every stored reading; without a subscriber for its series
+    that is one dict lookup. Points are buffered and flushed once per ``frame_seconds``:
+    each series with new points is encoded once, as columns of epoch milliseconds and
+    values, and every client gets one message with the series it subscribed to. Clients
+    load history from GET /sensor-data/ (cached), so open dashboards cost MongoDB nothing.
+    """
+
+    def __init__(self, frame_seconds: float = 0.25):
+        self.frame_seconds = frame_seconds
+        self.subscribers = {}       # series key -> set of SeriesSubscriber
+        self.pending = {}           # series key -> ([ms], [value]) since the last flush
+        self._flush_handle = None
+
+    def publish(self, reading: dict, timestamp_ms: int):
+        key = series_key(reading["type"], reading["building"], reading["floor"])
+        if key not in self.subscribers:
+            return
+        times, values = self.pending.setdefault(key, ([], []))
+        times.append(timestamp_ms)
+        values.append(reading[SENSOR_FIELDS[reading["type"]]])
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.frame_seconds, self.flush)
+
+    def flush(self):
+        self._flush_handle = None
+        pending, self.pending = self.pending, {}
+        # One JSON fragment per series, shared by every client subscribed to it
+        fragments = {key: f"{json.dumps(key)}:{json.dumps({'t': times, 'v': values})}" for key, (times, values) in pending.items()}
+        receivers = {}
+        for key in fragments:
+            for subscriber in self.subscribers.get(key, ()):
+                receivers.setdefault(subscriber, []).append(fragments[key])
+        for subscriber, parts in receivers.items():
+            subscriber.push('{"kind":"points","series":{' + ",".join(parts) + "}}")
+
+    def subscribe(self, keys: list) -> "SeriesSubscriber":
+        subscriber = SeriesSubscriber(keys)
+        for key in keys:
+            self.subscribers.setdefault(key, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: "SeriesSubscriber"):
+        for key in subscriber.keys:
+            subscribers = self.subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[key]
+                    self.pending.pop(key, None)
+
+
+class SeriesSubscriber:
+    # Per-client queue of encoded frames, so a flush never waits for a slow client
+    def __init__(self, keys: list):
+        self.keys = keys
+        self.queue = asyncio.Queue(maxsize=SERIES_QUEUE_SIZE)
+
+    def push(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+async def serve_series(websocket: WebSocket, hub: SeriesHub, series: str):
+    """Stream new points of ``series`` (comma separated ``type:building:floor``) to one client."""
+    await websocket.accept()
+    try:
+        keys = parse_series(series or "")
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    subscriber = hub.subscribe(keys)
+    try:
+        await websocket.send_json({"kind": "subscribed", "series": keys, "frame_ms": round(hub.frame_seconds * 1000)})
+
+        async def send_frames():
+            while True:
+                message = await subscriber.queue.get()
+                if message is None:
+                    await websocket.close(code=1013)        # reconnect and refetch the gap
+                    return
+                await websocket.send_text(message)
+
+        async def wait_for_disconnect():
+            while True:
+                await websocket.receive_text()
+
+        tasks = [asyncio.create_task(send_frames()), asyncio.create_task(wait_for_disconnect())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if not isinstance(task.exception(), (WebSocketDisconnect, type(None))):
+                logger.warning("WebSocket error: %s", task.exception())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import mongomock.collection
+
+# The API modules import each other as top-level modules (see Dockerfile), so put app/ on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pymongo >= 4.11 passes sort= from UpdateOne to the bulk builder; mongomock 4.3 does not take it yet
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+
+def _add_update_without_sort(self, *args, sort=None, **kwargs):
+    return _add_update(self, *args, **kwargs)
+
+
+mongomock.collection.BulkOperationBuilder.add_update = _add_update_without_sort
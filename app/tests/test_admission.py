@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from admission import CircuitBreaker, Overloaded, StageLimiter, deadline, remaining
+from model_backends import CircuitBreakerBackend, ModelBackend
+
+
+def test_full_queue_is_rejected_with_429():
+    async def run():
+        limiter = StageLimiter("test", max_concurrency=1, max_waiting=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as excinfo:
+            async with limiter.slot():
+                pass
+        assert excinfo.value.status_code == 429
+        release.set()
+        await asyncio.gather(holder, waiter)
+
+    asyncio.run(run())
+
+
+def test_deadline_bounds_waiting_and_blocking_calls():
+    async def run():
+        limiter = StageLimiter("test", max_concurrency=1, max_waiting=10)
+        with deadline(0.05):
+            # The deadline reaches the worker thread
+            assert 0 < await limiter.run(remaining) <= 0.05
+
+            start = time.monotonic()
+            with pytest.raises(Overloaded) as excinfo:
+                await limiter.run(time.sleep, 1)
+            assert excinfo.value.status_code == 503
+            assert time.monotonic() - start < 0.5
+
+    asyncio.run(run())
+
+
+class FailingBackend(ModelBackend):
+    name = "remote"
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = True
+
+    def predict(self, features):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("unavailable")
+        return np.ones(len(features), dtype=np.int32)
+
+
+class ZeroBackend(ModelBackend):
+    name = "local"
+
+    def predict(self, features):
+        return np.zeros(len(features), dtype=np.int32)
+
+
+def test_circuit_breaker_falls_back_and_recovers():
+    primary = FailingBackend()
+    breaker = CircuitBreaker("remote", failure_threshold=2, reset_seconds=0.05)
+    backend = CircuitBreakerBackend(primary, ZeroBackend(), breaker)
+
+    # Failures are answered by the fallback; after two the primary is no longer called
+    for _ in range(5):
+        assert backend.predict([[70, 15, 90]]).tolist() == [0]
+    assert primary.calls == 2
+    assert breaker.state == "open"
+
+    # After reset_seconds one trial call goes through and closes the breaker
+    time.sleep(0.06)
+    primary.fail = False
+    assert backend.predict([[70, 15, 90]]).tolist() == [1]
+    assert breaker.state == "closed"
@@ -0,0 +1,89 @@
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from alert_hub import AlertHub, serve_alerts
+
+
+def make_alert(building, floor, alert_id):
+    return {"_id": alert_id, "building": building, "floor": floor, "type": "fire", "detected_at": "2025-08-06T14:00:00+03:00"}
+
+
+def test_resume_from_sequence():
+    hub = AlertHub(history_size=3)
+    hub.load([make_alert("A", 1, "a1")])
+    assert hub.snapshot()["fire"] == {"A:1": True}
+
+    hub.alert_opened(make_alert("B", 2, "b2"))
+    hub.alert_closed("A", 1, "2025-08-06T14:05:00+03:00")
+    assert [m["kind"] for m in hub.since(0, hub.epoch)] == ["alert_opened", "alert_closed"]
+    assert hub.since(2, hub.epoch) == []
+    assert hub.snapshot()["fire"] == {"A:1": False, "B:2": True}
+
+    # Another process, or deltas that fell out of the history, need a new snapshot
+    assert hub.since(1, "other-epoch") is None
+    for i in range(3):
+        hub.alert_opened(make_alert("C", i, f"c{i}"))
+    assert hub.since(1, hub.epoch) is None
+
+
+def test_websocket_snapshot_then_deltas():
+    hub = AlertHub()
+    hub.load([make_alert("A", 1, "a1")])
+    app = FastAPI()
+
+    @app.websocket("/ws/alerts")
+    async def alerts(websocket: WebSocket, since: int = None, epoch: str = None):
+        await serve_alerts(websocket, hub, since, epoch)
+
+    # Publish on the app's event loop, as ingest does
+    @app.post("/open/{building}/{floor}/{alert_id}")
+    async def open_alert(building: str, floor: int, alert_id: str):
+        hub.alert_opened(make_alert(building, floor, alert_id))
+
+    @app.post("/close/{building}/{floor}")
+    async def close_alert(building: str, floor: int):
+        hub.alert_closed(building, floor, None)
+
+    # One event loop for every connection and request
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/alerts") as first, client.websocket_connect("/ws/alerts") as second:
+            for websocket in (first, second):
+                snapshot = websocket.receive_json()
+                assert snapshot["kind"] == "snapshot" and [a["_id"] for a in snapshot["alerts"]] == ["a1"]
+
+            # A new client does not make the others receive anything; a new alert reaches everyone
+            with client.websocket_connect("/ws/alerts") as third:
+                third.receive_json()
+            client.post("/open/B/2/b2")
+            for websocket in (first, second):
+                delta = websocket.receive_json()
+                assert delta["kind"] == "alert_opened" and delta["seq"] == 1
+
+        # Resuming gets only what was missed
+        client.post("/close/B/2")
+        with client.websocket_connect(f"/ws/alerts?since=1&epoch={hub.epoch}") as websocket:
+            assert websocket.receive_json()["kind"] == "alert_closed"
+
+
+def test_apply_mirrors_another_hub():
+    worker, mirror = AlertHub(), AlertHub()
+
+    def owned(building, floor):
+        return building == "A"
+
+    mirror.alert_opened(make_alert("B", 1, "b1"))       # owned by a different worker
+
+    worker.load([make_alert("A", 1, "a1")])
+    mirror.apply(worker.snapshot(), owned)
+    worker.alert_closed("A", 1, None)
+    worker.alert_opened(make_alert("A", 2, "a2"))
+    for message in worker.since(0, worker.epoch):
+        mirror.apply(message, owned)
+
+    assert sorted(a["_id"] for a in mirror.snapshot()["alerts"]) == ["a2", "b1"]
+
+    # A fresh snapshot (worker restarted) drops alerts of owned locations that are gone
+    restarted = AlertHub()
+    restarted.load([])
+    mirror.apply(restarted.snapshot(), owned)
+    assert [a["_id"] for a in mirror.snapshot()["alerts"]] == ["b1"]
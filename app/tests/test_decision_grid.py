@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from model_backends import ModelBackend, RF_MODEL_PATH, load_forest_backends
+from decision_grid import DecisionGrid, DecisionGridBackend, UNCERTAIN
+
+
+class ThresholdBackend(ModelBackend):
+    # Fire when temperature is above 45.05, i.e. between two grid points; counts model calls
+    name = "threshold"
+
+    def __init__(self):
+        self.rows = 0
+
+    def predict(self, features):
+        features = np.asarray(features)
+        self.rows += len(features)
+        return (features[:, 0] > 45.05).astype(np.int32)
+
+
+def test_grid_matches_model_and_falls_back_near_boundary():
+    model = ThresholdBackend()
+    grid = DecisionGrid.build(model, lows=(16.0, 10.0, 30.0), highs=(80.0, 95.0, 95.0), step=0.5)
+    backend = DecisionGridBackend(grid, model)
+
+    rng = np.random.default_rng(0)
+    X = np.round(np.column_stack([
+        rng.uniform(10, 90, 2000), rng.uniform(0, 100, 2000), rng.uniform(20, 100, 2000)
+    ]), 1)
+    model.rows = 0
+    assert np.array_equal(backend.predict(X), (X[:, 0] > 45.05).astype(np.int32))
+
+    # Only rows outside the grid or next to the boundary reach the model
+    lookup = grid.lookup(X)
+    assert model.rows == int((lookup == UNCERTAIN).sum()) < len(X)
+    assert (lookup[np.abs(X[:, 0] - 45.05) < 0.25] == UNCERTAIN).all()
+    assert (lookup[(X[:, 0] > 90) | (X[:, 1] < 9.75)] == UNCERTAIN).all()
+
+
+def test_save_and_load_memory_mapped(tmp_path):
+    model = ThresholdBackend()
+    path = str(tmp_path / "grid.npy")
+    grid = DecisionGrid.load_or_build(path, model, 1.0, "v1")
+    model.rows = 0
+
+    loaded = DecisionGrid.load_or_build(path, model, 1.0, "v1")
+    assert isinstance(loaded.cells, np.memmap)
+    assert model.rows == 0
+    assert np.array_equal(loaded.cells, grid.cells)
+
+    # A different model fingerprint rebuilds the grid; the new files replace the old ones, so the
+    # grid mapped above keeps reading the old cells and no temporary files are left behind
+    before = np.array(loaded.cells)
+    DecisionGrid.load_or_build(path, model, 2.0, "v2")
+    assert model.rows > 0
+    assert np.array_equal(loaded.cells, before)
+    assert sorted(os.listdir(tmp_path)) == ["grid.npy", "grid.npy.json"]
+
+
+def test_diagonal_neighbours_are_uncertain():
+    cells = np.zeros((5, 5, 5), dtype=np.uint8)
+    cells[2, 2, 2] = 1
+    DecisionGrid._mark_boundaries(cells, margin=1)
+    assert (cells[1:4, 1:4, 1:4] == UNCERTAIN).all()
+    assert (cells == UNCERTAIN).sum() == 27
+
+
+class FailingBackend(ThresholdBackend):
+    def predict(self, features):
+        if self.rows:
+            raise ConnectionError("model went away")
+        return super().predict(features)
+
+
+def test_failed_build_is_not_saved(tmp_path):
+    path = str(tmp_path / "grid.npy")
+    with pytest.raises(ConnectionError):
+        DecisionGrid.load_or_build(path, FailingBackend(), 1.0, "v1")
+    assert not os.path.exists(path)
+
+
+@pytest.mark.skipif(not os.path.exists(RF_MODEL_PATH), reason="needs the trained Random Forest")
+def test_default_grid_agrees_with_the_shipped_forest():
+    # Around 17.2 degrees the forest has a fire region about 0.1 wide, thinner than a 0.5 step
+    backend = load_forest_backends()["rf_compiled"]
+    lows, highs = (16.0, 10.0, 30.0), (22.0, 95.0, 95.0)
+    grid = DecisionGrid.build(backend, lows, highs)
+
+    rng = np.random.default_rng(1)
+    X = np.round(np.column_stack([rng.uniform(low, high, 100_000) for low, high in zip(lows, highs)]), 1)
+    lookup = grid.lookup(X)
+    confident = lookup != UNCERTAIN
+    assert confident.mean() > 0.9
+    assert np.array_equal(lookup[confident], backend.predict(X[confident]))
@@ -0,0 +1,86 @@
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import mongomock
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from alert_hub import AlertHub, serve_alerts
+from detection_trace import DetectionTracer
+
+TZ = ZoneInfo("Europe/Athens")
+
+
+def make_tracer(hub=None):
+    db = mongomock.MongoClient()["test"]
+    return DetectionTracer(db["events"], db["sensor_readings"], db["detection_traces"], hub or AlertHub(), TZ), db
+
+
+def checkpoints(received_ago=0.5):
+    received = time.perf_counter() - received_ago
+    return {"received": received, "prediction_started": received + 0.1, "predicted": received + 0.2, "alert_inserted": received + 0.3}
+
+
+def test_trace_links_alert_to_event():
+    tracer, db = make_tracer()
+    now = datetime.now(TZ)
+    event_start = now - timedelta(seconds=90)
+    event_id = db["events"].insert_one({"type": "fire", "building": "A", "floor": 1,
+                                        "start_time": event_start.isoformat(), "duration": 600}).inserted_id
+    # One reading before the event, three during it, and one at another location
+    for seconds, building in ((-120, "A"), (-60, "A"), (-30, "A"), (-1, "A"), (-30, "B")):
+        db["sensor_readings"].insert_one({"building": building, "floor": 1, "timestamp": (now + timedelta(seconds=seconds)).isoformat()})
+
+    # The server clock is 20 s ahead of the sensors; delays between readings use their own timestamps
+    alert = {"_id": "a1", "building": "A", "floor": 1, "detected_at": (now + timedelta(seconds=20)).isoformat()}
+    trace = tracer._record(alert, {**checkpoints(), "reading_at": (now - timedelta(seconds=1)).isoformat()})
+
+    assert trace["event_id"] == str(event_id)
+    assert trace["readings_since_event"] == 3
+    assert trace["sent_at"] is None and "fanout" not in trace["stages"]
+    stages = trace["stages"]
+    assert abs(stages["sensor_delay"] - 30) < 0.01
+    assert abs(stages["detection_delay"] - 59) < 0.01
+    assert abs(stages["prediction"] - 0.1) < 1e-6
+    assert abs(trace["time_to_detection"] - 89.8) < 0.1
+    assert db["detection_traces"].count_documents({"event_id": str(event_id)}) == 1
+
+
+def test_alert_without_running_event():
+    tracer, db = make_tracer()
+    ended = datetime.now(TZ) - timedelta(hours=1)
+    db["events"].insert_one({"type": "fire", "building": "A", "floor": 1, "start_time": ended.isoformat(), "duration": 60})
+
+    alert = {"_id": "a1", "building": "A", "floor": 1, "detected_at": datetime.now(TZ).isoformat()}
+    trace = tracer._record(alert, checkpoints())
+    assert trace["event_id"] is None and trace["time_to_detection"] is None
+    assert set(trace["stages"]) == {"ingest", "prediction", "alert_write"}
+
+
+def test_fanout_waits_for_websocket_send():
+    hub = AlertHub()
+    tracer, db = make_tracer(hub)
+    app = FastAPI()
+
+    @app.websocket("/ws/alerts")
+    async def alerts(websocket: WebSocket):
+        await serve_alerts(websocket, hub, None, None)
+
+    @app.post("/open")
+    async def open_alert():
+        alert = {"_id": "a1", "building": "A", "floor": 1, "type": "fire", "detected_at": datetime.now(TZ).isoformat()}
+        tracer.alert_opened(alert, hub.alert_opened(alert), checkpoints())
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/alerts") as websocket:
+            assert websocket.receive_json()["kind"] == "snapshot"
+            client.post("/open")
+            assert websocket.receive_json()["kind"] == "alert_opened"
+
+            deadline = time.monotonic() + 5
+            while not db["detection_traces"].count_documents({}) and time.monotonic() < deadline:
+                time.sleep(0.01)
+    trace = db["detection_traces"].find_one()
+    assert trace["sent_at"] is not None and trace["stages"]["fanout"] >= 0
+    assert not hub.delivery_waiters
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+
+import mongomock
+import pytest
+
+import export
+from export import EXPORT_FIELDS, export_stream, open_export_cursor
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    # Small chunks, so a few hundred readings span several chunks / record batches
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 100)
+    return mongomock.MongoClient().db.sensor_readings
+
+
+def add_readings(collection, count):
+    collection.insert_many([
+        {"sensorId": f"s{i}", "type": "Temperature", "vendorName": "v", "vendorEmail": "v@x.io", "description": "d",
+         "building": "A", "floor": 1, "temperature": 20.0 + i / 100, "timestamp": f"2025-08-06T10:{i // 60:02d}:{i % 60:02d}+03:00"}
+        for i in range(count)
+    ])
+
+
+def run(collection, fmt):
+    chunks = list(export_stream(open_export_cursor(collection, {"type": "Temperature"}), fmt))
+    assert all(isinstance(chunk, bytes) for chunk in chunks)
+    return chunks, b"".join(chunks)
+
+
+def test_ndjson(collection):
+    add_readings(collection, 250)
+    chunks, body = run(collection, "ndjson")
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in body.decode().splitlines()]
+    assert len(rows) == 250 and list(rows[0]) == EXPORT_FIELDS
+    assert [row["sensorId"] for row in rows[:2]] == ["s0", "s1"] and rows[-1]["humidity"] is None
+    assert run(collection.database.empty, "ndjson")[1] == b""
+
+
+def test_csv(collection):
+    add_readings(collection, 250)
+    chunks, body = run(collection, "csv")
+    assert len(chunks) == 3
+    rows = list(csv.DictReader(io.StringIO(body.decode())))
+    assert len(rows) == 250 and rows[-1]["sensorId"] == "s249" and rows[-1]["humidity"] == ""
+    # Header only
+    assert run(collection.database.empty, "csv")[1].decode().strip() == ",".join(EXPORT_FIELDS)
+
+
+def test_arrow(collection):
+    pa = pytest.importorskip("pyarrow")
+    add_readings(collection, 250)
+    _, body = run(collection, "arrow")
+    reader = pa.ipc.open_stream(body)
+    batches = list(reader)
+    assert [batch.num_rows for batch in batches] == [100, 100, 50]
+    table = pa.Table.from_batches(batches)
+    assert table.schema.names == EXPORT_FIELDS
+    assert table.column("temperature")[249].as_py() == pytest.approx(22.49) and table.column("floor")[0].as_py() == 1
+    # Schema and end-of-stream only
+    empty = pa.ipc.open_stream(run(collection.database.empty, "arrow")[1]).read_all()
+    assert empty.num_rows == 0 and empty.schema.names == EXPORT_FIELDS
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import struct
+import time
+
+import pytest
+from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from ingest_channel import serve_ingest
+
+
+def make_app(window):
+    app = FastAPI()
+    app.state.handled = []
+    app.state.started = 0
+    app.state.gate = None
+
+    async def handle(kind, payload):
+        app.state.started += 1
+        if app.state.gate is not None:
+            await app.state.gate.wait()
+        if kind == "reading" and payload.get("fail"):
+            raise HTTPException(status_code=422, detail="bad reading")
+        app.state.handled.append((kind, payload))
+
+    @app.websocket("/ws/ingest")
+    async def ingest(websocket: WebSocket):
+        await serve_ingest(websocket, handle, window)
+
+    # The gate lives on the app's event loop, so it is created and opened through endpoints
+    @app.post("/close-gate")
+    async def close_gate():
+        app.state.gate = asyncio.Event()
+
+    @app.post("/open-gate")
+    async def open_gate():
+        app.state.gate.set()
+
+    @app.get("/started")
+    async def started():
+        return app.state.started
+
+    return app
+
+
+def read_until_ack(ws, seq):
+    replies = []
+    while True:
+        reply = ws.receive_json()
+        replies.append(reply)
+        if reply["kind"] == "ack" and reply["seq"] >= seq:
+            return replies
+
+
+def test_cumulative_acks_and_nacks():
+    app = make_app(window=4)
+    with TestClient(app) as client, client.websocket_connect("/ws/ingest") as ws:
+        assert ws.receive_json() == {"kind": "hello", "window": 4}
+        for seq in range(1, 11):
+            reading = {"fail": True} if seq == 5 else {"value": seq}
+            ws.send_text(json.dumps({"seq": seq, "reading": reading}))
+        ws.send_bytes(struct.pack("<q", 11) + b"packed-records")
+        replies = read_until_ack(ws, 11)
+
+    nacks = [r for r in replies if r["kind"] == "nack"]
+    assert nacks == [{"kind": "nack", "seq": 5, "status": 422, "detail": "bad reading", "retry_after": None}]
+    # The nack arrives before any ack covering it, and acks never go backwards
+    acks = [r["seq"] for r in replies if r["kind"] == "ack"]
+    assert acks == sorted(acks)
+    assert replies.index(nacks[0]) < next(i for i, r in enumerate(replies) if r["kind"] == "ack" and r["seq"] >= 5)
+    assert len(app.state.handled) == 10
+    assert ("batch", b"packed-records") in app.state.handled
+
+
+def test_window_limits_messages_in_flight():
+    app = make_app(window=2)
+    with TestClient(app) as client, client.websocket_connect("/ws/ingest") as ws:
+        ws.receive_json()
+        client.post("/close-gate")
+        for seq in range(1, 7):
+            ws.send_text(json.dumps({"seq": seq, "compact": {"sensorId": "s", "value": seq}}))
+        time.sleep(0.2)
+        assert client.get("/started").json() == 2
+        client.post("/open-gate")
+        read_until_ack(ws, 6)
+    assert [payload["value"] for _, payload in app.state.handled] == [1, 2, 3, 4, 5, 6]
+
+
+def test_protocol_errors_close_the_channel():
+    app = make_app(window=4)
+    with TestClient(app) as client, client.websocket_connect("/ws/ingest") as ws:
+        ws.receive_json()
+        ws.send_text(json.dumps({"seq": 2, "reading": {}}))
+        ws.send_text(json.dumps({"seq": 1, "reading": {}}))
+        with pytest.raises(WebSocketDisconnect) as closed:
+            while True:
+                ws.receive_json()
+        assert closed.value.code == 1008
@@ -0,0 +1,51 @@
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.parser import text_string_to_metric_families
+
+from metrics import (
+    INGEST_STAGE_SECONDS, MODEL_BACKEND_PROBE_ACCURACY, MODEL_BACKEND_PROBE_LATENCY, ResponseCacheCollector, record_backend_selection,
+    render_metrics, stage_timer,
+)
+from response_cache import ResponseCache
+
+
+def samples(text: str) -> dict:
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+def test_stage_timer_and_backend_selection_are_exported():
+    with stage_timer("test_stage"):
+        pass
+    record_backend_selection({
+        "test_fast": {"accuracy": 0.99, "latency_ms": 0.5},
+        "test_down": {"error": "unreachable"},
+    })
+    content, content_type = render_metrics()
+    assert content_type.startswith("text/plain")
+    exported = samples(content.decode())
+    assert exported[("ingest_stage_seconds_count", (("stage", "test_stage"),))] == 1
+    assert exported[("model_backend_probe_latency_seconds", (("backend", "test_fast"),))] == 0.0005
+    assert exported[("model_backend_probe_accuracy", (("backend", "test_fast"),))] == 0.99
+    # A backend that failed its probe gets no samples
+    assert ("model_backend_probe_accuracy", (("backend", "test_down"),)) not in exported
+    for gauge in (MODEL_BACKEND_PROBE_ACCURACY, MODEL_BACKEND_PROBE_LATENCY):
+        gauge.remove("test_fast")
+    INGEST_STAGE_SECONDS.remove("test_stage")
+
+
+def test_response_cache_collector_reads_stats_at_scrape_time():
+    cache = ResponseCache()
+    registry = CollectorRegistry()
+    registry.register(ResponseCacheCollector(cache))
+    cache.put("a", b"{}", {"type": "Temperature"})
+    cache.get("a")
+    cache.get("b")
+    cache.invalidate(type="Temperature")
+    exported = samples(generate_latest(registry).decode())
+    assert exported[("response_cache_lookups_total", (("result", "hit"),))] == 1
+    assert exported[("response_cache_lookups_total", (("result", "miss"),))] == 1
+    assert exported[("response_cache_invalidations_total", ())] == 1
+    assert exported[("response_cache_entries", ())] == 0
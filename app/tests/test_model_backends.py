@@ -0,0 +1,48 @@
+import time
+
+import numpy as np
+import pytest
+
+from model_backends import ModelBackend, resolve_backend, select_backend
+
+
+class FakeBackend(ModelBackend):
+    # Answers correctly on the probe set (fire rows have temperature >= 55) unless told otherwise
+    def __init__(self, name, accurate=True, delay=0.0, fails=False):
+        self.name = name
+        self.accurate = accurate
+        self.delay = delay
+        self.fails = fails
+
+    def predict(self, features):
+        if self.fails:
+            raise ConnectionError("unreachable")
+        time.sleep(self.delay)
+        predictions = (np.asarray(features)[:, 0] >= 55).astype(np.int32)
+        return predictions if self.accurate else 1 - predictions
+
+
+def test_fastest_backend_meeting_both_targets_is_chosen():
+    backends = {
+        "slow": FakeBackend("slow", delay=0.005),
+        "fast": FakeBackend("fast"),
+        "wrong": FakeBackend("wrong", accurate=False),
+        "down": FakeBackend("down", fails=True),
+    }
+    chosen, report = select_backend(backends, min_accuracy=0.95, max_latency_ms=2, fallback="slow")
+    assert chosen == "fast"
+    assert report["fast"]["accuracy"] == 1.0 and report["wrong"]["accuracy"] == 0.0
+    assert report["slow"]["latency_ms"] >= 5
+    assert "unreachable" in report["down"]["error"]
+
+    # Only the slow one is accurate enough, but it misses the latency target
+    del backends["fast"]
+    assert select_backend(backends, min_accuracy=0.95, max_latency_ms=2, fallback="slow")[0] == "slow"
+    assert select_backend(backends, min_accuracy=0.95, max_latency_ms=50, fallback="down")[0] == "slow"
+
+
+def test_unloaded_backend_is_a_clear_error():
+    backends = {"rf_model": FakeBackend("rf_model")}
+    assert resolve_backend(backends, "rf_model", "MODEL_BACKEND") is backends["rf_model"]
+    with pytest.raises(ValueError, match="MODEL_BACKEND=tf_serving is not loaded; available: rf_model"):
+        resolve_backend(backends, "tf_serving", "MODEL_BACKEND")
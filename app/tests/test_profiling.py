@@ -0,0 +1,96 @@
+import marshal
+import pstats
+import time
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from profiling import MemoryTracer, Profiler, ProfilingMiddleware, check_admin
+
+
+def make_app(profiler):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+    @app.post("/start")
+    async def start(mode: str, seconds: float = None, route: str = None, requests: int = None):
+        return profiler.start(mode, seconds, route, requests, 0.001)
+
+    @app.get("/work/{n}")
+    async def work(n: int):
+        return sum(i * i for i in range(n))
+
+    @app.get("/other")
+    def other():
+        time.sleep(0.01)
+        return {}
+
+    return app
+
+
+def test_route_bound_cprofile_session():
+    profiler = Profiler()
+    with TestClient(make_app(profiler)) as client:
+        session = client.post("/start", params={"mode": "cprofile", "route": "/work/{n}", "requests": 2}).json()
+        assert profiler.route == "/work/{n}"
+        client.get("/other")
+        client.get("/work/1000")
+        assert profiler.session is not None
+        client.get("/work/1000")
+
+    # Stopped by the second matching request; the middleware is idle again
+    assert profiler.session is None and profiler.route is None
+    [summary] = profiler.sessions()
+    assert summary["id"] == session["id"] and summary["requests"] == 2 and summary["formats"] == ["pstats"]
+
+    content, media = profiler.download(session["id"], "pstats")
+    stats = pstats.Stats()
+    stats.stats = marshal.loads(content)
+    assert any(name == "work" for _, _, name in stats.stats)
+    with pytest.raises(HTTPException) as error:
+        profiler.download(session["id"], "collapsed")
+    assert error.value.status_code == 400
+
+
+def test_timed_sampling_session():
+    profiler = Profiler(max_seconds=0.2)
+    with TestClient(make_app(profiler)) as client:
+        session = client.post("/start", params={"mode": "sampling", "seconds": 60}).json()
+        assert session["seconds"] == 0.2
+        assert client.post("/start", params={"mode": "sampling", "seconds": 1}).status_code == 409
+        deadline = time.monotonic() + 5
+        while profiler.session and time.monotonic() < deadline:
+            client.get("/other")
+
+    content, media = profiler.download(session["id"], "collapsed")
+    lines = content.decode().splitlines()
+    assert lines and media.startswith("text/plain")
+    # "thread;root;...;leaf count", with the threadpool's sleep among the stacks
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("other (test_profiling.py" in line for line in lines)
+
+
+def test_admin_token():
+    request = Request({"type": "http", "headers": [(b"x-admin-token", b"secret")]})
+    check_admin(request, "secret")
+    for token, status in (("", 404), ("other", 403)):
+        with pytest.raises(HTTPException) as error:
+            check_admin(request, token)
+        assert error.value.status_code == status
+
+
+def test_tracemalloc_growth():
+    tracer = MemoryTracer()
+    tracer.start()
+    try:
+        tracer.snapshot()
+        retained = [bytearray(1024) for _ in range(1000)]
+        report = tracer.snapshot(limit=5)
+        assert report["compared_to"] is not None
+        top = report["top"][0]
+        assert "test_profiling.py" in top["location"] and top["size_diff"] >= 1024 * 1000
+    finally:
+        tracer.stop()
+    assert retained
@@ -0,0 +1,52 @@
+import asyncio
+
+import httpx
+import mongomock
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from db_connect import INDEXES, ensure_indexes
+from dispatcher import create_dispatcher
+from readiness import Readiness
+
+
+def test_indexes_created_only_when_missing():
+    db = mongomock.MongoClient()["test"]
+    created = ensure_indexes(db)
+    assert len(created) == sum(len(specs) for specs in INDEXES.values())
+    assert "sensor_readings.timestamp_1" in created
+    assert ensure_indexes(db) == []
+
+
+def test_ready_when_required_checks_are():
+    readiness = Readiness(required=("mongo", "models"))
+    assert not readiness.ready and readiness.report()["ready_after_s"] is None
+    readiness.set("mongo", True, "ok")
+    readiness.set("indexes", False, "building")     # reported, not required
+    assert not readiness.ready
+    readiness.set("models", True, "rf_model")
+    report = readiness.report()
+    assert report["ready"] and report["ready_after_s"] is not None
+    assert report["checks"]["indexes"] == {"ready": False, "detail": "building"}
+
+
+def test_dispatcher_ready_when_all_workers_are():
+    def fake_worker(ready):
+        worker = FastAPI()
+
+        @worker.get("/readyz")
+        def readyz():
+            return JSONResponse({"ready": ready}, status_code=200 if ready else 503)
+
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=worker), base_url="http://worker")
+
+    async def run(states):
+        dispatcher = create_dispatcher([fake_worker(state) for state in states])
+        transport = httpx.ASGITransport(app=dispatcher)
+        async with httpx.AsyncClient(transport=transport, base_url="http://dispatcher") as client:
+            assert (await client.get("/healthz")).status_code == 200
+            return await client.get("/readyz")
+
+    response = asyncio.run(run([True, False]))
+    assert response.status_code == 503 and [w["ready"] for w in response.json()["workers"]] == [True, False]
+    assert asyncio.run(run([True, True])).status_code == 200
@@ -0,0 +1,93 @@
+import time
+from fastapi import Request
+
+from response_cache import ResponseCache, cached_json
+
+
+def test_make_key_ignores_unset_params_and_order():
+    key_a = ResponseCache.make_key("/sensor-data/", {"type": "Temperature", "building": None, "page": 1})
+    key_b = ResponseCache.make_key("/sensor-data/", {"page": 1, "type": "Temperature"})
+    assert key_a == key_b
+
+
+def test_invalidate_only_drops_overlapping_scopes():
+    cache = ResponseCache()
+    cache.put("all", b"{}", {"type": None, "building": None, "floor": None})
+    cache.put("temp-A", b"{}", {"type": "Temperature", "building": "A", "floor": None})
+    cache.put("temp-B", b"{}", {"type": "Temperature", "building": "B", "floor": None})
+    cache.put("humidity", b"{}", {"type": "Humidity"})
+    cache.put("events", b"{}", {"events": None})
+
+    cache.invalidate(type="Temperature", building="A", floor=1)
+
+    assert cache.get("all") is None
+    assert cache.get("temp-A") is None
+    assert cache.get("temp-B") is not None
+    assert cache.get("humidity") is not None
+    assert cache.get("events") is not None
+
+
+def test_lru_eviction_and_ttl():
+    cache = ResponseCache(max_entries=2, ttl_seconds=0.05)
+    cache.put("a", b"1", {})
+    cache.put("b", b"2", {})
+    cache.get("a")
+    cache.put("c", b"3", {})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_put_skipped_only_when_own_scope_changed_during_compute():
+    cache = ResponseCache()
+    temperature = cache.begin({"type": "Temperature"})
+    humidity = cache.begin({"type": "Humidity"})
+    cache.invalidate(type="Temperature", building="A", floor=1)
+    cache.put("temperature", b"{}", {"type": "Temperature"}, pending=temperature)
+    cache.put("humidity", b"{}", {"type": "Humidity"}, pending=humidity)
+    assert cache.get("temperature") is None
+    assert cache.get("humidity") is not None
+    assert cache._pending == set()
+
+
+def test_ingest_during_compute_only_discards_overlapping_results():
+    cache = ResponseCache()
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+
+    def compute_while_ingesting(changed):
+        def compute():
+            cache.invalidate(**changed)
+            return {"ok": True}
+        return compute
+
+    scope = {"type": "Humidity", "building": None, "floor": None}
+    response = cached_json(cache, request, "/sensor-data/", {"type": "Humidity"}, scope,
+                           compute_while_ingesting({"type": "Temperature", "building": "A", "floor": 1}))
+    assert response.headers["X-Cache"] == "MISS"
+    assert cache.get(cache.make_key("/sensor-data/", {"type": "Humidity"})) is not None
+
+    response = cached_json(cache, request, "/sensor-data/", {"type": "Temperature"}, {**scope, "type": "Temperature"},
+                           compute_while_ingesting({"type": "Temperature", "building": "B", "floor": 2}))
+    assert cache.get(cache.make_key("/sensor-data/", {"type": "Temperature"})) is None
+
+
+def test_bypass_computes_every_time_but_still_answers_304():
+    cache = ResponseCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"ok": True}
+
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+    first = cached_json(cache, request, "/sensor-data/stats/Humidity", {}, {"type": "Humidity"}, compute, store=False)
+    assert first.headers["X-Cache"] == "BYPASS"
+    assert cache.stats()["entries"] == 0
+
+    conditional = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                           "headers": [(b"if-none-match", first.headers["ETag"].encode())]})
+    response = cached_json(cache, conditional, "/sensor-data/stats/Humidity", {}, {"type": "Humidity"}, compute, store=False)
+    assert response.status_code == 304
+    assert len(calls) == 2
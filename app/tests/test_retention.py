@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+
+import mongomock
+
+from retention import RetentionManager
+
+
+def make_manager(db, raw_days=30, hourly_days=365):
+    return RetentionManager(
+        db.sensor_readings, db.sensor_readings_hourly, db.sensor_readings_daily, db.retention_state,
+        raw_days=raw_days, hourly_days=hourly_days, daily_days=0
+    )
+
+
+def add_reading(db, moment, value, with_ts=True):
+    doc = {"type": "Temperature", "building": "A", "floor": 1, "temperature": value,
+           "timestamp": (moment + timedelta(hours=3)).isoformat() + "+03:00"}
+    if with_ts:
+        doc["ts"] = moment
+    db.sensor_readings.insert_one(doc)
+
+
+def test_rollups_are_idempotent_and_feed_the_daily_tier():
+    db = mongomock.MongoClient().db
+    manager = make_manager(db)
+    day = datetime(2025, 8, 6)
+    for hour in range(24):
+        add_reading(db, day + timedelta(hours=hour, minutes=10), 20 + hour)
+        add_reading(db, day + timedelta(hours=hour, minutes=40), 22 + hour)
+    # Stored before the ts field existed
+    add_reading(db, day + timedelta(minutes=20), 21, with_ts=False)
+
+    result = manager.run_once(now=day + timedelta(days=1, minutes=5))
+    assert result == {"backfilled": 1, "hourly_buckets": 24, "daily_buckets": 1, "expired": {"raw": 0, "hourly": 0}}
+    first = db.sensor_readings_hourly.find_one({"bucket": day})
+    assert (first["count"], first["sum"], first["min"], first["max"]) == (3, 63, 20, 22)
+
+    # Nothing new to do; rebuilding from scratch gives the same rows
+    assert manager.run_once(now=day + timedelta(days=1, minutes=5))["hourly_buckets"] == 0
+    db.retention_state.delete_many({})
+    manager.run_once(now=day + timedelta(days=1, minutes=5))
+    assert db.sensor_readings_hourly.count_documents({}) == 24
+    daily = db.sensor_readings_daily.find_one({})
+    assert (daily["count"], daily["min"], daily["max"]) == (49, 20, 45)
+
+    results, total = manager.find_buckets("hourly", {"type": "Temperature"}, day, day + timedelta(hours=2), 0, 10)
+    assert total == 2
+    assert results[0]["temperature"] == 21.0 and results[0]["resolution"] == "hourly"
+
+
+def test_unfinished_hour_is_not_rolled_up():
+    db = mongomock.MongoClient().db
+    manager = make_manager(db)
+    add_reading(db, datetime(2025, 8, 6, 10, 15), 20)
+    assert manager.run_once(now=datetime(2025, 8, 6, 10, 50))["hourly_buckets"] == 0
+    assert manager.run_once(now=datetime(2025, 8, 6, 11, 0))["hourly_buckets"] == 1
+
+
+def test_legacy_history_is_rolled_up_before_it_expires():
+    db = mongomock.MongoClient().db
+    manager = RetentionManager(
+        db.sensor_readings, db.sensor_readings_hourly, db.sensor_readings_daily, db.retention_state,
+        raw_days=30, hourly_days=365, daily_days=0, max_buckets=24, backfill_batch=50
+    )
+    manager.ensure_indexes()
+    now = datetime(2025, 8, 6)
+    start = now - timedelta(days=40)
+    # Three days of readings from before ts existed, all older than the raw retention window
+    for hour in range(72):
+        add_reading(db, start + timedelta(hours=hour, minutes=30), hour, with_ts=False)
+
+    runs = 0
+    while True:
+        result = manager.run_once(now=now)
+        runs += 1
+        if not manager.catching_up(result):
+            break
+    assert runs > 3
+    assert db.sensor_readings_hourly.count_documents({}) == 72
+    daily = list(db.sensor_readings_daily.find({}).sort("bucket", 1))
+    assert [d["count"] for d in daily] == [24, 24, 24]
+    # Rolled up and past retention: the raw readings are gone, the rollups are not
+    assert db.sensor_readings.count_documents({}) == 0
+
+
+def test_late_reading_is_counted_and_recent_readings_kept():
+    db = mongomock.MongoClient().db
+    manager = make_manager(db, raw_days=1)
+    day = datetime(2025, 8, 6)
+    add_reading(db, day + timedelta(hours=10, minutes=15), 20)
+    manager.run_once(now=day + timedelta(hours=11, minutes=5))
+    # Arrives after hour 10 was rolled up
+    add_reading(db, day + timedelta(hours=10, minutes=50), 30)
+    manager.run_once(now=day + timedelta(hours=11, minutes=10))
+    bucket = db.sensor_readings_hourly.find_one({"bucket": day + timedelta(hours=10)})
+    assert (bucket["count"], bucket["max"]) == (2, 30)
+    # Within the raw window: nothing is deleted
+    assert db.sensor_readings.count_documents({}) == 2
+
+
+def test_choose_tier():
+    manager = make_manager(mongomock.MongoClient().db, raw_days=30, hourly_days=365)
+    now = datetime(2025, 8, 6)
+    assert manager.choose_tier(None, None, now) == "raw"
+    assert manager.choose_tier(now - timedelta(days=1), None, now) == "raw"
+    assert manager.choose_tier(now - timedelta(days=10), None, now) == "hourly"
+    assert manager.choose_tier(now - timedelta(days=40), now - timedelta(days=39), now) == "hourly"
+    assert manager.choose_tier(now - timedelta(days=200), None, now) == "daily"
+
+
+def test_buckets_after_the_watermark_come_from_raw_readings():
+    db = mongomock.MongoClient().db
+    manager = make_manager(db)
+    day = datetime(2025, 8, 6)
+    for hour in range(30):
+        add_reading(db, day + timedelta(hours=hour, minutes=10), hour)
+    manager.run_once(now=day + timedelta(hours=20))
+    assert db.sensor_readings_hourly.count_documents({}) == 20
+
+    # 20 stored hours, then the 10 the job has not reached, the current one included
+    results, total = manager.find_buckets("hourly", {"type": "Temperature"}, day, None, 0, 100)
+    assert total == 30 and [r["temperature"] for r in results] == list(range(30))
+    assert [r["_id"] is None for r in results] == [False] * 20 + [True] * 10
+    # Pages run across both
+    results, total = manager.find_buckets("hourly", {"type": "Temperature"}, day, None, 18, 4)
+    assert [r["temperature"] for r in results] == [18, 19, 20, 21]
+
+    # The second day has no daily row yet; it is built from the hourly rows and the raw readings
+    results, total = manager.find_buckets("daily", {"type": "Temperature"}, day, None, 0, 10)
+    assert total == 2
+    assert [(r["timestamp"][:10], r["count"], r["min"], r["max"]) for r in results] == [
+        ("2025-08-06", 24, 0, 23), ("2025-08-07", 6, 24, 29)
+    ]
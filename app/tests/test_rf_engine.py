@@ -0,0 +1,54 @@
+import os
+import joblib
+import numpy as np
+import pytest
+from rf_engine import CompiledForest
+
+RF_MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "ML", "models", "rf_model.pkl")
+
+
+@pytest.fixture(scope="module")
+def rf_model():
+    return joblib.load(RF_MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def compiled(rf_model):
+    return CompiledForest.from_sklearn(rf_model)
+
+
+def test_matches_sklearn_on_random_rows(rf_model, compiled):
+    rng = np.random.default_rng(0)
+    # Simulator ranges plus a margin outside them, at the 0.1 resolution the simulators send
+    X = np.round(np.column_stack([
+        rng.uniform(10, 90, 5000),
+        rng.uniform(0, 100, 5000),
+        rng.uniform(20, 100, 5000),
+    ]), 1)
+
+    assert np.array_equal(compiled.predict_proba(X), rf_model.predict_proba(X))
+    assert np.array_equal(compiled.predict(X), rf_model.predict(X))
+
+
+def test_matches_sklearn_on_split_thresholds(rf_model, compiled):
+    # Rows sitting exactly on (and just around) split thresholds exercise the <= comparison
+    tree = rf_model.estimators_[0].tree_
+    split_nodes = np.flatnonzero(tree.children_left != -1)[:200]
+    base = np.array([22.5, 60.0, 55.0])
+    rows = []
+    for node in split_nodes:
+        for value in (np.float32(tree.threshold[node]), np.nextafter(np.float32(tree.threshold[node]), np.float32(np.inf))):
+            row = base.copy()
+            row[tree.feature[node]] = value
+            rows.append(row)
+    X = np.array(rows)
+
+    assert np.array_equal(compiled.predict_proba(X), rf_model.predict_proba(X))
+    assert np.array_equal(compiled.predict(X), rf_model.predict(X))
+
+
+def test_single_row(rf_model, compiled):
+    fire = [[70.0, 15.0, 90.0]]
+    normal = [[22.5, 60.0, 55.0]]
+    assert compiled.predict(fire)[0] == rf_model.predict(fire)[0] == 1
+    assert compiled.predict(normal)[0] == rf_model.predict(normal)[0] == 0
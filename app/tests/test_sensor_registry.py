@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import mongomock
+from fastapi import FastAPI, HTTPException, Request
+
+from dispatcher import create_dispatcher
+from location_state import shard_for
+from sensor_registry import SensorRegistry
+
+METADATA = {
+    "type": "Temperature", "vendorName": "ACME Corp", "vendorEmail": "support@acmecorp.com",
+    "description": "Simulated temperature sensor", "building": "A", "floor": 1,
+}
+
+
+def test_registration_is_idempotent_and_cached():
+    db = mongomock.MongoClient().db
+    registry = SensorRegistry(db.sensors)
+    first = registry.register(METADATA)
+    again = registry.register({**METADATA, "description": "Replaced unit", "vendorEmail": "SUPPORT@acmecorp.com"})
+    assert first["sensorId"] == again["sensorId"]
+    assert db.sensors.count_documents({}) == 1
+    assert registry.register({**METADATA, "floor": 2})["sensorId"] != first["sensorId"]
+
+    # Another process loads the sensor from MongoDB once, then serves it from memory
+    other = SensorRegistry(db.sensors)
+    assert other.cached(first["sensorId"]) is None
+    assert other.load(first["sensorId"])["description"] == "Replaced unit"
+    db.sensors.delete_many({})
+    assert other.load(first["sensorId"])["building"] == "A"
+    assert other.load("unknown") is None
+
+
+def test_unknown_ids_are_remembered_until_registered():
+    db = mongomock.MongoClient().db
+    registry = SensorRegistry(db.sensors)
+    other = SensorRegistry(db.sensors, unknown_ttl=60)
+    sensor_id = registry.register(METADATA)["sensorId"]
+    db.sensors.delete_many({})
+
+    assert other.load(sensor_id) is None and other.known_missing(sensor_id)
+    # Registered meanwhile by another process: still answered as unknown until the TTL ends
+    registry.register(METADATA)
+    assert other.load(sensor_id) is None
+    other.unknown[sensor_id] = 0
+    assert other.load(sensor_id)["building"] == "A"
+    # Registering through this registry clears the entry at once
+    registry.unknown[sensor_id] = float("inf")
+    registry.register(METADATA)
+    assert not registry.known_missing(sensor_id)
+
+
+def test_dispatcher_routes_compact_readings_by_sensor_location():
+    db = mongomock.MongoClient().db
+    registry = SensorRegistry(db.sensors)
+    sensors = {(b, f): registry.register({**METADATA, "building": b, "floor": f})["sensorId"] for b in "AB" for f in (1, 2)}
+    lookups = []
+
+    def fake_worker(index):
+        worker = FastAPI()
+
+        @worker.get("/sensors/{sensor_id}")
+        def get_sensor(sensor_id: str):
+            lookups.append(sensor_id)
+            sensor = registry.load(sensor_id)
+            if sensor is None:
+                raise HTTPException(status_code=404)
+            return {"sensorId": sensor_id, **sensor}
+
+        @worker.post("/sensor-data/compact")
+        async def ingest(request: Request):
+            return {"worker": index}
+
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=worker), base_url="http://worker")
+
+    async def run():
+        dispatcher = create_dispatcher([fake_worker(i) for i in range(3)])
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=dispatcher), base_url="http://dispatcher") as client:
+            for _ in range(2):
+                for (building, floor), sensor_id in sensors.items():
+                    response = await client.post("/sensor-data/compact", json={"sensorId": sensor_id, "value": 21.5})
+                    assert response.json()["worker"] == shard_for(building, floor, 3)
+            for _ in range(3):
+                response = await client.post("/sensor-data/compact", json={"sensorId": "unknown", "value": 1})
+                assert response.json()["worker"] == 0
+
+    asyncio.run(run())
+    # One registry lookup per sensor, the rest are answered from the dispatcher's cache; unknown IDs too
+    assert sorted(lookups) == sorted(list(sensors.values()) + ["unknown"])
@@ -0,0 +1,41 @@
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from series_hub import SeriesHub, parse_series, serve_series
+
+
+def reading(sensor_type, building, floor, value):
+    field = {"Temperature": "temperature", "Humidity": "humidity", "Acoustic": "soundLevel"}[sensor_type]
+    return {"type": sensor_type, "building": building, "floor": floor, field: value}
+
+
+def test_parse_series():
+    assert parse_series("Temperature:A:1,Humidity:B:02,Temperature:A:1") == ["Temperature:A:1", "Humidity:B:2"]
+    for bad in ("", "Smoke:A:1", "Temperature:A", "Temperature:A:x"):
+        with pytest.raises(ValueError):
+            parse_series(bad)
+
+
+def test_points_coalesced_per_frame_for_subscribers_only():
+    hub = SeriesHub(frame_seconds=0.05)
+    app = FastAPI()
+
+    @app.post("/publish")
+    async def publish():
+        hub.publish(reading("Temperature", "A", 1, 21.5), 1000)
+        hub.publish(reading("Temperature", "A", 1, 21.7), 2000)
+        hub.publish(reading("Humidity", "A", 1, 40.0), 1500)      # not subscribed by anyone
+
+    @app.websocket("/ws/series")
+    async def series_websocket(websocket: WebSocket, series: str = ""):
+        await serve_series(websocket, hub, series)
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/series?series=Temperature:A:1,Acoustic:B:2") as ws:
+            subscribed = ws.receive_json()
+            assert subscribed["series"] == ["Temperature:A:1", "Acoustic:B:2"] and subscribed["frame_ms"] == 50
+            client.post("/publish")
+            frame = ws.receive_json()
+            assert frame == {"kind": "points", "series": {"Temperature:A:1": {"t": [1000, 2000], "v": [21.5, 21.7]}}}
+        assert hub.subscribers == {} and hub.pending == {}
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import mongomock
+from fastapi import FastAPI, Request
+
+from dispatcher import create_dispatcher, route_shard
+from location_state import MemoryLocationStore, MongoLocationStore, shard_for
+
+LOCATIONS = [(building, floor) for building in "ABC" for floor in range(1, 5)]
+
+
+def test_route_shard_follows_location_owner():
+    for building, floor in LOCATIONS:
+        owner = shard_for(building, floor, 4)
+        body = json.dumps({"building": building, "floor": floor, "type": "Temperature"}).encode()
+        assert route_shard("POST", "/sensor-data/", "", body, 4) == owner
+        assert route_shard("GET", f"/fire-status/{building}/{floor}", "", b"", 4) == owner
+        assert route_shard("GET", "/sensor-data/", f"building={building}&floor={floor}", b"", 4) == owner
+
+    # Invalid bodies and unscoped requests go to worker 0
+    assert route_shard("POST", "/sensor-data/", "", b"not json", 4) == 0
+    assert route_shard("GET", "/sensor-data/", "type=Temperature", b"", 4) == 0
+    assert route_shard("GET", "/events/active", "", b"", 4) == 0
+
+
+def test_dispatcher_forwards_to_owner():
+    def fake_worker(index):
+        worker = FastAPI()
+
+        @worker.post("/sensor-data/")
+        async def ingest(request: Request):
+            return {"worker": index, "reading": await request.json()}
+
+        @worker.get("/metrics")
+        def metrics():
+            return {"worker": index}
+
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=worker), base_url="http://worker")
+
+    async def run():
+        dispatcher = create_dispatcher([fake_worker(0), fake_worker(1), fake_worker(2)])
+        transport = httpx.ASGITransport(app=dispatcher)
+        async with httpx.AsyncClient(transport=transport, base_url="http://dispatcher") as client:
+            for building, floor in LOCATIONS:
+                response = await client.post("/sensor-data/", json={"building": building, "floor": floor})
+                assert response.json()["worker"] == shard_for(building, floor, 3)
+                assert response.json()["reading"] == {"building": building, "floor": floor}
+            assert (await client.get("/shards/2/metrics")).json() == {"worker": 2}
+            assert (await client.get("/shards/3/metrics")).status_code == 404
+
+    asyncio.run(run())
+
+
+def test_memory_store_matches_mongo_store():
+    db = mongomock.MongoClient()["test"]
+    now = datetime.now()
+    readings = [
+        {"building": "A", "floor": 1, "type": "Temperature", "temperature": 70.0, "timestamp": (now - timedelta(seconds=90)).isoformat()},
+        {"building": "A", "floor": 1, "type": "Humidity", "humidity": 15.0, "timestamp": (now - timedelta(seconds=20)).isoformat()},
+        {"building": "A", "floor": 1, "type": "Acoustic", "soundLevel": 90.0, "timestamp": (now - timedelta(seconds=10)).isoformat()},
+    ]
+    db.readings.insert_many([dict(r) for r in readings])
+    mongo_store = MongoLocationStore(db.readings, db.alerts)
+    memory_store = MemoryLocationStore(db.readings, db.alerts)
+    window_start = (now - timedelta(minutes=1)).isoformat()
+
+    # The temperature reading is outside the window
+    assert mongo_store.recent_features("A", 1, window_start) is None
+    assert memory_store.recent_features("A", 1, window_start) is None
+
+    reading = {"building": "A", "floor": 1, "type": "Temperature", "temperature": 71.0, "timestamp": now.isoformat()}
+    db.readings.insert_one(dict(reading))
+    memory_store.record_reading(reading)
+    assert mongo_store.recent_features("A", 1, window_start) == [71.0, 15.0, 90.0]
+    assert memory_store.recent_features("A", 1, window_start) == [71.0, 15.0, 90.0]
+
+    # Alerts are tracked without further queries once the location is loaded
+    db.alerts.insert_one({"building": "A", "floor": 1, "type": "fire"})
+    assert memory_store.open_alert("A", 1) is None
+    memory_store.alert_opened({"building": "A", "floor": 1, "type": "fire"})
+    assert memory_store.open_alert("A", 1) is not None
+    memory_store.alert_closed("A", 1)
+    assert memory_store.open_alert("A", 1) is None
+
+
+def test_memory_store_loads_off_the_ingest_path_and_keeps_the_newest_reading():
+    db = mongomock.MongoClient()["test"]
+    now = datetime.now()
+    store = MemoryLocationStore(db.readings, db.alerts)
+    newer = {"building": "A", "floor": 1, "type": "Temperature", "temperature": 22.0, "timestamp": now.isoformat()}
+    db.readings.insert_one(dict(newer))
+
+    # Recording a reading never loads a location (the load would query MongoDB on the event loop)
+    store.record_reading(newer)
+    assert not store.loaded("A", 1)
+    store.load("A", 1)
+    assert store.locations[("A", 1)].latest["Temperature"] == (now.isoformat(), 22.0)
+
+    # A late, older reading does not replace the newer one
+    older = {**newer, "temperature": 80.0, "timestamp": (now - timedelta(seconds=30)).isoformat()}
+    store.record_reading(older)
+    assert store.locations[("A", 1)].latest["Temperature"] == (now.isoformat(), 22.0)
@@ -0,0 +1,105 @@
+import asyncio
+
+import httpx
+import msgpack
+import numpy as np
+from fastapi import FastAPI, Request
+
+from dispatcher import create_dispatcher, route_shard, split_batch
+from location_state import shard_for
+from wire_format import (
+    BATCH_MEDIA_TYPE, RECORD_DTYPE, decode_batch, decode_body, encode_batch, location_id, location_of, validate_batch
+)
+
+
+def test_batch_round_trip_without_copying():
+    body = encode_batch([("A", 1, "Temperature", 22.5, 1754478000000), ("C", 4, "Acoustic", 90.0, 0)])
+    assert RECORD_DTYPE.itemsize == 17 and len(body) == 34
+    records = decode_batch(body)
+    assert not records.flags.owndata
+    assert [location_of(location) for location in records["location"]] == [("A", 1), ("C", 4)]
+    assert records["type"].tolist() == [0, 2]
+    assert records["value"].tolist() == [22.5, 90.0]
+    assert validate_batch(records) == []
+
+
+def test_invalid_batches():
+    try:
+        decode_batch(b"\x00" * 20)
+        assert False, "partial record accepted"
+    except ValueError:
+        pass
+    records = np.zeros(4, dtype=RECORD_DTYPE)
+    records["location"] = location_id("A", 1)
+    records["type"][1] = 7
+    records["value"][2] = np.nan
+    records["location"][3] = 30 << 16
+    assert validate_batch(records) == [1, 2, 3]
+
+
+def test_msgpack_bodies_are_routed_like_json():
+    reading = {"building": "B", "floor": 3, "type": "Humidity", "humidity": 40.0}
+    assert decode_body(msgpack.packb(reading), "application/msgpack; charset=binary") == reading
+    owner = shard_for("B", 3, 4)
+    assert route_shard("POST", "/sensor-data/", "", msgpack.packb(reading), 4, "application/msgpack") == owner
+
+
+def test_dispatcher_splits_batches_by_owner():
+    readings = [(b, f, "Temperature", 20.0 + f, 0) for b in "ABC" for f in range(1, 5)]
+    body = encode_batch(readings)
+    parts = split_batch(body, 3)
+    assert sum(len(part) for part in parts.values()) == len(body)
+    for shard, part in parts.items():
+        assert all(shard_for(*location_of(loc), 3) == shard for loc in decode_batch(part)["location"])
+    # Invalid batches are not split, so worker 0 reports positions in the original batch
+    assert split_batch(body[:-1], 3) == {}
+
+    received = {}
+
+    def fake_worker(index):
+        worker = FastAPI()
+
+        @worker.post("/sensor-data/batch")
+        async def ingest(request: Request):
+            received[index] = len(decode_batch(await request.body()))
+            return {"message": "Data saved", "count": received[index]}
+
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=worker), base_url="http://worker")
+
+    async def run():
+        dispatcher = create_dispatcher([fake_worker(i) for i in range(3)])
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=dispatcher), base_url="http://dispatcher") as client:
+            response = await client.post("/sensor-data/batch", content=body, headers={"content-type": BATCH_MEDIA_TYPE})
+            assert response.json() == {"message": "Data saved", "count": len(readings)}
+
+    asyncio.run(run())
+    assert received == {shard: len(part) // RECORD_DTYPE.itemsize for shard, part in parts.items()}
+
+
+def test_dispatcher_reports_unsaved_records_at_batch_positions():
+    readings = [(b, f, "Temperature", 20.0 + f, 0) for b in "ABC" for f in range(1, 5)]
+    body = encode_batch(readings)
+    parts = split_batch(body, 3, positions=True)
+
+    def fake_worker():
+        worker = FastAPI()
+
+        @worker.post("/sensor-data/batch")
+        async def ingest(request: Request):
+            # The share's first reading hit a write error
+            count = len(decode_batch(await request.body()))
+            return {"message": "Partially saved", "count": count - 1, "failed": [0]}
+
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=worker), base_url="http://worker")
+
+    async def run():
+        dispatcher = create_dispatcher([fake_worker() for _ in range(3)])
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=dispatcher), base_url="http://dispatcher") as client:
+            response = await client.post("/sensor-data/batch", content=body, headers={"content-type": BATCH_MEDIA_TYPE})
+            return response.json()
+
+    answer = asyncio.run(run())
+    assert answer["count"] == len(readings) - len(parts)
+    assert answer["failed"] == sorted(int(positions[0]) for _, positions in parts.values())
+    for part, positions in parts.values():
+        assert (decode_batch(part)["location"] == decode_batch(body)["location"][positions]).all()
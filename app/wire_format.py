@@ -0,0 +1,81 @@
+import json
+import string
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:     # MessagePack bodies are optional
+    msgpack = None
+
+MSGPACK_AVAILABLE = msgpack is not None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+BATCH_MEDIA_TYPE = "application/x-sensor-batch"
+
+# Binary batch: packed little-endian records, no padding (17 bytes each).
+#   location   uint32   location_id(building, floor)
+#   type       uint8    index into SENSOR_TYPES
+#   value      float32
+#   timestamp  int64    milliseconds since the Unix epoch (UTC); 0 = time received
+RECORD_DTYPE = np.dtype([("location", "<u4"), ("type", "u1"), ("value", "<f4"), ("timestamp", "<i8")])
+SENSOR_TYPES = ("Temperature", "Humidity", "Acoustic")
+
+BUILDINGS = string.ascii_uppercase
+
+
+def media_type(content_type) -> str:
+    """Bare media type of a Content-Type header; JSON when there is none."""
+    if not content_type:
+        return JSON_MEDIA_TYPE
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def location_id(building: str, floor: int) -> int:
+    # Building letter in the high bits, floor in the low 16
+    return (BUILDINGS.index(building) << 16) | int(floor)
+
+
+def location_of(location: int):
+    building, floor = divmod(int(location), 1 << 16)
+    return BUILDINGS[building], floor
+
+
+def decode_body(body: bytes, content_type):
+    """JSON or MessagePack body as Python objects; ValueError if it cannot be decoded."""
+    kind = media_type(content_type)
+    if kind in MSGPACK_MEDIA_TYPES:
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid MessagePack body ({type(e).__name__})")
+    return json.loads(body)
+
+
+def decode_batch(body: bytes) -> np.ndarray:
+    """Records of a binary batch, as a read-only view over ``body`` (nothing is copied)."""
+    if len(body) % RECORD_DTYPE.itemsize:
+        raise ValueError(f"Batch length {len(body)} is not a multiple of the {RECORD_DTYPE.itemsize}-byte record")
+    return np.frombuffer(body, dtype=RECORD_DTYPE)
+
+
+def validate_batch(records: np.ndarray) -> list:
+    """Positions of records with an unknown type or location, or a non-finite value."""
+    buildings = records["location"] >> 16
+    invalid = (
+        (records["type"] >= len(SENSOR_TYPES))
+        | (buildings >= len(BUILDINGS))
+        | ~np.isfinite(records["value"])
+        | (records["timestamp"] < 0)
+    )
+    return np.flatnonzero(invalid).tolist()
+
+
+def encode_batch(readings) -> bytes:
+    """Pack (building, floor, type, value, timestamp_ms) tuples; used by clients and the benchmarks."""
+    records = np.array(
+        [(location_id(b, f), SENSOR_TYPES.index(t), v, ts) for b, f, t, v, ts in readings],
+        dtype=RECORD_DTYPE
+    )
+    return records.tobytes()
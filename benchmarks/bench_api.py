@@ -0,0 +1,281 @@
+"""End-to-end API benchmark.
+
+Measures throughput and p50/p95/p99 latency of the ingest and read endpoints, and the
+time from a fire reading being posted to the alert arriving on /ws/alerts, for several
+dataset sizes and concurrency levels.
+
+    python benchmarks/bench_api.py --sizes 1000,10000 --concurrency 1,8,32
+    python benchmarks/bench_api.py --compare benchmarks/results/bench_api_<previous>.json
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import httpx
+from fastapi.testclient import TestClient
+
+from harness import load_app, percentiles, print_results, wait_ready, wait_ready_async, write_results
+
+local_tz = ZoneInfo("Europe/Athens")
+
+BUILDINGS = ["A", "B", "C"]
+FLOORS = [1, 2, 3, 4]
+SENSOR_FIELDS = {"Temperature": "temperature", "Humidity": "humidity", "Acoustic": "soundLevel"}
+NORMAL_VALUES = {"Temperature": (22.5, 2.0), "Humidity": (60.0, 10.0), "Acoustic": (55.0, 10.0)}
+FIRE_VALUES = {"Temperature": 70.0, "Humidity": 15.0, "Acoustic": 90.0}
+
+
+def make_reading(sensor_type, building, floor, value):
+    reading = {
+        "sensorId": f"bench-{sensor_type}-{building}-{floor}",
+        "type": sensor_type,
+        "vendorName": "Bench Corp",
+        "vendorEmail": "bench@example.com",
+        "description": "Benchmark sensor",
+        "building": building,
+        "floor": floor,
+        "temperature": None,
+        "humidity": None,
+        "soundLevel": None,
+    }
+    reading[SENSOR_FIELDS[sensor_type]] = value
+    return reading
+
+
+def normal_reading(rng):
+    sensor_type = rng.choice(list(SENSOR_FIELDS))
+    mean, std = NORMAL_VALUES[sensor_type]
+    return make_reading(sensor_type, rng.choice(BUILDINGS), rng.choice(FLOORS), round(rng.gauss(mean, std), 1))
+
+
+def seed_dataset(db, size, rng):
+    # Spread historic readings over the last week, in insert_many batches
+    db.sensor_readings_collection.delete_many({})
+    db.alerts_collection.delete_many({})
+    db.events_collection.delete_many({})
+    now = datetime.now(local_tz)
+    batch = []
+    for i in range(size):
+        doc = normal_reading(rng)
+        moment = now - timedelta(seconds=rng.uniform(120, 7 * 24 * 3600))
+        doc["timestamp"] = moment.isoformat()
+        doc["ts"] = moment
+        batch.append(doc)
+        if len(batch) == 5000:
+            db.sensor_readings_collection.insert_many(batch)
+            batch = []
+    if batch:
+        db.sensor_readings_collection.insert_many(batch)
+
+
+async def run_load(client, make_request, total, concurrency):
+    latencies = []
+    errors = 0
+    cache_statuses = []
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, url, kwargs = make_request(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400 and response.status_code != 404:
+                errors += 1
+            if "x-cache" in response.headers:
+                cache_statuses.append(response.headers["x-cache"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start
+    result = {
+        "requests": total,
+        "errors": errors,
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(total / duration, 2),
+        **percentiles(latencies),
+    }
+    # Cached read endpoints say whether they were served from the response cache
+    if cache_statuses:
+        result["cache_hit_ratio"] = round(cache_statuses.count("HIT") / len(cache_statuses), 4)
+    return result
+
+
+async def register_sensors(client):
+    # One registered sensor per type and location, for the compact reading scenario
+    sensor_ids = {}
+    for sensor_type in SENSOR_FIELDS:
+        for building in BUILDINGS:
+            for floor in FLOORS:
+                reading = make_reading(sensor_type, building, floor, None)
+                metadata = {k: reading[k] for k in ("type", "vendorName", "vendorEmail", "description", "building", "floor")}
+                response = await client.post("/sensors/", json=metadata)
+                sensor_ids[(sensor_type, building, floor)] = response.json()["sensorId"]
+    return sensor_ids
+
+
+def http_scenarios(rng, sensor_ids):
+    def post_sensor_data(i):
+        return "POST", "/sensor-data/", {"json": normal_reading(rng)}
+
+    def post_compact_reading(i):
+        reading = normal_reading(rng)
+        sensor_id = sensor_ids[(reading["type"], reading["building"], reading["floor"])]
+        return "POST", "/sensor-data/compact", {"json": {"sensorId": sensor_id, "value": reading[SENSOR_FIELDS[reading["type"]]]}}
+
+    def get_sensor_data(i):
+        params = {"type": rng.choice(list(SENSOR_FIELDS)), "building": rng.choice(BUILDINGS),
+                  "floor": rng.choice(FLOORS), "page": rng.randint(1, 5), "page_size": 50}
+        return "GET", "/sensor-data/", {"params": params}
+
+    def get_sensor_stats(i):
+        return "GET", f"/sensor-data/stats/{rng.choice(list(SENSOR_FIELDS))}", {}
+
+    def get_fire_status(i):
+        return "GET", f"/fire-status/{rng.choice(BUILDINGS)}/{rng.choice(FLOORS)}", {}
+
+    return {
+        "post_sensor_data": post_sensor_data,
+        "post_compact_reading": post_compact_reading,
+        "get_sensor_data": get_sensor_data,
+        "get_sensor_stats": get_sensor_stats,
+        # Stats only have 3 keys, so get_sensor_stats mostly measures cache hits;
+        # this one runs with the response cache off and measures the computation
+        "get_sensor_stats_uncached": get_sensor_stats,
+        "get_fire_status": get_fire_status,
+    }
+
+
+async def bench_http(app, response_cache, db, size, concurrency_levels, requests_per_run, rng, scenarios):
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport does not send lifespan events, so run startup/shutdown here
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await wait_ready_async(client)
+        sensor_ids = await register_sensors(client)
+        for name, make_request in http_scenarios(rng, sensor_ids).items():
+            if scenarios and name not in scenarios:
+                continue
+            for concurrency in concurrency_levels:
+                # Every run starts from the same dataset size
+                seed_dataset(db, size, rng)
+                response_cache.clear()
+                max_entries = response_cache.max_entries
+                if name.endswith("_uncached"):
+                    response_cache.max_entries = 0      # every put is evicted straight away
+                try:
+                    stats = await run_load(client, make_request, requests_per_run, concurrency)
+                finally:
+                    response_cache.max_entries = max_entries
+                results.append({"scenario": name, "dataset_size": size, "concurrency": concurrency, **stats})
+    return results
+
+
+def bench_websocket_alerts(app, db, size, iterations, rng):
+    # Time from posting the reading that completes a fire feature vector to the alert arriving
+    seed_dataset(db, size, rng)
+    latencies = []
+    with TestClient(app) as client:
+        wait_ready(client)
+        with client.websocket_connect("/ws/alerts") as websocket:
+            websocket.receive_json()        # snapshot of the active alerts
+            start_all = time.perf_counter()
+            for i in range(iterations):
+                building, floor = BUILDINGS[i % len(BUILDINGS)], FLOORS[i % len(FLOORS)]
+                db.alerts_collection.delete_many({})
+                for sensor_type in ("Humidity", "Acoustic"):
+                    client.post("/sensor-data/", json=make_reading(sensor_type, building, floor, FIRE_VALUES[sensor_type]))
+                start = time.perf_counter()
+                client.post("/sensor-data/", json=make_reading("Temperature", building, floor, FIRE_VALUES["Temperature"]))
+                websocket.receive_json()
+                latencies.append(time.perf_counter() - start)
+            duration = time.perf_counter() - start_all
+    return {
+        "scenario": "websocket_alert_delivery",
+        "dataset_size": size,
+        "concurrency": 1,
+        "requests": iterations,
+        "errors": 0,
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(iterations / duration, 2),
+        **percentiles(latencies),
+    }
+
+
+def bench_websocket_ingest(app, db, size, total, rng):
+    # Readings streamed over one /ws/ingest connection, as many in flight as the window allows;
+    # latency is from sending a reading to the cumulative ack that covers it
+    seed_dataset(db, size, rng)
+    latencies = []
+    errors = 0
+    with TestClient(app) as client:
+        wait_ready(client)
+        with client.websocket_connect("/ws/ingest") as websocket:
+            window = websocket.receive_json()["window"]
+            sent_at = {}
+            seq = 0
+            start_all = time.perf_counter()
+            while seq < total or sent_at:
+                while seq < total and len(sent_at) < window:
+                    seq += 1
+                    websocket.send_json({"seq": seq, "reading": normal_reading(rng)})
+                    sent_at[seq] = time.perf_counter()
+                reply = websocket.receive_json()
+                if reply["kind"] == "nack":
+                    errors += 1
+                elif reply["kind"] == "ack":
+                    now = time.perf_counter()
+                    for acked in [s for s in sent_at if s <= reply["seq"]]:
+                        latencies.append(now - sent_at.pop(acked))
+            duration = time.perf_counter() - start_all
+    return {
+        "scenario": "websocket_ingest",
+        "dataset_size": size,
+        "concurrency": window,
+        "requests": total,
+        "errors": errors,
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(total / duration, 2),
+        **percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sensor API in-process")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma separated sensor_readings dataset sizes")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario run")
+    parser.add_argument("--ws-iterations", type=int, default=50, help="Alerts measured per dataset size")
+    parser.add_argument("--scenarios", default="", help="Only run these scenarios (comma separated)")
+    parser.add_argument("--mongo-uri", default=None, help="Use a local MongoDB instead of mongomock")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    parser.add_argument("--compare", default=None, help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+    scenarios = set(filter(None, args.scenarios.split(",")))
+    rng = random.Random(args.seed)
+
+    main_module, db = load_app(args.mongo_uri)
+
+    results = []
+    for size in sizes:
+        results += asyncio.run(bench_http(main_module.app, main_module.response_cache, db, size, concurrency_levels, args.requests, rng, scenarios))
+        if not scenarios or "websocket_alert_delivery" in scenarios:
+            results.append(bench_websocket_alerts(main_module.app, db, size, args.ws_iterations, rng))
+        if not scenarios or "websocket_ingest" in scenarios:
+            results.append(bench_websocket_ingest(main_module.app, db, size, args.requests, rng))
+
+    path = write_results("bench_api", results, vars(args), args.output)
+    print_results(results, args.compare)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Model inference micro-benchmark.
+
+Measures single-row and batched latency/throughput for every model backend that can be
+loaded here (rf_model.pkl, nn_model.keras in-process, the exported fire_nn SavedModel and
+TF Serving REST against a local stub), plus accuracy on the simulator probe set.
+
+    python benchmarks/bench_inference.py --batch-sizes 1,16,256,4096
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from harness import REPO_ROOT, percentiles, print_results, start_tf_serving_stub, write_results
+
+
+def bench_backend(backend, probe_rows, batch_sizes, duration_s):
+    results = []
+    for batch_size in batch_sizes:
+        repeats = int(np.ceil(batch_size / len(probe_rows)))
+        batch = np.tile(probe_rows, (repeats, 1))[:batch_size]
+        backend.predict(batch)      # warm up
+
+        latencies = []
+        deadline = time.perf_counter() + duration_s
+        while time.perf_counter() < deadline or len(latencies) < 5:
+            start = time.perf_counter()
+            backend.predict(batch)
+            latencies.append(time.perf_counter() - start)
+
+        total_time = sum(latencies)
+        results.append({
+            "scenario": "inference",
+            "backend": backend.name,
+            "batch_size": batch_size,
+            "requests": len(latencies),
+            "errors": 0,
+            "duration_s": round(total_time, 4),
+            "throughput_rps": round(len(latencies) / total_time, 2),
+            "rows_per_s": round(len(latencies) * batch_size / total_time, 1),
+            **percentiles(latencies),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fire detection model backends")
+    parser.add_argument("--batch-sizes", default="1,16,256,4096")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds measured per backend and batch size")
+    parser.add_argument("--backends", default="", help="Only these backends (comma separated)")
+    parser.add_argument("--tf-serving-url", default=None, help="Real TF Serving endpoint instead of the local stub")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, os.path.join(REPO_ROOT, "app"))
+    from model_backends import load_backends, make_probe_set, measure_backend
+
+    tf_serving_url = args.tf_serving_url or start_tf_serving_stub()[1]
+    backends = load_backends(tf_serving_url)
+    selected = set(filter(None, args.backends.split(",")))
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    probe_rows, probe_labels = make_probe_set()
+
+    results = []
+    for name, backend in backends.items():
+        if selected and name not in selected:
+            continue
+        quality = measure_backend(backend, probe_rows, probe_labels)
+        for result in bench_backend(backend, probe_rows, batch_sizes, args.duration):
+            result["accuracy"] = quality["accuracy"]
+            results.append(result)
+
+    path = write_results("bench_inference", results, vars(args), args.output)
+    print_results(results, args.compare)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Ingest wire format micro-benchmark.
+
+Measures what it costs to turn a request body into validated readings for every format
+POST /sensor-data/, /sensor-data/compact and /sensor-data/batch accept: full and compact
+readings as JSON or MessagePack (validated by the API's Pydantic models), and the packed
+binary batch (NumPy view plus vectorized checks). Batches of JSON/MessagePack readings
+are decoded as lists. Reports time and bytes per reading.
+
+    python benchmarks/bench_wire_format.py --batch-sizes 1,100,1000
+"""
+import argparse
+import json
+import random
+import time
+from typing import List
+
+import msgpack
+from pydantic import TypeAdapter
+
+from bench_api import SENSOR_FIELDS, normal_reading
+from harness import load_app, percentiles, print_results, write_results
+
+
+def make_bodies(main, rng, batch_size):
+    from wire_format import decode_batch, encode_batch, validate_batch
+
+    readings = [normal_reading(rng) for _ in range(batch_size)]
+    compact = [{"sensorId": "52c0eace-f68d-57dd-b295-0e6d065ee966", "value": r[SENSOR_FIELDS[r["type"]]],
+                "timestamp": "2025-08-06T14:00:00+03:00"} for r in readings]
+    binary = [(r["building"], r["floor"], r["type"], r[SENSOR_FIELDS[r["type"]]], 1754478000000) for r in readings]
+
+    full_model, compact_model = main.SensorData, main.CompactReading
+    full_list, compact_list = TypeAdapter(List[full_model]), TypeAdapter(List[compact_model])
+    single = batch_size == 1
+
+    def batch(body):
+        records = decode_batch(body)
+        assert not validate_batch(records)
+        return records
+
+    # format -> (body, decode function)
+    return {
+        "json": (json.dumps(readings[0] if single else readings).encode(),
+                 full_model.model_validate_json if single else full_list.validate_json),
+        "json_compact": (json.dumps(compact[0] if single else compact).encode(),
+                         compact_model.model_validate_json if single else compact_list.validate_json),
+        "msgpack": (msgpack.packb(readings[0] if single else readings),
+                    (lambda b: full_model.model_validate(msgpack.unpackb(b))) if single
+                    else (lambda b: full_list.validate_python(msgpack.unpackb(b)))),
+        "msgpack_compact": (msgpack.packb(compact[0] if single else compact),
+                            (lambda b: compact_model.model_validate(msgpack.unpackb(b))) if single
+                            else (lambda b: compact_list.validate_python(msgpack.unpackb(b)))),
+        "binary_batch": (encode_batch(binary), batch),
+    }
+
+
+def bench_decode(name, body, decode, batch_size, duration_s):
+    decode(body)        # warm up
+    latencies = []
+    deadline = time.perf_counter() + duration_s
+    while time.perf_counter() < deadline or len(latencies) < 5:
+        start = time.perf_counter()
+        decode(body)
+        latencies.append(time.perf_counter() - start)
+    total_time = sum(latencies)
+    return {
+        "scenario": "decode",
+        "format": name,
+        "batch_size": batch_size,
+        "requests": len(latencies),
+        "errors": 0,
+        "duration_s": round(total_time, 4),
+        "throughput_rps": round(len(latencies) / total_time, 2),
+        "rows_per_s": round(len(latencies) * batch_size / total_time, 1),
+        "us_per_reading": round(total_time / len(latencies) / batch_size * 1e6, 3),
+        "bytes_per_reading": round(len(body) / batch_size, 1),
+        **percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decoding of the ingest wire formats")
+    parser.add_argument("--batch-sizes", default="1,100,1000", help="Readings per request body")
+    parser.add_argument("--duration", type=float, default=1.0, help="Seconds measured per format and batch size")
+    parser.add_argument("--formats", default="", help="Only these formats (comma separated)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    main_module, _ = load_app()
+    rng = random.Random(args.seed)
+    selected = set(filter(None, args.formats.split(",")))
+
+    results = []
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        for name, (body, decode) in make_bodies(main_module, rng, batch_size).items():
+            if selected and name not in selected:
+                continue
+            results.append(bench_decode(name, body, decode, batch_size, args.duration))
+
+    path = write_results("bench_wire_format", results, vars(args), args.output)
+    print_results(results, args.compare)
+    for result in results:
+        print(f"{result['format']:>16} x{result['batch_size']:<5} {result['us_per_reading']:>9} us/reading "
+              f"{result['bytes_per_reading']:>7} bytes/reading")
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Shared helpers for the benchmark scripts.
+
+Runs the FastAPI app in-process the same way the Dockerfile lays it out (app/*.py next to
+templates/ and static/), backed by mongomock or a local MongoDB, with a stub TF Serving
+endpoint on the loopback interface. Nothing here needs network access.
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+
+# Stub TF Serving: answers :predict with a simple temperature rule instead of the real model
+class _TFServingStub(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        predictions = [[0.99 if row[0] > 45 else 0.01] for row in body["instances"]]
+        payload = json.dumps({"predictions": predictions}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        # Model status, as polled by /readyz
+        payload = json.dumps({"model_version_status": [{"version": "1", "state": "AVAILABLE"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_tf_serving_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _TFServingStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/v1/models/fire_nn:predict"
+
+
+def _install_db_connect(mongo_uri: str = None):
+    # The real app/db_connect.py (it connects lazily, so nothing is contacted), repointed at
+    # mongomock or a local benchmark database
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+        db = client["sensor_data_benchmark"]
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+        db = client["sensor_data_db"]
+
+    from pymongo.collection import Collection
+    spec = importlib.util.spec_from_file_location("db_connect", os.path.join(REPO_ROOT, "app", "db_connect.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for attr, value in list(vars(module).items()):
+        if isinstance(value, Collection):
+            setattr(module, attr, db[value.name])
+    module.client = client
+    module.db = db
+    sys.modules["db_connect"] = module
+    return module
+
+
+def _runtime_dir():
+    # Mirror the container layout: /app holds app/*.py, templates/ and static/
+    runtime = tempfile.mkdtemp(prefix="fire-bench-")
+    app_dir = os.path.join(REPO_ROOT, "app")
+    for name in os.listdir(app_dir):
+        if name.endswith(".py") and name != "db_connect.py":
+            os.symlink(os.path.join(app_dir, name), os.path.join(runtime, name))
+    for name in ("templates", "static"):
+        os.symlink(os.path.join(REPO_ROOT, name), os.path.join(runtime, name))
+    return runtime
+
+
+def load_app(mongo_uri: str = None):
+    """Import app/main.py against the stand-ins and return (main module, db_connect module)."""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "0")
+    # The rollup job would compete with the measured requests
+    os.environ.setdefault("RETENTION_ENABLED", "0")
+    _, tf_serving_url = start_tf_serving_stub()
+    os.environ["TF_SERVING_URL"] = tf_serving_url
+
+    db = _install_db_connect(mongo_uri)
+    sys.path.insert(0, _runtime_dir())
+    # Model paths in main.py are relative to the working directory, as in the container
+    os.chdir(REPO_ROOT)
+    import main
+    return main, db
+
+
+def _started(response) -> bool:
+    # Ready, and done probing backends, so the selection does not compete with measured requests
+    report = response.json()
+    return response.status_code == 200 and report["checks"].get("model_selection", {}).get("ready", False)
+
+
+def wait_ready(client, timeout: float = 300):
+    """Poll /readyz through a TestClient until the app's startup has finished."""
+    deadline = time.monotonic() + timeout
+    while not _started(client.get("/readyz")):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"App not ready within {timeout}s: {client.get('/readyz').json()}")
+        time.sleep(0.05)
+
+
+async def wait_ready_async(client, timeout: float = 300):
+    deadline = time.monotonic() + timeout
+    while not _started(await client.get("/readyz")):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"App not ready within {timeout}s")
+        await asyncio.sleep(0.05)
+
+
+def percentiles(latencies_s) -> dict:
+    values = np.asarray(latencies_s) * 1000.0
+    if values.size == 0:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def write_results(name: str, results: list, args: dict, output: str = None) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = output or os.path.join(RESULTS_DIR, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    report = {
+        "benchmark": name,
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "args": args,
+        },
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def _result_key(result: dict):
+    return tuple((k, result[k]) for k in sorted(result) if k not in METRIC_FIELDS)
+
+
+METRIC_FIELDS = {
+    "requests", "errors", "duration_s", "throughput_rps", "rows_per_s", "accuracy",
+    "us_per_reading", "bytes_per_reading",
+    "p50_ms", "p95_ms", "p99_ms", "mean_ms", "cache_hit_ratio",
+}
+
+
+def print_results(results: list, baseline_path: str = None):
+    baseline = {}
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = {_result_key(r): r for r in json.load(f)["results"]}
+
+    for result in results:
+        label = ", ".join(f"{k}={v}" for k, v in _result_key(result))
+        line = f"{label}: {result['throughput_rps']:.1f} req/s, p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms"
+        if "cache_hit_ratio" in result:
+            line += f", cache hits {result['cache_hit_ratio']:.0%}"
+        previous = baseline.get(_result_key(result))
+        if previous and previous.get("throughput_rps") and previous.get("p95_ms"):
+            rps_delta = (result["throughput_rps"] / previous["throughput_rps"] - 1) * 100
+            p95_delta = (result["p95_ms"] / previous["p95_ms"] - 1) * 100
+            line += f"  [throughput {rps_delta:+.1f}%, p95 {p95_delta:+.1f}% vs baseline]"
+        print(line)
@@ -3,10 +3,15 @@ import random
 import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
+import logging
+from simulator_common import setup_logging
 
 # Timezone setup
 athens_tz = ZoneInfo("Europe/Athens")
 
+setup_logging()
+logger = logging.getLogger("generate_events")
+
 # Config
 event_types_probabilities = {
     "fire": 0.05,  # 5% chance
@@ -20,18 +25,19 @@ def check_fire_status(building, floor):
         if response.status_code == 200:
             return response.json().get("fire") == True
     except Exception as e:
-        print(f"Failed to check active events for {building} Floor {floor}: {e}")
+        logger.warning("Failed to check active events for %s Floor %s: %s", building, floor, e)
     return False  # Default to normal
 
-def wait_for_api(max_retries=30, delay=2):
+def wait_for_api(max_retries=120, delay=0.5):
+    # /readyz answers 503 until MongoDB, a model and the alert snapshot are loaded
     for _ in range(max_retries):
         try:
-            response = requests.get("http://sensor-api:8000/docs")
+            response = requests.get("http://sensor-api:8000/readyz", timeout=2)
             if response.status_code == 200:
-                print("FastAPI is up! Starting data simulation.")
+                logger.info("FastAPI is up! Starting data simulation.")
                 return
         except Exception as e:
-            print("Waiting for temp-api to be ready...")
+            logger.info("Waiting for temp-api to be ready...")
         time.sleep(delay)
     raise Exception("temp-api service did not become available in time.")
 
@@ -39,7 +45,7 @@ def generate_random_event(building, floor, event_types_probabilities, min_durati
     now = datetime.now(tz=athens_tz)
 
     if check_fire_status(building, floor):
-        print(f"Skipping {building} Floor {floor} (active fire exists)")
+        logger.debug("Skipping %s Floor %s (active fire exists)", building, floor)
         return
     
     for event_type, prob in event_types_probabilities.items():
@@ -54,7 +60,7 @@ def generate_random_event(building, floor, event_types_probabilities, min_durati
             }
             return event
         else:
-            print(f"No {event_type} event for {building} Floor {floor} this round.")
+            logger.debug("No %s event for %s Floor %s this round.", event_type, building, floor)
     
     return None  # In case no event is selected
 
@@ -68,10 +74,12 @@ def simulate_posting():
                 if event:
                     try:
                         response = requests.post("http://sensor-api:8000/events/", json=event)
-                        print(f"Sent data: {event}")
-                        print(f"Response: {response.status_code}, {response.json()}")
+                        if response.status_code // 100 == 2:
+                            logger.info("Sent event", extra={"event": event, "status": response.status_code})
+                        else:
+                            logger.warning("Event rejected", extra={"event": event, "status": response.status_code, "detail": response.text})
                     except Exception as e:
-                        print(f"Failed to post event: {e}")
+                        logger.warning("Failed to post event: %s", e)
         time.sleep(600)  # Post every 10 minutes
 
 if __name__ == "__main__":
@@ -1,14 +1,18 @@
 import random
-import uuid
 import requests
 import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
+import logging
+from simulator_common import API_URL, INGEST_TRANSPORT, IngestChannel, send_reading, setup_logging
 import os
 import json
 
 athens_tz = ZoneInfo("Europe/Athens") #Athens timezone
 
+setup_logging()
+logger = logging.getLogger("humidity_simulator")
+
 # Configuration for humidity reading
 sensor_config = {
     "Humidity": {
@@ -33,11 +37,10 @@ try:
             eval(k): v for k, v in last_humidity_data.items()
         }
     # key = (building, floor), value = (humidity, date_string)
-    print("Last humidity data loaded:")
-    print(last_humidity_data)
+    logger.info("Last humidity data loaded", extra={"state": last_humidity_data})
 except FileNotFoundError:
     last_humidity_data = {}
-    print("last_humidity.json file not found!")
+    logger.info("last_humidity.json file not found!")
 
 def generate_sensor_data(building: str, floor: int):
     # check for fire
@@ -60,7 +63,7 @@ def generate_sensor_data(building: str, floor: int):
     if fire_mode:
         humidity = round(random.uniform(10, 30), 1)
         #event = "fire"
-        print("Fire mode active! Sending low humidity readings.")
+        logger.info("Fire mode active! Sending low humidity readings.", extra={"sampled": True, "building": building, "floor": floor})
     else:
         #event = "normal"
         if key not in last_humidity_data or last_humidity_data[key][1] != today_str:
@@ -70,7 +73,7 @@ def generate_sensor_data(building: str, floor: int):
             # Same day → small fluctuation from last value
             prev_humidity = last_humidity_data[key][0]
             humidity = prev_humidity + random.gauss(0, config["daily_deviation"])
-            print("Small flunctuation! :)")
+            logger.debug("Small flunctuation! :)")
         # Clamp and round
         humidity = round(max(config["min"], min(config["max"], humidity)), 1)
 
@@ -85,13 +88,12 @@ def generate_sensor_data(building: str, floor: int):
             }
             with open(STATE_FILE, "w") as f:
                 json.dump(serializable_data, f)
-            print("Updated last value!")
+            logger.debug("Updated last value!")
         except Exception as e:
-            print(f"Failed to persist humidity state: {e}")
+            logger.warning("Failed to persist humidity state: %s", e)
 
     # Return structured sensor reading
     return {
-        "sensorId": str(uuid.uuid4()),
         "type": "Humidity",
         #"event": event,
         "vendorName": vendorName,
@@ -105,15 +107,16 @@ def generate_sensor_data(building: str, floor: int):
         "timestamp": datetime.now(tz=athens_tz).isoformat()
     }
 
-def wait_for_api(max_retries=30, delay=2):
+def wait_for_api(max_retries=120, delay=0.5):
+    # /readyz answers 503 until MongoDB, a model and the alert snapshot are loaded
     for _ in range(max_retries):
         try:
-            response = requests.get("http://sensor-api:8000/docs")
+            response = requests.get("http://sensor-api:8000/readyz", timeout=2)
             if response.status_code == 200:
-                print("FastAPI is up! Starting data simulation.")
+                logger.info("FastAPI is up! Starting data simulation.")
                 return
         except Exception as e:
-            print("Waiting for sensor-api to be ready...")
+            logger.info("Waiting for sensor-api to be ready...")
         time.sleep(delay)
     raise Exception("sensor-api service did not become available in time.")
 
@@ -123,22 +126,40 @@ def check_fire_mode(building, floor):
         if response.status_code == 200:
             return response.json().get("fire") == True
     except Exception as e:
-        print(f"Error checking fire mode: {e}")
+        logger.warning("Error checking fire mode: %s", e)
     return False  # Default to normal
 
+channel = IngestChannel(API_URL.replace("http", "ws", 1) + "/ws/ingest") if INGEST_TRANSPORT == "ws" else None
+
 def simulate_posting():
     wait_for_api()
     while True:
-        # Scenario: 3 buildings (A–C), 4 floors each
-        for building in ['A', 'B', 'C']:    # Buildings A, B, C
-            for floor in range(1, 5):  # Floors 1 to 4
-                humidity_data = generate_sensor_data(building, floor)
-                try:
-                    response = requests.post("http://sensor-api:8000/sensor-data/", json=humidity_data)
-                    print(f"Sent data: {humidity_data}")
-                    print(f"Response: {response.status_code}, {response.json()}")
-                except Exception as e:
-                    print(f"Error posting data: {e}")
+        sent, failed = 0, 0
+        if channel:
+            # All readings of the cycle over the one WebSocket
+            readings = [generate_sensor_data(building, floor) for building in ['A', 'B', 'C'] for floor in range(1, 5)]
+            try:
+                sent, failed = channel.send_all(readings)
+            except Exception as e:
+                logger.warning("Error streaming data: %s", e)
+                failed = len(readings)
+        else:
+            # Scenario: 3 buildings (A–C), 4 floors each
+            for building in ['A', 'B', 'C']:    # Buildings A, B, C
+                for floor in range(1, 5):  # Floors 1 to 4
+                    humidity_data = generate_sensor_data(building, floor)
+                    try:
+                        response = send_reading(humidity_data)
+                        if response.status_code // 100 == 2:
+                            logger.info("Sent data", extra={"sampled": True, "data": humidity_data, "status": response.status_code})
+                            sent += 1
+                        else:
+                            logger.warning("Reading rejected", extra={"data": humidity_data, "status": response.status_code, "detail": response.text})
+                            failed += 1
+                    except Exception as e:
+                        logger.warning("Error posting data: %s", e)
+                        failed += 1
+        logger.info("Posting cycle finished", extra={"sent": sent, "failed": failed})
         time.sleep(300)  # Post every 5 minutes
 
 if __name__ == "__main__":
@@ -18,7 +18,7 @@ def test_generate_sensor_data_first_call(tmp_path, monkeypatch):
     data = humidity_simulator.generate_sensor_data("A", 1)
 
     # Assert structure
-    assert data["sensorId"]
+    assert "sensorId" not in data  # the registered ID is added when the reading is sent
     assert data["type"] == "Humidity"
     assert data["building"] == "A"
     assert data["floor"] == 1
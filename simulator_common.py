@@ -0,0 +1,190 @@
+"""Code shared by the simulators; each simulator image copies this file next to its script."""
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+import requests
+import websocket
+
+API_URL = "http://sensor-api:8000"
+VALUE_FIELDS = {"Temperature": "temperature", "Humidity": "humidity", "Acoustic": "soundLevel"}
+
+logger = logging.getLogger("simulator")
+
+# Same log lines as the API (app/log_config.py): anything passed through `extra=` is logged as a field
+_RECORD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "sampled"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        try:
+            return json.dumps(entry, default=str)
+        except TypeError:
+            # e.g. a dict with tuple keys, like the simulators' (building, floor) state
+            return json.dumps({key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+                               for key, value in entry.items()})
+
+
+class SamplingFilter(logging.Filter):
+    # Keep 1 in `rate` per-reading records (logged with extra={"sampled": True}); warnings are never dropped
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, rate)
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        return next(self.counter) % self.rate == 0
+
+
+def setup_logging():
+    # Log records go through a queue; a background thread does the stdout writes
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))  # the queued record keeps the bare message
+    queue_handler.addFilter(SamplingFilter(int(os.getenv("LOG_SAMPLE_RATE", "100"))))
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), handlers=[queue_handler])
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+# Reuse one keep-alive connection for every request
+session = requests.Session()
+
+
+def post_reading(data, max_attempts=3, path="/sensor-data/"):
+    # The API answers 429/503 with Retry-After when it is overloaded; back off and retry
+    for attempt in range(max_attempts):
+        response = session.post(f"{API_URL}{path}", json=data, timeout=10)
+        if response.status_code not in (429, 503):
+            break
+        time.sleep(float(response.headers.get("Retry-After", 1)))
+    return response
+
+
+# Send only (sensorId, value, timestamp) after registering each sensor once; 0 = full readings
+COMPACT_READINGS = os.getenv("COMPACT_READINGS", "1") == "1"
+sensor_ids = {}  # (building, floor) -> sensorId returned by the API
+
+
+def register_sensor(data):
+    key = (data["building"], data["floor"])
+    if key not in sensor_ids:
+        metadata = {field: data[field] for field in ("type", "vendorName", "vendorEmail", "description", "building", "floor")}
+        response = session.post(f"{API_URL}/sensors/", json=metadata, timeout=10)
+        response.raise_for_status()
+        sensor_ids[key] = response.json()["sensorId"]
+    return sensor_ids[key]
+
+
+def send_reading(data):
+    if not COMPACT_READINGS:
+        return post_reading(full_reading(data))
+    response = post_reading(compact_reading(data), path="/sensor-data/compact")
+    if response.status_code == 404:
+        # The API no longer knows the sensor (e.g. a fresh database): register it again
+        sensor_ids.pop((data["building"], data["floor"]), None)
+        response = post_reading(compact_reading(data), path="/sensor-data/compact")
+    return response
+
+
+def reading_id(data):
+    # Set once per reading and sent again with every retry, so the API stores the reading only once
+    # even when an attempt answered 503 (or the connection dropped) after it was saved
+    return data.setdefault("readingId", str(uuid.uuid4()))
+
+
+def full_reading(data):
+    # Full readings carry the registered ID as well, so a sensor keeps one ID on both paths
+    return {**data, "sensorId": register_sensor(data), "readingId": reading_id(data)}
+
+
+def compact_reading(data):
+    value = data[VALUE_FIELDS[data["type"]]]
+    return {"sensorId": register_sensor(data), "value": value, "timestamp": data["timestamp"], "readingId": reading_id(data)}
+
+
+# "ws" streams every reading over one /ws/ingest WebSocket instead of one POST each
+INGEST_TRANSPORT = os.getenv("INGEST_TRANSPORT", "http")
+
+
+class IngestChannel:
+    # Readings are sent with increasing sequence numbers; the API acknowledges them
+    # cumulatively and allows at most `window` unacknowledged ones at a time
+    def __init__(self, url, max_reconnects=3):
+        self.url = url
+        self.max_reconnects = max_reconnects
+        self.ws = None
+        self.seq = 0
+        self.window = 1
+
+    def connect(self):
+        self.ws = websocket.create_connection(self.url, timeout=30)
+        self.window = json.loads(self.ws.recv())["window"]
+
+    def message(self, data):
+        if COMPACT_READINGS:
+            return {"compact": compact_reading(data)}
+        return {"reading": full_reading(data)}
+
+    def send_all(self, readings, max_attempts=3):
+        outbox = deque((data, 0) for data in readings)
+        pending = {}  # seq -> (data, attempt), in send order
+        sent, failed, reconnects = 0, 0, 0
+        while outbox or pending:
+            try:
+                if self.ws is None:
+                    self.connect()
+                while outbox and len(pending) < self.window:
+                    self.seq += 1
+                    pending[self.seq] = outbox.popleft()
+                    self.ws.send(json.dumps({"seq": self.seq, **self.message(pending[self.seq][0])}))
+                reply = json.loads(self.ws.recv())
+            except (websocket.WebSocketException, OSError) as e:
+                # Unacknowledged readings are sent again on the next connection
+                self.ws = None
+                reconnects += 1
+                if reconnects > self.max_reconnects:
+                    raise
+                logger.warning("Ingest channel lost, resending %d readings: %s", len(pending), e)
+                outbox.extendleft(reversed(list(pending.values())))
+                pending.clear()
+                time.sleep(1)
+                continue
+            if reply["kind"] == "ack":
+                for seq in [seq for seq in pending if seq <= reply["seq"]]:
+                    pending.pop(seq)
+                    sent += 1
+            elif reply["kind"] == "nack":
+                data, attempt = pending.pop(reply["seq"])
+                if reply["status"] == 404:
+                    sensor_ids.pop((data["building"], data["floor"]), None)  # register again
+                if reply["status"] in (404, 429, 503) and attempt + 1 < max_attempts:
+                    time.sleep(reply["retry_after"] or 0)
+                    outbox.append((data, attempt + 1))
+                else:
+                    logger.warning("Reading rejected", extra={"data": data, "status": reply["status"], "detail": reply["detail"]})
+                    failed += 1
+        return sent, failed
@@ -2,25 +2,89 @@ const { DateTime } = luxon;
 
 const banner = document.getElementById("fire-alert-banner");
 
-// Connect to WebSocket server
-const socket = new WebSocket(`ws://${window.location.host}/ws/alerts`);
-
 // empty array to hold incoming incoming fire alerts
 const alertQueue = [];
 
-socket.onopen = function() {
-    console.log("WebSocket connection opened!");
-};
+// Alerts already shown, so a snapshot after a reconnect does not pop them up again
+const shownAlerts = new Set();
+
+// Position in the server's alert stream, used to resume after a reconnect
+let lastSeq = null;
+let epoch = null;
+let reconnectDelay = 1000;
+
+// Locations with an active fire ("A:1" -> true/false), listed in the banner while any is on fire
+const fireMap = {};
+
+function renderFireBanner() {
+    const burning = Object.keys(fireMap).filter(location => fireMap[location]).sort();
+    if (burning.length === 0) {
+        banner.style.display = "none";
+        return;
+    }
+    const locations = burning.map(location => {
+        const [building, floor] = location.split(":");
+        return `Building ${building} Floor ${floor}`;
+    });
+    banner.textContent = `🔥 Active fire: ${locations.join(", ")}`;
+    banner.style.display = "block";
+}
+
+function connect() {
+    let url = `ws://${window.location.host}/ws/alerts`;
+    if (epoch !== null) {
+        url += `?since=${lastSeq}&epoch=${epoch}`;
+    }
+    // Connect to WebSocket server
+    const socket = new WebSocket(url);
+
+    socket.onopen = function() {
+        console.log("WebSocket connection opened!");
+        reconnectDelay = 1000;
+    };
+
+    socket.onmessage = function(event) {
+        const message = JSON.parse(event.data);
+        // Older deltas can arrive again around a reconnect
+        if (message.epoch === epoch && message.seq <= lastSeq) return;
+        epoch = message.epoch;
+        lastSeq = message.seq;
+
+        if (message.kind === "snapshot") {
+            // A snapshot replaces the whole map
+            Object.keys(fireMap).forEach(location => delete fireMap[location]);
+            Object.assign(fireMap, message.fire);
+            message.alerts.forEach(queueAlert);
+        } else if (message.kind === "alert_opened") {
+            fireMap[`${message.alert.building}:${message.alert.floor}`] = true;
+            queueAlert(message.alert);
+        } else if (message.kind === "alert_closed") {
+            fireMap[`${message.building}:${message.floor}`] = false;
+        }
+        renderFireBanner();
+    };
+
+    socket.onerror = function(error) {
+        console.error("WebSocket error:", error);
+    };
 
-socket.onmessage = function(event) {
-    const alert = JSON.parse(event.data);
+    socket.onclose = function() {
+        console.warn("WebSocket connection closed, reconnecting");
+        setTimeout(connect, reconnectDelay);
+        reconnectDelay = Math.min(reconnectDelay * 2, 30000);
+    };
+}
+
+function queueAlert(alert) {
+    if (shownAlerts.has(alert._id)) return;
+    shownAlerts.add(alert._id);
     console.log("Received Alert!");
     alertQueue.push(alert);
 
     if (alertQueue.length === 1) {
         showNextAlert();
     }
-};
+}
 
 function showNextAlert() {
     if (alertQueue.length === 0) return;
@@ -51,10 +115,4 @@ function showNextAlert() {
   });
 }
 
-socket.onerror = function(error) {
-    console.error("WebSocket error:", error);
-};
-
-socket.onclose = function() {
-    console.warn("WebSocket connection closed");
-};
+connect();
@@ -71,12 +71,100 @@ const form = document.getElementById('filterForm');
 const ctx = document.getElementById('sensorChart').getContext('2d');
 let chart;
 
+// Live updates: new points of the plotted series are pushed over /ws/series and appended
+const MAX_LIVE_POINTS = 5000;   // per series; the oldest points are dropped beyond this
+let seriesSocket = null;
+let seriesReconnectDelay = 1000;
+
+function valueField(type) {
+    if (type === "Temperature") return "temperature";
+    if (type === "Humidity") return "humidity";
+    if (type === "Acoustic") return "soundLevel";
+    return null;
+}
+
+function appendPoints(dataset, times, values) {
+    const data = dataset.data;
+    for (let i = 0; i < times.length; i++) {
+        const point = { x: times[i], y: values[i] };
+        const last = data.length ? new Date(data[data.length - 1].x).getTime() : -Infinity;
+        if (times[i] >= last) {
+            data.push(point);
+        } else {
+            // Readings with their own timestamps can arrive out of order
+            const at = data.findIndex(p => new Date(p.x).getTime() > times[i]);
+            data.splice(at, 0, point);
+        }
+    }
+    if (data.length > MAX_LIVE_POINTS) data.splice(0, data.length - MAX_LIVE_POINTS);
+}
+
+// Readings stored while the socket was down are fetched once over HTTP
+async function fillGap(key, dataset) {
+    const [type, building, floor] = key.split(':');
+    if (dataset.data.length === 0) return;
+    const since = new Date(dataset.data[dataset.data.length - 1].x).getTime();
+    const params = new URLSearchParams({
+        type, building, floor,
+        start_time: luxon.DateTime.fromMillis(since + 1).setZone('Europe/Athens').toISO(),
+        page: 1,
+        page_size: 1000
+    });
+    const response = await fetch(`/sensor-data/?${params.toString()}`);
+    const results = (await response.json()).results || [];
+    appendPoints(dataset,
+        results.map(entry => new Date(entry.timestamp).getTime()),
+        results.map(entry => entry[valueField(type)]));
+}
+
+function followSeries(seriesDatasets, reconnected = false) {
+    const keys = Object.keys(seriesDatasets);
+    const socket = new WebSocket(`ws://${window.location.host}/ws/series?series=${encodeURIComponent(keys.join(','))}`);
+    seriesSocket = socket;
+
+    socket.onmessage = async function(event) {
+        const message = JSON.parse(event.data);
+        if (message.kind === "subscribed") {
+            seriesReconnectDelay = 1000;
+            if (reconnected) {
+                await Promise.all(keys.map(key => fillGap(key, seriesDatasets[key]).catch(console.error)));
+                chart.update('none');
+            }
+        } else if (message.kind === "points") {
+            // One message per server frame, with columns of timestamps (epoch ms) and values
+            for (const [key, columns] of Object.entries(message.series)) {
+                if (seriesDatasets[key]) appendPoints(seriesDatasets[key], columns.t, columns.v);
+            }
+            chart.update('none');
+        }
+    };
+
+    socket.onclose = function() {
+        // A new plot replaces the subscription; otherwise reconnect with backoff
+        if (seriesSocket !== socket) return;
+        setTimeout(() => {
+            if (seriesSocket !== socket) return;
+            followSeries(seriesDatasets, true);
+        }, seriesReconnectDelay);
+        seriesReconnectDelay = Math.min(seriesReconnectDelay * 2, 30000);
+    };
+}
+
+function stopFollowing() {
+    const socket = seriesSocket;
+    seriesSocket = null;
+    if (socket) socket.close();
+}
+
 form.addEventListener('submit', async function (e) {
     e.preventDefault();
 
     const type = form.type.value;
     const startTime = form.start_time.value;
     const endTime = form.end_time.value;
+    // Follow new readings unless the range ends in the past
+    const live = !endTime || new Date(endTime) > new Date();
+    stopFollowing();
 
     // Get all building/floor pairs
     const locationBlocks = document.querySelectorAll('.location-block');
@@ -88,6 +176,7 @@ form.addEventListener('submit', async function (e) {
 
     // Fetch data for each building-floor pair
     const datasets = [];
+    const seriesDatasets = {};
 
     for (const block of locationBlocks) {
         const building = block.querySelector('select[name="building"]').value;
@@ -108,20 +197,15 @@ form.addEventListener('submit', async function (e) {
             const data = await response.json();
             const results = data.results;
 
-            if (results.length === 0) continue;
+            if (results.length === 0 && !live) continue;
 
             const timestamps = results.map(entry => entry.timestamp);
-            const values = results.map(entry => {
-                if (type === "Temperature") return entry.temperature;
-                if (type === "Humidity") return entry.humidity;
-                if (type === "Acoustic") return entry.soundLevel;
-                return null;
-            });
+            const values = results.map(entry => entry[valueField(type)]);
 
             const key = `${building}-${floor}`;
             const color = locationColors[key] || 'black';  // fallback color
 
-            datasets.push({
+            const dataset = {
                 label: `${type} - ${building} Floor ${floor}`,
                 data: values,
                 borderWidth: 2,
@@ -133,7 +217,9 @@ form.addEventListener('submit', async function (e) {
                     yAxisKey: 'y'
                 },
                 data: timestamps.map((t, i) => ({ x: t, y: values[i] }))
-            });
+            };
+            datasets.push(dataset);
+            seriesDatasets[`${type}:${building}:${floor}`] = dataset;
         } catch (error) {
             console.error(`Error fetching data for ${building} floor ${floor}:`, error);
         }
@@ -178,4 +264,6 @@ form.addEventListener('submit', async function (e) {
             }
         }
     });
+
+    if (live) followSeries(seriesDatasets);
 });
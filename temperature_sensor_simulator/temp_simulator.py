@@ -1,14 +1,18 @@
 import random
-import uuid
 import requests
 import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
+import logging
+from simulator_common import API_URL, INGEST_TRANSPORT, IngestChannel, send_reading, setup_logging
 import os
 import json
 
 athens_tz = ZoneInfo("Europe/Athens") #Athens timezone
 
+setup_logging()
+logger = logging.getLogger("temp_simulator")
+
 # Configuration for temperature reading
 sensor_config = {
     "Temperature": {
@@ -31,11 +35,10 @@ try:
         last_temperature_data = {
             eval(k): v for k, v in last_temperature_data.items()
         }
-    print("Last temperature data loaded:")
-    print(last_temperature_data)
+    logger.info("Last temperature data loaded", extra={"state": last_temperature_data})
 except FileNotFoundError:
     last_temperature_data = {}
-    print("last_temperature.json file not found!")
+    logger.info("last_temperature.json file not found!")
 
 def generate_sensor_data(building: str, floor: int):
     # check for fire
@@ -58,18 +61,18 @@ def generate_sensor_data(building: str, floor: int):
     if fire_mode:
         temperature = round(random.uniform(55, 80), 1)
         #event = "fire"
-        print("Fire mode active! Sending high temperature.")
+        logger.info("Fire mode active! Sending high temperature.", extra={"sampled": True, "building": building, "floor": floor})
     else:
         #event = "normal"
         if key not in last_temperature_data or last_temperature_data[key][1] != today_str:
             # First time or new day → use full normal distribution
             temperature = random.gauss(config["mean"], config["std"])
-            print("Big flunctuation! :(")
+            logger.debug("Big flunctuation! :(")
         else:
             # Same day → small fluctuation from last value
             prev_temperature = last_temperature_data[key][0]
             temperature = prev_temperature + random.gauss(0, config["daily_deviation"])
-            print("Small flunctuation! :)")
+            logger.debug("Small flunctuation! :)")
         # Clamp and round
         temperature = round(max(config["min"], min(config["max"], temperature)), 1)
 
@@ -84,13 +87,12 @@ def generate_sensor_data(building: str, floor: int):
             }
             with open(STATE_FILE, "w") as f:
                 json.dump(serializable_data, f)
-            print("Updated last value!")
+            logger.debug("Updated last value!")
         except Exception as e:
-            print(f"Failed to persist temperature state: {e}")
+            logger.warning("Failed to persist temperature state: %s", e)
 
     # Return structured sensor reading
     return {
-        "sensorId": str(uuid.uuid4()),
         "type": "Temperature",
         #"event": event,
         "vendorName": vendorName,
@@ -104,15 +106,16 @@ def generate_sensor_data(building: str, floor: int):
         "timestamp": datetime.now(tz=athens_tz).isoformat()
     }
 
-def wait_for_api(max_retries=30, delay=2):
+def wait_for_api(max_retries=120, delay=0.5):
+    # /readyz answers 503 until MongoDB, a model and the alert snapshot are loaded
     for _ in range(max_retries):
         try:
-            response = requests.get("http://sensor-api:8000/docs")
+            response = requests.get("http://sensor-api:8000/readyz", timeout=2)
             if response.status_code == 200:
-                print("FastAPI is up! Starting data simulation.")
+                logger.info("FastAPI is up! Starting data simulation.")
                 return
         except Exception as e:
-            print("Waiting for temp-api to be ready...")
+            logger.info("Waiting for temp-api to be ready...")
         time.sleep(delay)
     raise Exception("temp-api service did not become available in time.")
 
@@ -122,22 +125,40 @@ def check_fire_status(building, floor):
         if response.status_code == 200:
             return response.json().get("fire") == True
     except Exception as e:
-        print(f"Failed to check active events for {building} Floor {floor}: {e}")
+        logger.warning("Failed to check active events for %s Floor %s: %s", building, floor, e)
     return False  # Default to normal
 
+channel = IngestChannel(API_URL.replace("http", "ws", 1) + "/ws/ingest") if INGEST_TRANSPORT == "ws" else None
+
 def simulate_posting():
     wait_for_api()
     while True:
-        # Scenario: 3 buildings (A–C), 4 floors each
-        for building in ['A', 'B', 'C']:    # Buildings A, B, C
-            for floor in range(1, 5):  # Floors 1 to 4
-                data = generate_sensor_data(building, floor)
-                try:
-                    response = requests.post("http://sensor-api:8000/sensor-data/", json=data)
-                    print(f"Sent data: {data}")
-                    print(f"Response: {response.status_code}, {response.json()}")
-                except Exception as e:
-                    print(f"Error posting data: {e}")
+        sent, failed = 0, 0
+        if channel:
+            # All readings of the cycle over the one WebSocket
+            readings = [generate_sensor_data(building, floor) for building in ['A', 'B', 'C'] for floor in range(1, 5)]
+            try:
+                sent, failed = channel.send_all(readings)
+            except Exception as e:
+                logger.warning("Error streaming data: %s", e)
+                failed = len(readings)
+        else:
+            # Scenario: 3 buildings (A–C), 4 floors each
+            for building in ['A', 'B', 'C']:    # Buildings A, B, C
+                for floor in range(1, 5):  # Floors 1 to 4
+                    data = generate_sensor_data(building, floor)
+                    try:
+                        response = send_reading(data)
+                        if response.status_code // 100 == 2:
+                            logger.info("Sent data", extra={"sampled": True, "data": data, "status": response.status_code})
+                            sent += 1
+                        else:
+                            logger.warning("Reading rejected", extra={"data": data, "status": response.status_code, "detail": response.text})
+                            failed += 1
+                    except Exception as e:
+                        logger.warning("Error posting data: %s", e)
+                        failed += 1
+        logger.info("Posting cycle finished", extra={"sent": sent, "failed": failed})
         time.sleep(300)  # Post every 5 minutes
 
 if __name__ == "__main__":
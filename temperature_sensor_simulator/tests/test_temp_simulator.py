@@ -16,7 +16,7 @@ def test_generate_sensor_data_first_call(tmp_path, monkeypatch):
     data = temp_simulator.generate_sensor_data("A", 1)
 
     # Assert structure
-    assert data["sensorId"]
+    assert "sensorId" not in data  # the registered ID is added when the reading is sent
     assert data["type"] == "Temperature"
     assert data["building"] == "A"
     assert data["floor"] == 1
@@ -80,4 +80,78 @@ def test_generate_sensor_data_with_existing_state(tmp_path, monkeypatch):
         assert abs(saved_temp - new_temp) < 0.0001, "Saved temperature should match generated temperature"
         assert saved_date == today_str, "Saved date should be today's date"
         
-'''
\ No newline at end of file
+'''
+def test_full_readings_carry_the_registered_sensor_id(tmp_path, monkeypatch):
+    import simulator_common
+
+    class FakeResponse:
+        status_code = 200
+
+        def __init__(self, body):
+            self.body = body
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self.body
+
+    posted = []
+
+    class FakeSession:
+        def post(self, url, json, timeout):
+            posted.append((url, json))
+            return FakeResponse({"sensorId": "registered-id"} if url.endswith("/sensors/") else {})
+
+    monkeypatch.setattr(simulator_common, "session", FakeSession())
+    monkeypatch.setattr(simulator_common, "sensor_ids", {})
+    monkeypatch.setattr(simulator_common, "COMPACT_READINGS", False)
+    monkeypatch.setattr(temp_simulator, "last_temperature_data", {})
+    monkeypatch.setattr(temp_simulator, "STATE_FILE", str(tmp_path / "last_temperature.json"))
+    monkeypatch.setattr(temp_simulator, "check_fire_status", lambda building, floor: False)
+
+    for _ in range(2):
+        simulator_common.send_reading(temp_simulator.generate_sensor_data("A", 1))
+
+    # Registered once; both full readings use the ID the API returned
+    readings = [body for url, body in posted if url.endswith("/sensor-data/")]
+    assert len(posted) == 3 and [r["sensorId"] for r in readings] == ["registered-id", "registered-id"]
+
+
+def test_retried_readings_keep_their_reading_id(tmp_path, monkeypatch):
+    import simulator_common
+
+    class FakeResponse:
+        def __init__(self, status_code, body):
+            self.status_code = status_code
+            self.body = body
+            self.headers = {"Retry-After": "0"}
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self.body
+
+    posted = []
+    statuses = iter([503, 200, 200])
+
+    class FakeSession:
+        def post(self, url, json, timeout):
+            if url.endswith("/sensors/"):
+                return FakeResponse(200, {"sensorId": "registered-id"})
+            posted.append(json)
+            return FakeResponse(next(statuses), {})
+
+    monkeypatch.setattr(simulator_common, "session", FakeSession())
+    monkeypatch.setattr(simulator_common, "sensor_ids", {})
+    monkeypatch.setattr(temp_simulator, "last_temperature_data", {})
+    monkeypatch.setattr(temp_simulator, "STATE_FILE", str(tmp_path / "last_temperature.json"))
+    monkeypatch.setattr(temp_simulator, "check_fire_status", lambda building, floor: False)
+
+    simulator_common.send_reading(temp_simulator.generate_sensor_data("A", 1))
+    simulator_common.send_reading(temp_simulator.generate_sensor_data("A", 1))
+
+    # The 503 was retried with the same ID, so the API can tell it apart from a new reading
+    assert len(posted) == 3
+    assert posted[0]["readingId"] == posted[1]["readingId"] != posted[2]["readingId"]